@@ -1,18 +1,21 @@
 import streamlit as st
-import time
 
 from src.rag_pipeline.graph import (
     rewrite_query,
+    lookup_semantic_cache,
     retrieve_and_rerank_documents,
-    generate_answer,
+    stream_answer,
+    update_semantic_cache,
 )
 from src.config import Config
+from src.rag_pipeline.query_rewriting import compact_history
 from src.rag_pipeline.state import RAGState
+from src.resources import registry
+from src.tracing import start_metrics_server
 
 st.set_page_config(page_title="Cybersecurity InstructRAG Assistant", layout="wide")
 st.title("Cybersecurity InstructRAG Assistant")
-st.info(
-    """
+st.info("""
 **Welcome!** This assistant uses the state-of-the-art **InstructRAG** pipeline to answer your cybersecurity questions based on your provided PDF documents.\
 
 **How it works:**
@@ -21,8 +24,7 @@ st.info(
 - Powered by open models for embedding, reranking, and generation, orchestrated by LangGraph.
 
 *Ask a question about the topics covered in your PDFs to get started!*
-"""
-)
+""")
 
 
 def ensure_config_loaded():
@@ -36,7 +38,7 @@ def ensure_config_loaded():
             "GROQ_API_KEY environment variable not set! Please set it in your .env file."
         )
         st.stop()
-    if not Config.MONGO_URI:
+    if Config.VECTOR_STORE_BACKEND == "mongodb" and not Config.MONGO_URI:
         st.error(
             "MONGO_URI environment variable not set! Please set it in your .env file."
         )
@@ -45,6 +47,41 @@ def ensure_config_loaded():
 
 ensure_config_loaded()
 
+
+@st.cache_resource(show_spinner="Loading models and connections...")
+def warm_up_resources():
+    """Loads models, clients and chains once per process, shared by all sessions."""
+    if Config.METRICS_PORT:
+        start_metrics_server(Config.METRICS_PORT)
+    registry.warm_up()
+    return registry.report()
+
+
+resource_report = warm_up_resources()
+with st.sidebar.expander("Loaded resources"):
+    for stats in resource_report:
+        st.caption(
+            f"**{stats['name']}**: {stats['load_seconds']:.2f}s, "
+            f"{stats['rss_delta_mb']:+.1f} MB"
+        )
+
+if Config.SEMANTIC_CACHE_ENABLED and registry.is_loaded("semantic_cache"):
+    with st.sidebar.expander("Semantic cache"):
+        cache_stats = registry.get("semantic_cache").stats()
+        st.caption(
+            f"{cache_stats['entries']} entries, hit rate "
+            f"{cache_stats['hit_rate']:.0%} over {cache_stats['lookups']} lookups"
+        )
+
+if registry.is_loaded("query_rewriter"):
+    with st.sidebar.expander("Query rewriting"):
+        rewrite_stats = registry.get("query_rewriter").stats()
+        st.caption(
+            f"{rewrite_stats['llm_calls']} LLM rewrites, "
+            f"{rewrite_stats['llm_calls_saved']} avoided, "
+            f"~{rewrite_stats['prompt_tokens_saved']} prompt tokens saved"
+        )
+
 if "messages" not in st.session_state:
     st.session_state.messages = []
 
@@ -55,6 +92,8 @@ for message in st.session_state.messages:
 
 def run_rag_pipeline(prompt: str):
     """Runs the RAG pipeline step by step, updating the UI for each stage."""
+    # The history covers the earlier turns only; the prompt is passed as the query.
+    conversation_history = compact_history(st.session_state.messages)
     st.session_state.messages.append({"role": "user", "content": prompt})
     with st.chat_message("user"):
         st.markdown(prompt)
@@ -67,35 +106,47 @@ def run_rag_pipeline(prompt: str):
         with st.spinner("Thinking: Rewriting query..."):
             state: RAGState = {
                 "query": prompt,
-                "conversation_history": "\n".join(
-                    f"{msg['role']}: {msg['content']}"
-                    for msg in st.session_state.messages[-5:]
-                ),
+                "conversation_history": conversation_history,
                 "rewritten_query": "",
                 "retrieved_docs": [],
                 "reranked_docs": [],
                 "answer": "",
                 "context": "",
+                "cache_hit": "",
             }
             state = rewrite_query(state)
+            state = lookup_semantic_cache(state)
 
-        status.info("(2/3) Retrieving and reranking documents...")
-        with st.spinner("Thinking: Retrieving and reranking documents..."):
-            state = retrieve_and_rerank_documents(state)
+        if not state["cache_hit"]:
+            status.info("(2/3) Retrieving and reranking documents...")
+            with st.spinner("Thinking: Retrieving and reranking documents..."):
+                state = retrieve_and_rerank_documents(state)
 
         status.info("(3/3) Generating answer...")
-        with st.spinner("Thinking: Generating answer..."):
-            state = generate_answer(state)
-            full_response = state.get("answer", "I couldn't find an answer.")
-            # Streaming simulation: show answer word by word
-            streamed = ""
-            for word in full_response.split():
-                streamed += word + " "
-                time.sleep(0.02)
+        if state["cache_hit"] == "answer":
+            full_response = state.get("answer") or "I couldn't find an answer."
             answer_box.markdown(full_response)
-            st.session_state.messages.append(
-                {"role": "assistant", "content": full_response}
+        else:
+            # Tokens are rendered as the LLM produces them.
+            full_response = answer_box.write_stream(stream_answer(state))
+            state = update_semantic_cache(state)
+            ttft = state["timings"]["ttft_seconds"]
+            st.caption(f"Time to first token: {ttft:.2f}s")
+        with st.expander("Stage timings"):
+            st.table(
+                [
+                    {
+                        "stage": record["stage"],
+                        "wall (s)": round(record["wall_seconds"], 3),
+                        "cpu (s)": round(record["cpu_seconds"], 3),
+                        **record["sizes"],
+                    }
+                    for record in state.get("trace", [])
+                ]
             )
+        st.session_state.messages.append(
+            {"role": "assistant", "content": full_response}
+        )
         status.empty()
 
 
@@ -0,0 +1,293 @@
+import hashlib
+import random
+import re
+import threading
+import time
+from typing import Any, Iterator, List, Optional
+
+import numpy as np
+from langchain_community.cross_encoders import BaseCrossEncoder
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+_TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def _tokens(text: str) -> List[str]:
+    return _TOKEN_PATTERN.findall(text.lower())
+
+
+class StubChatModel(BaseChatModel):
+    """
+    Deterministic stand-in for the Groq chat model. The reply is a fixed number of
+    words drawn from the prompt with a seed derived from the prompt, so the same
+    question always produces the same answer. `first_token_seconds` and
+    `token_seconds` emulate network latency and decoding speed.
+    """
+
+    completion_tokens: int = 64
+    first_token_seconds: float = 0.0
+    token_seconds: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub-chat"
+
+    def _reply(self, messages: List[BaseMessage]) -> List[str]:
+        prompt = "\n".join(str(m.content) for m in messages)
+        words = prompt.split() or ["answer"]
+        seed = int.from_bytes(
+            hashlib.sha256(prompt.encode("utf-8")).digest()[:8], "big"
+        )
+        rng = random.Random(seed)
+        return [rng.choice(words) for _ in range(self.completion_tokens)]
+
+    def _usage(self, messages: List[BaseMessage], words: List[str]) -> dict:
+        prompt_tokens = sum(len(str(m.content).split()) for m in messages)
+        return {
+            "input_tokens": prompt_tokens,
+            "output_tokens": len(words),
+            "total_tokens": prompt_tokens + len(words),
+        }
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager=None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        words = self._reply(messages)
+        time.sleep(self.first_token_seconds + self.token_seconds * len(words))
+        message = AIMessage(
+            content=" ".join(words), usage_metadata=self._usage(messages, words)
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager=None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        words = self._reply(messages)
+        time.sleep(self.first_token_seconds)
+        for i, word in enumerate(words):
+            time.sleep(self.token_seconds)
+            text = word if i == 0 else " " + word
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=text))
+            if run_manager:
+                run_manager.on_llm_new_token(text, chunk=chunk)
+            yield chunk
+        yield ChatGenerationChunk(
+            message=AIMessageChunk(
+                content="", usage_metadata=self._usage(messages, words)
+            )
+        )
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Deterministic bag-of-words embeddings (hashed token counts, L2-normalized). Texts
+    sharing words land close together, so retrieval over a real corpus behaves
+    plausibly without downloading an embedding model.
+    """
+
+    def __init__(self, size: int = 384):
+        self.size = size
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.size, dtype=np.float32)
+        for token in _tokens(text):
+            digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+            vector[int.from_bytes(digest, "big") % self.size] += 1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+class OverlapCrossEncoder(BaseCrossEncoder):
+    """Deterministic stand-in for the reranker: the share of query words in the passage."""
+
+    def score(self, text_pairs: List[tuple]) -> List[float]:
+        scores = []
+        for query, passage in text_pairs:
+            query_tokens = set(_tokens(query))
+            passage_tokens = set(_tokens(passage))
+            overlap = len(query_tokens & passage_tokens)
+            scores.append(overlap / len(query_tokens) if query_tokens else 0.0)
+        return scores
+
+
+class StubWikipediaClient:
+    """
+    Offline stand-in for the Wikipedia API client. Each keyword resolves to one
+    article of `paragraphs` sentences built from the keyword itself, with a seed
+    derived from the keyword. `latency_seconds` emulates a slow API; keywords in
+    `failures` raise, and `calls` counts fetches per keyword.
+    """
+
+    def __init__(
+        self,
+        paragraphs: int = 20,
+        latency_seconds: float = 0.0,
+        failures: Optional[List[str]] = None,
+    ):
+        self.paragraphs = paragraphs
+        self.latency_seconds = latency_seconds
+        self.failures = set(failures or [])
+        self.calls = {}
+        self._lock = threading.Lock()
+
+    def fetch(self, keyword: str, max_chars: int) -> List[Document]:
+        with self._lock:
+            self.calls[keyword] = self.calls.get(keyword, 0) + 1
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+        if keyword in self.failures:
+            raise ConnectionError(f"Stub fetch of '{keyword}' failed.")
+        rng = random.Random(hashlib.sha256(keyword.encode("utf-8")).digest())
+        words = _tokens(keyword) or ["article"]
+        filler = ["attack", "network", "system", "security", "exploit", "defense"]
+        sentences = [
+            " ".join(rng.choice(words + filler) for _ in range(12)).capitalize() + "."
+            for _ in range(self.paragraphs)
+        ]
+        return [
+            Document(
+                page_content="\n\n".join(sentences)[:max_chars],
+                metadata={
+                    "title": keyword,
+                    "summary": sentences[0],
+                    "source": "https://en.wikipedia.org/wiki/"
+                    + keyword.replace(" ", "_"),
+                },
+            )
+        ]
+
+
+class StubAtlasCollection:
+    """
+    In-memory stand-in for a MongoDB Atlas collection with a vector search index.
+    Supports what the pipeline uses: `bulk_write` of `ReplaceOne` upserts,
+    `UpdateOne` `$set`/`$unset` updates and `DeleteMany`, `delete_many`, `find` with
+    `$in`/`$nin`/`$exists` filters and a projection, and `aggregate` with the `$match`,
+    `$vectorSearch`, `$set` and `$project` stages run by `MongoDBAtlasVectorSearch`
+    (`$vectorSearch` is an exact cosine search). `aggregations` counts pipelines.
+    """
+
+    def __init__(self):
+        self.documents = {}
+        self.aggregations = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def bulk_write(self, operations, ordered: bool = True) -> None:
+        from pymongo import DeleteMany, ReplaceOne, UpdateOne
+
+        with self._lock:
+            for operation in operations:
+                if isinstance(operation, ReplaceOne):
+                    doc = dict(operation._doc)
+                    self.documents[doc["_id"]] = doc
+                elif isinstance(operation, UpdateOne):
+                    doc = self.documents.get(operation._filter["_id"])
+                    if doc is None:
+                        continue
+                    doc.update(operation._doc.get("$set", {}))
+                    for field in operation._doc.get("$unset", {}):
+                        doc.pop(field, None)
+                elif isinstance(operation, DeleteMany):
+                    self._delete(operation._filter)
+                else:
+                    raise NotImplementedError(f"Stub collection has no {operation}.")
+
+    def _delete(self, query: dict) -> int:
+        ids = [_id for _id, doc in self.documents.items() if self._matches(doc, query)]
+        for _id in ids:
+            del self.documents[_id]
+        return len(ids)
+
+    def delete_many(self, filter: Optional[dict] = None, **kwargs):
+        from pymongo.results import DeleteResult
+
+        with self._lock:
+            deleted = self._delete(filter or {})
+        return DeleteResult({"n": deleted}, acknowledged=True)
+
+    @staticmethod
+    def _matches(doc: dict, query: dict) -> bool:
+        for field, condition in query.items():
+            if isinstance(condition, dict) and "$in" in condition:
+                if doc.get(field) not in condition["$in"]:
+                    return False
+            elif isinstance(condition, dict) and "$nin" in condition:
+                if doc.get(field) in condition["$nin"]:
+                    return False
+            elif isinstance(condition, dict) and "$exists" in condition:
+                if (field in doc) != condition["$exists"]:
+                    return False
+            elif doc.get(field) != condition:
+                return False
+        return True
+
+    @staticmethod
+    def _project(doc: dict, projection: Optional[dict]) -> dict:
+        if not projection:
+            return dict(doc)
+        if any(projection.values()):
+            keep = {field for field, include in projection.items() if include}
+            return {k: v for k, v in doc.items() if k in keep or k == "_id"}
+        return {k: v for k, v in doc.items() if k not in projection}
+
+    def find(self, query: Optional[dict] = None, projection=None, **kwargs):
+        with self._lock:
+            docs = list(self.documents.values())
+        return [
+            self._project(doc, projection)
+            for doc in docs
+            if self._matches(doc, query or {})
+        ]
+
+    def _vector_search(self, docs: List[dict], stage: dict) -> List[dict]:
+        docs = [doc for doc in docs if stage["path"] in doc]
+        if not docs:
+            return []
+        matrix = np.asarray([doc[stage["path"]] for doc in docs], dtype=np.float32)
+        query = np.asarray(stage["queryVector"], dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(query)
+        scores = matrix @ query / np.maximum(norms, 1e-12)
+        top = np.argsort(-scores, kind="stable")[: stage["limit"]]
+        return [dict(docs[i], __score=float(scores[i])) for i in top]
+
+    def aggregate(self, pipeline: List[dict]):
+        with self._lock:
+            self.aggregations += 1
+            docs = list(self.documents.values())
+        for stage in pipeline:
+            ((name, spec),) = stage.items()
+            if name == "$match":
+                docs = [doc for doc in docs if self._matches(doc, spec)]
+            elif name == "$vectorSearch":
+                docs = self._vector_search(docs, spec)
+            elif name == "$set":
+                docs = [
+                    dict(doc, **{field: doc.get("__score") for field in spec})
+                    for doc in docs
+                ]
+            elif name == "$project":
+                docs = [self._project(doc, spec) for doc in docs]
+            else:
+                raise NotImplementedError(f"Stub collection has no {name} stage.")
+        return [{k: v for k, v in doc.items() if k != "__score"} for doc in docs]
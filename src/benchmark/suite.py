@@ -0,0 +1,467 @@
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.config import Config
+from src.resources import registry
+
+# Resources whose load time is reported (the LLM is always the stub).
+MODEL_RESOURCES = ["embeddings", "cross_encoder", "vector_store", "reranking_retriever"]
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is reported in kilobytes on Linux and bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        "mean": float(np.mean(values)),
+        "p50": float(p50),
+        "p95": float(p95),
+        "p99": float(p99),
+    }
+
+
+# Config attributes set by `configure`, for callers that restore them afterwards.
+CONFIGURED_SETTINGS = (
+    "VECTOR_STORE_BACKEND",
+    "LOCAL_INDEX_DIRECTORY",
+    "BM25_INDEX_DIRECTORY",
+    "EMBEDDING_CACHE_ENABLED",
+    "SEMANTIC_CACHE_ENABLED",
+    "SEMANTIC_CACHE_ANSWERS",
+)
+
+
+def configure(
+    stub_models: bool,
+    index_directory: str,
+    completion_tokens: int = 64,
+    first_token_seconds: float = 0.0,
+    token_seconds: float = 0.0,
+    semantic_cache: bool = False,
+) -> None:
+    """
+    Points the pipeline at a local index and the deterministic stub LLM. With
+    `stub_models`, the embedding model and cross-encoder are replaced as well, so
+    the benchmark needs neither network access nor downloaded models.
+    """
+    from src.benchmark.stubs import (
+        HashingEmbeddings,
+        OverlapCrossEncoder,
+        StubChatModel,
+    )
+
+    Config.VECTOR_STORE_BACKEND = "local"
+    Config.LOCAL_INDEX_DIRECTORY = index_directory
+    Config.BM25_INDEX_DIRECTORY = os.path.join(index_directory, "bm25")
+    # Cached embeddings and answers would turn repeated runs into cache benchmarks.
+    Config.EMBEDDING_CACHE_ENABLED = False
+    Config.SEMANTIC_CACHE_ENABLED = semantic_cache
+    # Questions are replayed without their choices (as in the evaluation), so
+    # only retrieval results are cached.
+    Config.SEMANTIC_CACHE_ANSWERS = False
+
+    registry.reset()
+    if stub_models:
+        registry.override("embeddings", HashingEmbeddings())
+        registry.override("cross_encoder", OverlapCrossEncoder())
+    registry.override(
+        "llm",
+        StubChatModel(
+            completion_tokens=completion_tokens,
+            first_token_seconds=first_token_seconds,
+            token_seconds=token_seconds,
+        ),
+    )
+
+
+def build_index(max_pdfs: Optional[int] = None, rebuild: bool = False) -> dict:
+    """
+    Builds (or incrementally refreshes) the local index from `Config.PDF_DIRECTORY`.
+    Wikipedia sources are left out so the benchmark runs offline.
+    """
+    from src.data_processing.loader import discover_sources
+    from src.vector_store.bm25 import BM25Index
+    from src.vector_store.builder import build_bm25_index, sync_sources
+    from src.vector_store.ingest import EmbeddingIngestStage, LocalStoreSink
+    from src.vector_store.local_store import HEADER_FILE, LocalVectorStore
+    from src.vector_store.manifest import BuildManifest
+
+    directory = Config.LOCAL_INDEX_DIRECTORY
+    sources = discover_sources(wikipedia=False)
+    if max_pdfs:
+        sources = sources[:max_pdfs]
+
+    embeddings = registry.get("embeddings")
+    exists = os.path.exists(os.path.join(directory, HEADER_FILE))
+    if exists and not rebuild:
+        vector_store = LocalVectorStore.load(directory, embeddings)
+        manifest = BuildManifest.load_local(directory)
+    else:
+        vector_store = LocalVectorStore(embeddings, path=directory)
+        manifest = BuildManifest()
+
+    start = time.perf_counter()
+    sink = LocalStoreSink(vector_store, directory, resume=not rebuild)
+    stage = EmbeddingIngestStage(embeddings, sink)
+    report = sync_sources(vector_store, manifest, stage, sources=sources)
+    if (
+        report.sources_added
+        or report.sources_updated
+        or report.sources_duplicate
+        or report.chunks_removed
+    ):
+        manifest.mark_built()
+        vector_store.save(directory)
+        manifest.save_local(directory)
+        sink.finish()
+    if Config.HYBRID_RETRIEVAL_ENABLED and (
+        report.chunks_added or report.chunks_removed or not BM25Index.load()
+    ):
+        build_bm25_index(vector_store)
+    registry.reset("vector_store")
+    registry.reset("bm25_index")
+
+    return {
+        "directory": directory,
+        "sources": len(sources),
+        "chunks": len(vector_store),
+        "chunks_embedded": report.chunks_added,
+        "build_seconds": time.perf_counter() - start,
+    }
+
+
+def use_stub_atlas():
+    """
+    Serves the benchmark index through `MongoDBAtlasVectorSearch` over an in-memory
+    `StubAtlasCollection`, so the MongoDB retrieval path runs offline. Returns the
+    collection.
+    """
+    from langchain_mongodb import MongoDBAtlasVectorSearch
+    from src.benchmark.stubs import StubAtlasCollection
+    from src.vector_store.local_store import LocalVectorStore
+
+    embeddings = registry.get("embeddings")
+    collection = StubAtlasCollection()
+    LocalVectorStore.load(Config.LOCAL_INDEX_DIRECTORY, embeddings).to_mongo_collection(
+        collection
+    )
+    registry.override(
+        "vector_store",
+        MongoDBAtlasVectorSearch(
+            collection=collection,
+            embedding=embeddings,
+            index_name=Config.VECTOR_SEARCH_INDEX_NAME,
+        ),
+    )
+    return collection
+
+
+def load_questions(path: str, limit: Optional[int] = None, seed: int = 42) -> List[str]:
+    eval_df = pd.read_csv(path)
+    if limit and limit < len(eval_df):
+        eval_df = eval_df.sample(n=limit, random_state=seed)
+    return eval_df["question"].tolist()
+
+
+def replay(
+    questions: List[str], concurrency: int = 1, warmup: int = 2
+) -> Tuple[List[dict], float]:
+    """
+    Runs every question through `build_rag_graph` on `concurrency` threads after
+    `warmup` untimed questions. Returns per-question records and the wall time.
+    """
+    from src.rag_pipeline.graph import build_rag_graph
+
+    graph = build_rag_graph()
+    for question in questions[:warmup]:
+        graph.invoke({"query": question, "conversation_history": ""})
+
+    def run_one(question: str) -> dict:
+        start = time.perf_counter()
+        result = graph.invoke({"query": question, "conversation_history": ""})
+        return {
+            "latency_seconds": time.perf_counter() - start,
+            "trace": result.get("trace", []),
+            "timings": result.get("timings", {}),
+        }
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        records = list(executor.map(run_one, questions))
+    return records, time.perf_counter() - start
+
+
+def run_benchmark(
+    data_path: str = Config.EVAL_DATA_PATH,
+    num_questions: Optional[int] = 50,
+    concurrency: int = 1,
+    stub_models: bool = False,
+    max_pdfs: Optional[int] = None,
+    rebuild: bool = False,
+    completion_tokens: int = 64,
+    first_token_seconds: float = 0.0,
+    token_seconds: float = 0.0,
+    semantic_cache: bool = False,
+    vector_backend: str = "local",
+) -> Dict[str, Any]:
+    """
+    Builds the benchmark index, replays the questions and returns the results. With
+    `vector_backend="mongodb"` the index is searched through `use_stub_atlas`.
+    """
+    from src.tracing import summarize_records
+
+    model_tag = "stub" if stub_models else Config.EMBEDDING_MODEL.replace("/", "_")
+    index_directory = os.path.join(Config.BENCHMARK_INDEX_DIRECTORY, model_tag)
+    configure(
+        stub_models,
+        index_directory,
+        completion_tokens=completion_tokens,
+        first_token_seconds=first_token_seconds,
+        token_seconds=token_seconds,
+        semantic_cache=semantic_cache,
+    )
+
+    index = build_index(max_pdfs=max_pdfs, rebuild=rebuild)
+    if vector_backend == "mongodb":
+        use_stub_atlas()
+    registry.warm_up(MODEL_RESOURCES)
+    load_seconds = {
+        stats["name"]: stats["load_seconds"]
+        for stats in registry.report()
+        if stats["name"] in MODEL_RESOURCES
+    }
+
+    questions = load_questions(data_path, num_questions)
+    records, elapsed = replay(questions, concurrency=concurrency)
+
+    stage_records = [r for record in records for r in record["trace"]]
+    ttfts = [
+        record["timings"]["ttft_seconds"]
+        for record in records
+        if "ttft_seconds" in record["timings"]
+    ]
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+            "stub_models": stub_models,
+            "vector_backend": vector_backend,
+            "embedding_model": None if stub_models else Config.EMBEDDING_MODEL,
+            "reranker_model": None if stub_models else Config.RERANKER_MODEL,
+            "questions": len(questions),
+            "concurrency": concurrency,
+            "retrieval_k": Config.RETRIEVAL_K,
+            "rerank_k": Config.RERANK_K,
+            "llm": {
+                "completion_tokens": completion_tokens,
+                "first_token_seconds": first_token_seconds,
+                "token_seconds": token_seconds,
+            },
+        },
+        "index": index,
+        "load_seconds": load_seconds,
+        "throughput_qps": len(questions) / elapsed if elapsed else 0.0,
+        "wall_seconds": elapsed,
+        "latency": _percentiles([r["latency_seconds"] for r in records]),
+        "ttft": _percentiles(ttfts),
+        "stages": summarize_records(stage_records),
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+
+def print_results(results: Dict[str, Any]) -> None:
+    from src.tracing import print_summary
+
+    meta = results["meta"]
+    print("\n--- Benchmark Results ---")
+    print(
+        f"Commit {meta['commit']}, {meta['questions']} questions, "
+        f"concurrency {meta['concurrency']}, stub models: {meta['stub_models']}"
+    )
+    print(
+        f"Index: {results['index']['chunks']} chunks from "
+        f"{results['index']['sources']} PDFs"
+    )
+    for name, seconds in results["load_seconds"].items():
+        print(f"Load {name:<24} {seconds:>8.2f}s")
+    latency = results["latency"]
+    print(f"Throughput: {results['throughput_qps']:.2f} questions/s")
+    print(
+        f"Latency: p50 {latency['p50']:.3f}s, p95 {latency['p95']:.3f}s, "
+        f"p99 {latency['p99']:.3f}s"
+    )
+    print(f"Peak RSS: {results['peak_rss_mb']:.1f} MB\n")
+    print_summary(results["stages"])
+
+
+# --- Comparison ---
+
+
+def _comparable_metrics(results: Dict[str, Any]) -> Dict[str, Tuple[float, bool]]:
+    """Flattens results into {name: (value, higher_is_better)}."""
+    metrics = {"throughput_qps": (results["throughput_qps"], True)}
+    for key in ("p50", "p95", "p99"):
+        metrics[f"latency.{key}"] = (results["latency"][key], False)
+    for stage, stats in results["stages"].items():
+        for key in ("wall_p50", "wall_p95"):
+            metrics[f"stages.{stage}.{key}"] = (stats[key], False)
+    for name, seconds in results["load_seconds"].items():
+        metrics[f"load_seconds.{name}"] = (seconds, False)
+    metrics["peak_rss_mb"] = (results["peak_rss_mb"], False)
+    return metrics
+
+
+def compare_results(
+    baseline: Dict[str, Any],
+    current: Dict[str, Any],
+    tolerance: float = 0.10,
+    min_delta_seconds: float = 0.005,
+) -> List[str]:
+    """
+    Prints every metric of `current` next to `baseline` and returns the names of
+    those that got worse by more than `tolerance` (relative). Latency changes below
+    `min_delta_seconds` are treated as noise.
+    """
+    base_metrics = _comparable_metrics(baseline)
+    current_metrics = _comparable_metrics(current)
+    regressions = []
+    print(f"{'metric':<44} {'baseline':>10} {'current':>10} {'change':>8}")
+    for name, (value, higher_is_better) in current_metrics.items():
+        if name not in base_metrics:
+            continue
+        base_value = base_metrics[name][0]
+        change = (value - base_value) / base_value if base_value else 0.0
+        worse = -change if higher_is_better else change
+        is_time = "seconds" in name or name.startswith(("latency", "stages"))
+        noise = is_time and abs(value - base_value) < min_delta_seconds
+        flag = ""
+        if worse > tolerance and not noise:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<44} {base_value:>10.3f} {value:>10.3f} {change:>+8.1%}{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Offline end-to-end benchmark of the RAG pipeline."
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run = subparsers.add_parser("run", help="Run the benchmark and save JSON results.")
+    run.add_argument("--data", default=Config.EVAL_DATA_PATH)
+    run.add_argument("--questions", type=int, default=50)
+    run.add_argument("--concurrency", type=int, default=1)
+    run.add_argument(
+        "--stub-models",
+        action="store_true",
+        help="Replace the embedding model and cross-encoder with deterministic stubs.",
+    )
+    run.add_argument("--max-pdfs", type=int, default=None)
+    run.add_argument("--rebuild", action="store_true", help="Rebuild the index.")
+    run.add_argument("--completion-tokens", type=int, default=64)
+    run.add_argument(
+        "--first-token-seconds",
+        type=float,
+        default=0.0,
+        help="Simulated LLM latency before the first token.",
+    )
+    run.add_argument(
+        "--token-seconds",
+        type=float,
+        default=0.0,
+        help="Simulated LLM time per generated token.",
+    )
+    run.add_argument("--semantic-cache", action="store_true")
+    run.add_argument(
+        "--vector-backend",
+        choices=["local", "mongodb"],
+        default="local",
+        help="Search the index directly or through MongoDBAtlasVectorSearch over "
+        "an in-memory stub collection.",
+    )
+    run.add_argument("--output", default=None)
+
+    compare = subparsers.add_parser(
+        "compare", help="Compare two result files and flag regressions."
+    )
+    compare.add_argument("baseline")
+    compare.add_argument("current")
+    compare.add_argument("--tolerance", type=float, default=0.10)
+
+    args = parser.parse_args(argv)
+
+    if args.command == "compare":
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.current) as f:
+            current = json.load(f)
+        regressions = compare_results(baseline, current, tolerance=args.tolerance)
+        if regressions:
+            print(
+                f"\n{len(regressions)} metrics regressed beyond {args.tolerance:.0%}."
+            )
+            sys.exit(1)
+        print("\nNo regressions.")
+        return
+
+    results = run_benchmark(
+        data_path=args.data,
+        num_questions=args.questions,
+        concurrency=args.concurrency,
+        stub_models=args.stub_models,
+        max_pdfs=args.max_pdfs,
+        rebuild=args.rebuild,
+        completion_tokens=args.completion_tokens,
+        first_token_seconds=args.first_token_seconds,
+        token_seconds=args.token_seconds,
+        semantic_cache=args.semantic_cache,
+        vector_backend=args.vector_backend,
+    )
+    print_results(results)
+
+    output = args.output or os.path.join(
+        Config.BENCHMARK_RESULTS_DIRECTORY,
+        f"{time.strftime('%Y%m%d-%H%M%S')}-{results['meta']['commit'] or 'nogit'}.json",
+    )
+    if os.path.dirname(output):
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
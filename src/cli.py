@@ -0,0 +1,226 @@
+import argparse
+import functools
+import json
+import shlex
+import sys
+import time
+from typing import List, Optional
+
+from src.config import Config
+
+# Everything below imports its dependencies when a command runs, so `--help` and
+# the batch prompt start without loading LangChain, LangGraph or any model.
+
+
+@functools.lru_cache(maxsize=None)
+def _graph():
+    """The compiled RAG graph, built once per process and reused by every query."""
+    from src.rag_pipeline.graph import build_rag_graph
+
+    return build_rag_graph()
+
+
+_stub_index: Optional[str] = None
+# Config values from before the first stubbed command, restored by `_use_real`.
+_real_settings: Optional[dict] = None
+
+
+def _save_settings() -> None:
+    global _real_settings
+    if _real_settings is None:
+        from src.benchmark.suite import CONFIGURED_SETTINGS
+
+        _real_settings = {name: getattr(Config, name) for name in CONFIGURED_SETTINGS}
+
+
+def _use_stubs(index_directory: Optional[str]) -> None:
+    """
+    Points the pipeline at a local index and the benchmark's stub models. Repeated
+    calls for the same index keep the loaded resources.
+    """
+    global _stub_index
+    index_directory = index_directory or f"{Config.BENCHMARK_INDEX_DIRECTORY}/stub"
+    if index_directory == _stub_index:
+        return
+    from src.benchmark.suite import configure
+
+    _save_settings()
+    configure(stub_models=True, index_directory=index_directory)
+    _graph.cache_clear()
+    _stub_index = index_directory
+
+
+def _use_real() -> None:
+    """
+    Undoes `_use_stubs` and the benchmark's configuration: restores the Config
+    values and drops the loaded resources, so the next command loads the real ones.
+    """
+    global _stub_index, _real_settings
+    if _real_settings is None:
+        return
+    from src.resources import registry
+
+    for name, value in _real_settings.items():
+        setattr(Config, name, value)
+    registry.reset()
+    _graph.cache_clear()
+    _stub_index = _real_settings = None
+
+
+def cmd_build(args) -> None:
+    if args.stub_models:
+        from src.benchmark.suite import build_index
+
+        print(json.dumps(build_index(rebuild=not args.incremental), indent=2))
+        return
+    from src.vector_store.builder import build_vector_store
+
+    build_vector_store(incremental=args.incremental)
+
+
+def cmd_query(args) -> None:
+    from src.serving.api import response_body
+
+    graph = _graph()
+    for question in args.questions:
+        start = time.perf_counter()
+        state = graph.invoke({"query": question, "conversation_history": ""})
+        body = response_body(state)
+        if args.json:
+            print(json.dumps(body, ensure_ascii=False, default=str))
+            continue
+        print(f"\nQ: {question}\nA: {body['answer']}")
+        for source in body["sources"]:
+            print(f"   - {source['source']} (page {source['page']})")
+            for other in source["also_in"]:
+                print(f"     also in {other['source']} (page {other['page']})")
+        print(f"({time.perf_counter() - start:.2f}s)")
+
+
+def _passthrough(module: str):
+    """Command that hands its arguments to the `main` of an existing module CLI."""
+
+    def command(args) -> None:
+        import importlib
+
+        importlib.import_module(module).main(args.args)
+
+    return command
+
+
+PASSTHROUGH = {
+    "eval": "src.evaluation.runner",
+    "bench": "src.benchmark.suite",
+    "profile": "src.startup",
+}
+
+
+def cmd_batch(args) -> None:
+    """
+    Runs one command per line of `file` (default: stdin) in this process, so models,
+    clients and the compiled graph load once and stay warm for the next command.
+    A real command after a stubbed one (`--stub-models` or `bench`) restores the
+    configuration and reloads the real resources instead.
+    """
+    parser = build_parser()
+    lines = open(args.file) if args.file != "-" else sys.stdin
+    interactive = args.file == "-" and sys.stdin.isatty()
+    with lines:
+        while True:
+            if interactive:
+                print("rag> ", end="", flush=True)
+            line = lines.readline()
+            if not line:
+                break
+            argv = shlex.split(line, comments=True)
+            if not argv:
+                continue
+            if argv[0] == "batch":
+                print("Batches cannot be nested.")
+                continue
+            try:
+                run(parse_args(parser, argv))
+            except SystemExit as e:
+                if e.code:
+                    print(f"Command failed with exit code {e.code}: {line.strip()}")
+            except Exception as e:
+                print(f"Command failed: {type(e).__name__}: {e}")
+
+
+COMMANDS = {
+    "build": cmd_build,
+    "query": cmd_query,
+    "batch": cmd_batch,
+    **{name: _passthrough(module) for name, module in PASSTHROUGH.items()},
+}
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m src",
+        description="Build the index, answer questions, evaluate and benchmark.",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    def add(name: str, help: str) -> argparse.ArgumentParser:
+        subparser = subparsers.add_parser(name, help=help)
+        if name in ("build", "query"):
+            subparser.add_argument(
+                "--stub-models",
+                action="store_true",
+                help="Use the benchmark's local index and stub models (offline).",
+            )
+            subparser.add_argument(
+                "--index", default=None, help="Local index directory for --stub-models."
+            )
+        return subparser
+
+    build = add("build", "Build or refresh the vector store.")
+    build.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Only parse and embed new or changed sources.",
+    )
+
+    query = add("query", "Answer one or more questions.")
+    query.add_argument("questions", nargs="+")
+    query.add_argument("--json", action="store_true", help="Print JSON lines.")
+
+    for name, help in (
+        ("eval", "Run the evaluation (arguments of src.evaluation.runner)."),
+        ("bench", "Run the benchmark (arguments of src.benchmark.suite)."),
+        ("profile", "Profile imports and check the cold start (src.startup)."),
+    ):
+        add(name, help).add_argument("args", nargs=argparse.REMAINDER)
+
+    batch = add("batch", "Run commands from a file or stdin with warm resources.")
+    batch.add_argument("file", nargs="?", default="-")
+    return parser
+
+
+def parse_args(parser: argparse.ArgumentParser, argv: List[str]) -> argparse.Namespace:
+    # Pass-through arguments may start with options, which REMAINDER won't take.
+    if argv and argv[0] in PASSTHROUGH:
+        return argparse.Namespace(command=argv[0], args=argv[1:])
+    return parser.parse_args(argv)
+
+
+def run(args) -> None:
+    global _stub_index
+    if getattr(args, "stub_models", False):
+        _use_stubs(args.index)
+    elif args.command == "bench":
+        # The benchmark configures its own index and models.
+        _save_settings()
+        _stub_index = None
+    elif args.command != "batch":
+        _use_real()
+    start = time.perf_counter()
+    COMMANDS[args.command](args)
+    if args.command != "batch":
+        print(f"[{args.command} finished in {time.perf_counter() - start:.2f}s]")
+
+
+def main(argv: Optional[List[str]] = None):
+    argv = sys.argv[1:] if argv is None else argv
+    run(parse_args(build_parser(), argv))
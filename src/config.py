@@ -17,14 +17,67 @@ class Config:
     DB_NAME = os.getenv("DB_NAME", "cybersecurity_db")
     COLLECTION_NAME = os.getenv("COLLECTION_NAME", "documents_vector_store")
     VECTOR_SEARCH_INDEX_NAME = "vector_index"
+    MANIFEST_COLLECTION_NAME = os.getenv(
+        "MANIFEST_COLLECTION_NAME", f"{COLLECTION_NAME}_manifest"
+    )
+
+    # Vector store backend: "mongodb" (Atlas Vector Search) or "local" (memory-mapped)
+    VECTOR_STORE_BACKEND = os.getenv("VECTOR_STORE_BACKEND", "mongodb")
+    LOCAL_INDEX_DIRECTORY = os.getenv("LOCAL_INDEX_DIRECTORY", "data/index")
+    LOCAL_SEARCH_BLOCK_ROWS = 65536
+    # Quantized copy of the local index written at build time: "none", "int8" or
+    # "binary" (sign bits). Searches scan the codes, then rescore the best
+    # k * <MODE>_RESCORE_MULTIPLIER rows with the float32 vectors.
+    LOCAL_QUANTIZATION = os.getenv("LOCAL_QUANTIZATION", "none")
+    INT8_RESCORE_MULTIPLIER = 3
+    BINARY_RESCORE_MULTIPLIER = 10
+    # Approximate nearest-neighbour index of the local store written at build time:
+    # "none" (exact scan) or "ivf" (inverted lists over spherical k-means centroids,
+    # see src/vector_store/ann.py). Searches scan the IVF_NPROBE closest lists;
+    # IVF_NLIST = 0 picks sqrt(rows). Smaller stores are always scanned exactly.
+    LOCAL_ANN_INDEX = os.getenv("LOCAL_ANN_INDEX", "none")
+    IVF_NLIST = int(os.getenv("IVF_NLIST", 0))
+    IVF_NPROBE = int(os.getenv("IVF_NPROBE", 8))
+    IVF_MIN_ROWS = 1024
+    IVF_TRAIN_ITERATIONS = 10
+    IVF_TRAIN_POINTS_PER_LIST = 64
 
     # LLM and Embedding/Reranker Model configuration
     LLM_MODEL = "llama3-70b-8192"
     EMBEDDING_MODEL = "BAAI/bge-large-en-v1.5"
     RERANKER_MODEL = "BAAI/bge-reranker-base"
 
+    # CPU inference backend for the embedding model and the reranker (see
+    # src/inference.py): "torch", or "onnx" (ONNX Runtime, exported on first use and
+    # dynamically int8-quantized for ONNX_QUANTIZATION: "avx2", "avx512",
+    # "avx512_vnni", "arm64" or "none"). INFERENCE_THREADS=0 keeps library defaults.
+    INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "torch")
+    INFERENCE_THREADS = int(os.getenv("INFERENCE_THREADS", "0"))
+    ONNX_QUANTIZATION = os.getenv("ONNX_QUANTIZATION", "avx2")
+    ONNX_MODEL_DIRECTORY = os.getenv("ONNX_MODEL_DIRECTORY", "data/models/onnx")
+
+    # Persistent embedding cache (see src/vector_store/embedding_cache.py)
+    EMBEDDING_CACHE_ENABLED = (
+        os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+    )
+    EMBEDDING_CACHE_PATH = os.getenv(
+        "EMBEDDING_CACHE_PATH", "data/cache/embeddings.sqlite3"
+    )
+    EMBEDDING_CACHE_MAX_ENTRIES = 200000
+
     # Data paths
     PDF_DIRECTORY = "data/pdfs"
+    # Raw Wikipedia articles, one compressed snapshot per keyword (see
+    # src/data_processing/wikipedia.py). Builds re-fetch only snapshots older than
+    # WIKIPEDIA_SNAPSHOT_MAX_AGE_DAYS; with WIKIPEDIA_OFFLINE they never fetch.
+    WIKIPEDIA_SNAPSHOT_DIRECTORY = os.getenv(
+        "WIKIPEDIA_SNAPSHOT_DIRECTORY", "data/wikipedia"
+    )
+    WIKIPEDIA_SNAPSHOT_MAX_AGE_DAYS = float(
+        os.getenv("WIKIPEDIA_SNAPSHOT_MAX_AGE_DAYS", 30)
+    )
+    WIKIPEDIA_OFFLINE = os.getenv("WIKIPEDIA_OFFLINE", "false").lower() == "true"
+    WIKIPEDIA_FETCH_WORKERS = 8
     EVAL_DATA_PATH = "data/pentesting-eval.csv"
 
     # RAG Pipeline Configuration
@@ -33,5 +86,143 @@ class Config:
     RETRIEVAL_K = 20
     RERANK_K = 5
 
+    # Context packing (see src/rag_pipeline/context_packer.py): chunks of the same
+    # page share one block without their overlap, and the context is cut to about
+    # CONTEXT_TOKEN_BUDGET tokens
+    CONTEXT_PACKING_ENABLED = (
+        os.getenv("CONTEXT_PACKING_ENABLED", "true").lower() == "true"
+    )
+    CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "2000"))
+    CONTEXT_MIN_BLOCK_TOKENS = 64
+
+    # Hybrid retrieval (see src/vector_store/bm25.py): dense and BM25 hits are fused
+    # by reciprocal rank fusion and only the top HYBRID_FUSED_K go to the reranker.
+    # The BM25 index is a local directory for both backends (with MongoDB it is
+    # written where the build runs and must be available to the serving host)
+    HYBRID_RETRIEVAL_ENABLED = (
+        os.getenv("HYBRID_RETRIEVAL_ENABLED", "true").lower() == "true"
+    )
+    BM25_INDEX_DIRECTORY = os.getenv("BM25_INDEX_DIRECTORY", "data/index/bm25")
+    BM25_K = 20
+    BM25_K1 = 1.2
+    BM25_B = 0.75
+    RRF_K = 60
+    HYBRID_FUSED_K = 12
+
+    # Reranking cascade (see src/rag_pipeline/reranking.py): only the
+    # RERANK_PREFILTER_K candidates closest by bi-encoder cosine are cross-encoded, in
+    # steps of RERANK_CASCADE_STEP, stopping once a step scores RERANK_EARLY_EXIT_MARGIN
+    # below the current top RERANK_K. Cross-encoder scores are cached per
+    # (query, chunk).
+    RERANK_CASCADE_ENABLED = (
+        os.getenv("RERANK_CASCADE_ENABLED", "true").lower() == "true"
+    )
+    RERANK_PREFILTER_K = 10
+    RERANK_CASCADE_STEP = 2
+    RERANK_EARLY_EXIT_MARGIN = 0.1
+    RERANK_SCORE_CACHE_MAX_ENTRIES = 50000
+
+    # Async graph: keep the speculative raw-query retrieval when the rewritten query
+    # embeds at least this close to the raw one
+    SPECULATIVE_REUSE_THRESHOLD = 0.9
+
+    # Cross-query batched retrieval (see src/rag_pipeline/batch_retrieval.py)
+    BATCH_RETRIEVAL_SIZE = 64
+    BATCH_SEARCH_CONCURRENCY = 8
+    RERANK_BATCH_SIZE = 128
+
+    # Semantic query cache in front of retrieve/generate (see
+    # src/rag_pipeline/semantic_cache.py). SEMANTIC_CACHE_ANSWERS=false caches only
+    # the retrieved documents and always regenerates the answer; evaluation and
+    # benchmark runs always do so.
+    SEMANTIC_CACHE_ENABLED = (
+        os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+    )
+    SEMANTIC_CACHE_ANSWERS = (
+        os.getenv("SEMANTIC_CACHE_ANSWERS", "true").lower() == "true"
+    )
+    SEMANTIC_CACHE_THRESHOLD = 0.95
+    SEMANTIC_CACHE_MAX_ENTRIES = 1000
+    SEMANTIC_CACHE_TTL_SECONDS = 3600
+    SEMANTIC_CACHE_VERSION_CHECK_SECONDS = 30
+
+    # Query rewriting (see src/rag_pipeline/query_rewriting.py): queries without
+    # references to earlier turns skip the LLM, the history sent to it is capped at
+    # REWRITE_HISTORY_TOKEN_BUDGET tokens (REWRITE_TURN_TOKENS per turn), and
+    # rewrites are cached on disk
+    REWRITE_SKIP_STANDALONE = (
+        os.getenv("REWRITE_SKIP_STANDALONE", "true").lower() == "true"
+    )
+    REWRITE_HISTORY_TOKEN_BUDGET = int(os.getenv("REWRITE_HISTORY_TOKEN_BUDGET", 300))
+    REWRITE_TURN_TOKENS = 60
+    REWRITE_CACHE_ENABLED = os.getenv("REWRITE_CACHE_ENABLED", "true").lower() == "true"
+    REWRITE_CACHE_PATH = os.getenv("REWRITE_CACHE_PATH", "data/cache/rewrites.sqlite3")
+    REWRITE_CACHE_MAX_ENTRIES = 10000
+
+    # Streaming ingestion: parser worker processes, chunks per queued batch and
+    # chunks per embedding call / bulk commit
+    INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", os.cpu_count() or 1))
+    INGEST_BATCH_SIZE = 256
+    EMBEDDING_BATCH_SIZE = 32
+    INGEST_QUEUE_BATCHES = 4
+
+    # Deduplication during ingestion (see src/data_processing/dedup.py): identical
+    # files are ingested once, and chunks whose MinHash-estimated Jaccard similarity
+    # (over word shingles) to a kept chunk reaches DEDUP_THRESHOLD are dropped
+    DEDUP_ENABLED = os.getenv("DEDUP_ENABLED", "true").lower() == "true"
+    DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", 0.85))
+    DEDUP_SHINGLE_WORDS = 5
+    DEDUP_NUM_PERM = 128
+    DEDUP_LSH_BANDS = 32
+
     # Batch processing configuration
     BATCH_DELAY_SECONDS = 5
+
+    # Groq rate limiting (token bucket shared by all LLM calls in the process)
+    GROQ_REQUESTS_PER_MINUTE = float(os.getenv("GROQ_REQUESTS_PER_MINUTE", 30))
+    GROQ_MAX_BURST = 5
+
+    # Evaluation runner (see src/evaluation/runner.py)
+    EVAL_MAX_CONCURRENCY = 8
+    EVAL_MAX_ATTEMPTS = 3
+    EVAL_CHECKPOINT_PATH = "data/eval_runs/results.jsonl"
+    # Metrics engine (see src/evaluation/metrics.py): rows read per checkpoint chunk
+    EVAL_METRICS_CHUNK_SIZE = 10000
+
+    # Stage tracing (see src/tracing.py): JSONL log of every stage record and the
+    # port of the Prometheus metrics endpoint started by the app (0 disables it)
+    TRACE_LOG_ENABLED = os.getenv("TRACE_LOG_ENABLED", "false").lower() == "true"
+    TRACE_LOG_PATH = os.getenv("TRACE_LOG_PATH", "data/traces/stages.jsonl")
+    METRICS_PORT = int(os.getenv("METRICS_PORT", 0))
+
+    # Serving API (see src/serving/api.py): requests running the graph at once, and
+    # requests admitted in total (running or waiting) before answering 503
+    SERVICE_HOST = os.getenv("SERVICE_HOST", "0.0.0.0")
+    SERVICE_PORT = int(os.getenv("SERVICE_PORT", 8000))
+    SERVICE_MAX_CONCURRENCY = int(os.getenv("SERVICE_MAX_CONCURRENCY", 32))
+    SERVICE_MAX_PENDING = int(os.getenv("SERVICE_MAX_PENDING", 128))
+
+    # Micro-batching of the embedding model and cross-encoder in the serving API
+    # (see src/serving/batching.py): items (texts or pairs) per merged model call,
+    # how long to wait for more callers, and the bounded queue of waiting requests
+    MICRO_BATCH_ENABLED = os.getenv("MICRO_BATCH_ENABLED", "true").lower() == "true"
+    MICRO_BATCH_MAX_SIZE = int(os.getenv("MICRO_BATCH_MAX_SIZE", 64))
+    MICRO_BATCH_MAX_WAIT_MS = float(os.getenv("MICRO_BATCH_MAX_WAIT_MS", 5))
+    MICRO_BATCH_MAX_QUEUE = 256
+    MICRO_BATCH_QUEUE_TIMEOUT = 2.0
+
+    # Offline benchmark suite (see src/benchmark/suite.py)
+    BENCHMARK_INDEX_DIRECTORY = "data/benchmark/index"
+    BENCHMARK_RESULTS_DIRECTORY = "data/benchmark/results"
+    # Budget for a fresh interpreter importing the query path (see src/startup.py)
+    STARTUP_TARGET_SECONDS = float(os.getenv("STARTUP_TARGET_SECONDS", 1.0))
+
+    # Resources loaded eagerly at startup (see src/resources.py)
+    WARMUP_RESOURCES = [
+        "embeddings",
+        "cross_encoder",
+        "reranking_retriever",
+        "query_rewriter",
+        "query_rewriter_chain",
+        "answer_generation_chain",
+    ]
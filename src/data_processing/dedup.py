@@ -0,0 +1,221 @@
+import re
+import zlib
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Sequence, Set
+
+import numpy as np
+
+from src.config import Config
+
+_WORD = re.compile(r"\w+")
+# Largest Mersenne prime below 2**64; hash permutations are computed modulo it.
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64(0xFFFFFFFF)
+
+
+def duplicate_sources(sources) -> Dict[str, str]:
+    """
+    Maps every source whose content hash equals another source's to the canonical
+    copy (shortest, then alphabetically first id), e.g. "report (1).pdf" to
+    "report.pdf". Canonical sources are not in the mapping.
+    """
+    by_hash: Dict[str, List[str]] = defaultdict(list)
+    for source in sources:
+        by_hash[source.content_hash].append(source.source_id)
+    duplicates = {}
+    for source_ids in by_hash.values():
+        canonical = min(source_ids, key=lambda source_id: (len(source_id), source_id))
+        for source_id in source_ids:
+            if source_id != canonical:
+                duplicates[source_id] = canonical
+    return duplicates
+
+
+def shingles(text: str, size: Optional[int] = None) -> Set[str]:
+    """Lower-cased word n-grams of `text` (the whole text when it is shorter)."""
+    size = size or Config.DEDUP_SHINGLE_WORDS
+    words = _WORD.findall(text.lower())
+    if len(words) <= size:
+        return {" ".join(words)}
+    return {" ".join(words[i : i + size]) for i in range(len(words) - size + 1)}
+
+
+class MinHasher:
+    """
+    MinHash signatures: each of `num_perm` universal hash permutations of the
+    shingle hashes keeps its minimum, so the share of equal positions in two
+    signatures estimates the Jaccard similarity of the two shingle sets.
+    """
+
+    def __init__(self, num_perm: Optional[int] = None, seed: int = 1):
+        self.num_perm = num_perm or Config.DEDUP_NUM_PERM
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, 1 << 32, size=self.num_perm, dtype=np.uint64)
+        self._b = rng.randint(0, 1 << 32, size=self.num_perm, dtype=np.uint64)
+
+    def signature(self, text: str) -> np.ndarray:
+        hashes = np.fromiter(
+            (zlib.crc32(s.encode("utf-8")) for s in shingles(text)), dtype=np.uint64
+        )
+        # (a * h + b) stays below 2**64 for 32-bit a, b and h.
+        permuted = (np.outer(hashes, self._a) + self._b) % _MERSENNE_PRIME & _MAX_HASH
+        return permuted.min(axis=0).astype(np.uint32)
+
+
+class MinHashLSH:
+    """
+    Locality-sensitive hashing over MinHash signatures: signatures are cut into
+    `bands` bands, and two keys become candidates when any band matches exactly.
+    """
+
+    def __init__(self, num_perm: int, bands: Optional[int] = None):
+        self.bands = bands or Config.DEDUP_LSH_BANDS
+        if num_perm % self.bands:
+            raise ValueError(
+                f"{num_perm} permutations do not split into {self.bands} bands."
+            )
+        self.rows = num_perm // self.bands
+        self._buckets: List[Dict[bytes, Set[str]]] = [
+            defaultdict(set) for _ in range(self.bands)
+        ]
+        self._keys: Dict[str, List[bytes]] = {}
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        return [
+            signature[i * self.rows : (i + 1) * self.rows].tobytes()
+            for i in range(self.bands)
+        ]
+
+    def add(self, key: str, signature: np.ndarray) -> None:
+        band_keys = self._band_keys(signature)
+        self._keys[key] = band_keys
+        for buckets, band_key in zip(self._buckets, band_keys):
+            buckets[band_key].add(key)
+
+    def remove(self, key: str) -> None:
+        for buckets, band_key in zip(self._buckets, self._keys.pop(key, [])):
+            bucket = buckets.get(band_key)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del buckets[band_key]
+
+    def candidates(self, signature: np.ndarray) -> Set[str]:
+        found = set()
+        for buckets, band_key in zip(self._buckets, self._band_keys(signature)):
+            found |= buckets.get(band_key, set())
+        return found
+
+
+@dataclass
+class DedupStats:
+    chunks_seen: int = 0
+    exact_duplicates: int = 0
+    near_duplicates: int = 0
+    chars_seen: int = 0
+    chars_dropped: int = 0
+
+    @property
+    def chunks_dropped(self) -> int:
+        return self.exact_duplicates + self.near_duplicates
+
+    @property
+    def shrink_ratio(self) -> float:
+        return self.chunks_dropped / self.chunks_seen if self.chunks_seen else 0.0
+
+
+class ChunkDeduplicator:
+    """
+    Finds chunks that repeat a chunk already kept in the index: exact copies by
+    content hash, near-duplicates by MinHash/LSH candidates whose estimated Jaccard
+    similarity reaches `threshold`. Kept chunks are registered with `add`, and
+    chunks deleted from the index are forgotten with `remove`.
+    """
+
+    def __init__(
+        self,
+        threshold: Optional[float] = None,
+        num_perm: Optional[int] = None,
+        bands: Optional[int] = None,
+    ):
+        self.threshold = Config.DEDUP_THRESHOLD if threshold is None else threshold
+        self.hasher = MinHasher(num_perm)
+        self.lsh = MinHashLSH(self.hasher.num_perm, bands)
+        self._signatures: Dict[str, np.ndarray] = {}
+        self._by_hash: Dict[str, str] = {}
+        self._hash_of: Dict[str, str] = {}
+        self.stats = DedupStats()
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    def add(
+        self,
+        chunk_id: str,
+        text: str,
+        chunk_hash: str,
+        signature: Optional[np.ndarray] = None,
+    ) -> None:
+        if signature is None:
+            signature = self.hasher.signature(text)
+        self._signatures[chunk_id] = signature
+        self.lsh.add(chunk_id, signature)
+        self._by_hash.setdefault(chunk_hash, chunk_id)
+        self._hash_of[chunk_id] = chunk_hash
+
+    def remove(self, chunk_ids: Iterable[str]) -> None:
+        for chunk_id in chunk_ids:
+            if self._signatures.pop(chunk_id, None) is None:
+                continue
+            self.lsh.remove(chunk_id)
+            chunk_hash = self._hash_of.pop(chunk_id)
+            if self._by_hash.get(chunk_hash) == chunk_id:
+                del self._by_hash[chunk_hash]
+
+    def find_near(self, signature: np.ndarray) -> Optional[str]:
+        """The kept chunk most similar to `signature`, if at least `threshold`."""
+        best, best_similarity = None, self.threshold
+        for candidate in self.lsh.candidates(signature):
+            similarity = float(np.mean(self._signatures[candidate] == signature))
+            if similarity >= best_similarity:
+                best, best_similarity = candidate, similarity
+        return best
+
+    def check(self, chunk_id: str, text: str, chunk_hash: str) -> Optional[str]:
+        """
+        Returns the kept chunk that `text` duplicates, or registers the chunk as
+        kept and returns None. Counts both outcomes in `stats`.
+        """
+        self.stats.chunks_seen += 1
+        self.stats.chars_seen += len(text)
+        kept = self._by_hash.get(chunk_hash)
+        if kept is not None:
+            self.stats.exact_duplicates += 1
+        else:
+            signature = self.hasher.signature(text)
+            kept = self.find_near(signature)
+            if kept is None:
+                self.add(chunk_id, text, chunk_hash, signature)
+                return None
+            self.stats.near_duplicates += 1
+        self.stats.chars_dropped += len(text)
+        return kept
+
+
+def seed_deduplicator(
+    deduplicator: ChunkDeduplicator,
+    vector_store,
+    chunk_ids: Sequence[str],
+    chunk_hashes: Sequence[str],
+    batch_size: int = 1000,
+) -> None:
+    """Registers chunks already in the vector store as kept, reading their texts."""
+    hash_of = dict(zip(chunk_ids, chunk_hashes))
+    chunk_ids = list(chunk_ids)
+    for start in range(0, len(chunk_ids), batch_size):
+        for doc in vector_store.get_by_ids(chunk_ids[start : start + batch_size]):
+            deduplicator.add(str(doc.id), doc.page_content, hash_of[str(doc.id)])
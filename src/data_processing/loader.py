@@ -1,67 +1,285 @@
-import os
-from typing import List
-from langchain_community.document_loaders import PyPDFDirectoryLoader, WikipediaLoader
+import multiprocessing
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Executor,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+from dataclasses import dataclass
+from functools import partial
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+from langchain_community.document_loaders import PyPDFLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain.schema import Document
 from src.config import Config
+from src.data_processing.wikipedia import SnapshotStore, refresh_snapshots
+from src.vector_store.manifest import hash_file, hash_text
 from tqdm import tqdm
 
+WIKIPEDIA_KEYWORDS_PATH = "src/data_processing/wikipedia_keywords.txt"
+
+
+@dataclass(frozen=True)
+class SourceRef:
+    """A single ingestible source (one PDF file or one Wikipedia keyword)."""
+
+    source_id: str
+    kind: str  # "pdf" or "wikipedia"
+    location: str  # file path or search keyword
+    content_hash: str
+
+
+def list_pdf_paths() -> List[str]:
+    """Returns the visible PDF files in the PDF directory, in a stable order."""
+    directory = Path(Config.PDF_DIRECTORY)
+    if not directory.exists():
+        return []
+    return sorted(
+        str(p)
+        for p in directory.glob("**/[!.]*.pdf")
+        if p.is_file()
+        and not any(part.startswith(".") for part in p.relative_to(directory).parts)
+    )
+
+
+def read_wikipedia_keywords() -> List[str]:
+    """Reads the Wikipedia keywords file, ignoring blank lines."""
+    with open(WIKIPEDIA_KEYWORDS_PATH, "r") as f:
+        return [line.strip() for line in f.readlines() if line.strip()]
+
+
+def discover_sources(
+    wikipedia: bool = True, offline: Optional[bool] = None
+) -> List[SourceRef]:
+    """
+    Lists every configured source with a content hash: the file hash for PDFs and the
+    hash of the stored article for Wikipedia keywords. Missing or stale Wikipedia
+    snapshots are fetched first (never with `offline`); keywords that still have no
+    snapshot are left out.
+    """
+    sources = [
+        SourceRef(f"pdf:{path}", "pdf", path, hash_file(path))
+        for path in list_pdf_paths()
+    ]
+    keywords = read_wikipedia_keywords() if wikipedia else []
+    if not keywords:
+        return sources
+    store = SnapshotStore()
+    report = refresh_snapshots(keywords, store=store, offline=offline)
+    if report.missing:
+        print(
+            f"Warning: No Wikipedia snapshot for {len(report.missing)} keywords, "
+            "skipping them."
+        )
+    missing = set(report.missing)
+    for keyword in keywords:
+        if keyword in missing:
+            continue
+        snapshot = store.get(keyword)
+        if snapshot is None:
+            continue
+        sources.append(
+            SourceRef(
+                f"wikipedia:{keyword}",
+                "wikipedia",
+                keyword,
+                snapshot.content_hash,
+            )
+        )
+    return sources
+
+
+def load_pdf(path: str) -> List[Document]:
+    """Loads one PDF into one document per page."""
+    docs = PyPDFLoader(path).load()
+    for doc in docs:
+        doc.metadata["source"] = path
+    return docs
+
+
+def load_wikipedia_article(keyword: str) -> List[Document]:
+    """Loads the stored Wikipedia article for a keyword (see `refresh_snapshots`)."""
+    snapshot = SnapshotStore().get(keyword)
+    if snapshot is None:
+        raise FileNotFoundError(f"No Wikipedia snapshot for '{keyword}'.")
+    return snapshot.documents
+
+
+def load_source(source: SourceRef) -> List[Document]:
+    """Loads the raw documents of a source, tagging them with its `source_id`."""
+    if source.kind == "pdf":
+        docs = load_pdf(source.location)
+    else:
+        docs = load_wikipedia_article(source.location)
+    for doc in docs:
+        doc.metadata["source_id"] = source.source_id
+    return docs
+
+
+def chunk_documents(
+    docs: List[Document],
+    chunk_size: Optional[int] = None,
+    chunk_overlap: Optional[int] = None,
+) -> List[Document]:
+    """Splits documents into overlapping chunks."""
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size or Config.CHUNK_SIZE,
+        chunk_overlap=(
+            Config.CHUNK_OVERLAP if chunk_overlap is None else chunk_overlap
+        ),
+    )
+    return text_splitter.split_documents(docs)
+
+
+def load_and_chunk_source(
+    source: SourceRef,
+    chunk_size: Optional[int] = None,
+    chunk_overlap: Optional[int] = None,
+) -> List[Document]:
+    """Loads and chunks a single source. Runs inside ingestion worker processes."""
+    return chunk_documents(load_source(source), chunk_size, chunk_overlap)
+
+
+SourceResult = Tuple[SourceRef, Optional[List[Document]], Optional[Exception]]
+
+
+def _bounded_map(
+    executor: Executor,
+    fn: Callable,
+    items: Iterable,
+    max_in_flight: int,
+) -> Iterator[Tuple[object, object, Optional[Exception]]]:
+    """
+    Submits `fn(item)` for each item while keeping at most `max_in_flight` tasks
+    pending, yielding (item, result, error) in completion order.
+    """
+    items = iter(items)
+    pending = {}
+    exhausted = False
+    while True:
+        while not exhausted and len(pending) < max_in_flight:
+            try:
+                item = next(items)
+            except StopIteration:
+                exhausted = True
+                break
+            pending[executor.submit(fn, item)] = item
+        if not pending:
+            return
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            item = pending.pop(future)
+            error = future.exception()
+            yield item, (None if error else future.result()), error
+
+
+def iter_source_chunks(
+    sources: List[SourceRef],
+    max_workers: Optional[int] = None,
+) -> Iterator[SourceResult]:
+    """
+    Parses and chunks sources concurrently, yielding (source, chunks, error) as each
+    finishes. PDFs are parsed across a process pool and Wikipedia articles are read
+    from their snapshots on a thread pool. The number of sources in flight is bounded, so a slow consumer
+    holds back parsing instead of letting chunks pile up in memory.
+    """
+    max_workers = max_workers or Config.INGEST_WORKERS
+    max_in_flight = max_workers * 2
+    # Worker processes don't see runtime changes to Config, so pass chunking explicitly.
+    task = partial(
+        load_and_chunk_source,
+        chunk_size=Config.CHUNK_SIZE,
+        chunk_overlap=Config.CHUNK_OVERLAP,
+    )
+    pdf_sources = [s for s in sources if s.kind == "pdf"]
+    other_sources = [s for s in sources if s.kind != "pdf"]
+
+    if pdf_sources:
+        # "spawn" avoids forking a parent that may already hold model threads.
+        with ProcessPoolExecutor(
+            max_workers=max_workers, mp_context=multiprocessing.get_context("spawn")
+        ) as executor:
+            yield from _bounded_map(executor, task, pdf_sources, max_in_flight)
+    if other_sources:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            yield from _bounded_map(executor, task, other_sources, max_in_flight)
+
+
+def iter_chunk_batches(
+    sources: Optional[List[SourceRef]] = None,
+    batch_size: Optional[int] = None,
+    max_workers: Optional[int] = None,
+) -> Iterator[List[Document]]:
+    """
+    Streams the chunks of all sources (default: every configured source) in batches
+    of at most `batch_size`, so memory stays flat no matter how large the corpus is.
+    """
+    sources = discover_sources() if sources is None else sources
+    batch_size = batch_size or Config.INGEST_BATCH_SIZE
+    batch = []
+    for source, chunks, error in tqdm(
+        iter_source_chunks(sources, max_workers),
+        total=len(sources),
+        desc="Loading and chunking sources",
+    ):
+        if error is not None:
+            print(f"Could not load source '{source.source_id}': {error}")
+            continue
+        for chunk in chunks:
+            batch.append(chunk)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
 
 def load_and_chunk_docs() -> List[Document]:
     """
     Loads documents from all configured sources (PDFs, Wikipedia) and
     splits them into chunks.
     """
-    all_docs = []
-
-    # Load from PDFs
-    if os.path.exists(Config.PDF_DIRECTORY) and os.listdir(Config.PDF_DIRECTORY):
-        print(f"Loading PDFs from {Config.PDF_DIRECTORY}...")
-        pdf_loader = PyPDFDirectoryLoader(Config.PDF_DIRECTORY)
-        pdf_docs = pdf_loader.load()
-        all_docs.extend(pdf_docs)
-        print(f"Loaded {len(pdf_docs)} pages from PDFs.")
-    else:
+    if not list_pdf_paths():
         print(
             f"Warning: PDF directory '{Config.PDF_DIRECTORY}' is empty or does not exist."
         )
-
-    # Load from Wikipedia
-    wikipedia_keywords_path = "src/data_processing/wikipedia_keywords.txt"
-    wikipedia_keywords = []
-    with open(wikipedia_keywords_path, "r") as f:
-        wikipedia_keywords = [line.strip() for line in f.readlines()]
-    if not wikipedia_keywords:
+    if not read_wikipedia_keywords():
         print(
-            f"Warning: No keywords found in '{wikipedia_keywords_path}'. "
+            f"Warning: No keywords found in '{WIKIPEDIA_KEYWORDS_PATH}'. "
             "Please add keywords to load Wikipedia articles."
         )
-        return []
 
-    print(f"Loading {len(wikipedia_keywords)} articles from Wikipedia...")
-    for keyword in tqdm(wikipedia_keywords, desc="Loading Wikipedia Articles"):
-        try:
-            wiki_loader = WikipediaLoader(
-                query=keyword,
-                load_max_docs=1,
-                doc_content_chars_max=50000,
-                load_all_available_meta=True,
-            )
-            wiki_docs = wiki_loader.load()
-            all_docs.extend(wiki_docs)
-        except Exception as e:
-            print(f"Could not load Wikipedia page for '{keyword}': {e}")
+    sources = discover_sources()
+    deduplicator = None
+    if Config.DEDUP_ENABLED:
+        from src.data_processing.dedup import ChunkDeduplicator, duplicate_sources
+
+        duplicates = duplicate_sources(sources)
+        sources = [s for s in sources if s.source_id not in duplicates]
+        deduplicator = ChunkDeduplicator()
+        for duplicate, canonical in duplicates.items():
+            print(f"Skipping '{duplicate}', identical to '{canonical}'.")
 
-    if not all_docs:
+    chunked_documents = []
+    for batch in iter_chunk_batches(sources):
+        for chunk in batch:
+            if deduplicator is not None:
+                chunk_hash = hash_text(chunk.page_content)
+                # Keyed by position: ids are assigned when the chunks are stored.
+                key = str(len(chunked_documents))
+                if deduplicator.check(key, chunk.page_content, chunk_hash):
+                    continue
+            chunked_documents.append(chunk)
+    if not chunked_documents:
         print("No documents loaded from any source.")
         return []
+    if deduplicator is not None and deduplicator.stats.chunks_dropped:
+        print(
+            f"Dropped {deduplicator.stats.chunks_dropped} duplicate chunks "
+            f"({deduplicator.stats.shrink_ratio:.1%})."
+        )
 
-    # Chunk all documents
-    print(f"\nChunking {len(all_docs)} total documents...")
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=Config.CHUNK_SIZE, chunk_overlap=Config.CHUNK_OVERLAP
-    )
-    chunked_documents = text_splitter.split_documents(all_docs)
     print(f"Successfully chunked documents into {len(chunked_documents)} chunks.")
-
     return chunked_documents
@@ -0,0 +1,234 @@
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from langchain_core.documents import Document
+from tqdm import tqdm
+
+from src.config import Config
+
+WIKIPEDIA_MAX_CHARS = 50000
+SNAPSHOT_SUFFIX = ".json.gz"
+
+
+class WikipediaAPIClient:
+    """Fetches the best-matching Wikipedia article for a keyword via the live API."""
+
+    def fetch(self, keyword: str, max_chars: int) -> List[Document]:
+        from langchain_community.document_loaders import WikipediaLoader
+
+        return WikipediaLoader(
+            query=keyword,
+            load_max_docs=1,
+            doc_content_chars_max=max_chars,
+            load_all_available_meta=True,
+        ).load()
+
+
+@dataclass
+class Snapshot:
+    """The raw documents fetched for one keyword, and when and how they were fetched."""
+
+    keyword: str
+    fetched_at: float
+    max_chars: int
+    documents: List[Document] = field(default_factory=list)
+
+    @property
+    def content_hash(self) -> str:
+        """
+        Hash of the article text and loader settings. It is stable across re-fetches
+        of an unchanged article, and equal for keywords that resolve to one article.
+        """
+        digest = hashlib.sha256(str(self.max_chars).encode("utf-8"))
+        for doc in self.documents:
+            digest.update(b"\x00" + doc.page_content.encode("utf-8"))
+        return digest.hexdigest()
+
+    def age_seconds(self) -> float:
+        return time.time() - self.fetched_at
+
+
+class SnapshotStore:
+    """
+    On-disk store of raw Wikipedia articles: one gzip-compressed JSON file per
+    keyword (page contents plus all metadata), written atomically. Builds read
+    articles from here, so they can run offline once every keyword is stored.
+    """
+
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory or Config.WIKIPEDIA_SNAPSHOT_DIRECTORY
+
+    def path(self, keyword: str) -> str:
+        name = hashlib.sha256(keyword.encode("utf-8")).hexdigest()[:32]
+        return os.path.join(self.directory, name + SNAPSHOT_SUFFIX)
+
+    def get(self, keyword: str) -> Optional[Snapshot]:
+        path = self.path(keyword)
+        if not os.path.exists(path):
+            return None
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable Wikipedia snapshot '{path}': {e}")
+            return None
+        return Snapshot(
+            keyword=data["keyword"],
+            fetched_at=data["fetched_at"],
+            max_chars=data["max_chars"],
+            documents=[
+                Document(page_content=d["page_content"], metadata=d["metadata"])
+                for d in data["documents"]
+            ],
+        )
+
+    def put(self, snapshot: Snapshot) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        data = {
+            "keyword": snapshot.keyword,
+            "fetched_at": snapshot.fetched_at,
+            "max_chars": snapshot.max_chars,
+            "documents": [
+                {"page_content": d.page_content, "metadata": d.metadata}
+                for d in snapshot.documents
+            ],
+        }
+        path = self.path(snapshot.keyword)
+        with gzip.open(path + ".tmp", "wt", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, default=str)
+        os.replace(path + ".tmp", path)
+
+
+def is_stale(
+    snapshot: Optional[Snapshot], max_age_seconds: Optional[float] = None
+) -> bool:
+    """True when there is no snapshot, it is too old, or it used other settings."""
+    max_age_seconds = (
+        Config.WIKIPEDIA_SNAPSHOT_MAX_AGE_DAYS * 86400
+        if max_age_seconds is None
+        else max_age_seconds
+    )
+    return (
+        snapshot is None
+        or snapshot.max_chars != WIKIPEDIA_MAX_CHARS
+        or snapshot.age_seconds() > max_age_seconds
+    )
+
+
+@dataclass
+class RefreshReport:
+    fresh: List[str] = field(default_factory=list)
+    fetched: List[str] = field(default_factory=list)
+    failed: Dict[str, str] = field(default_factory=dict)
+    # Keywords without any snapshot after the refresh (offline or failed).
+    missing: List[str] = field(default_factory=list)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "fresh": len(self.fresh),
+            "fetched": len(self.fetched),
+            "failed": len(self.failed),
+            "missing": len(self.missing),
+        }
+
+
+def refresh_snapshots(
+    keywords: List[str],
+    store: Optional[SnapshotStore] = None,
+    client=None,
+    max_workers: Optional[int] = None,
+    max_age_seconds: Optional[float] = None,
+    offline: Optional[bool] = None,
+) -> RefreshReport:
+    """
+    Fetches the keywords whose snapshot is missing or stale, on a pool of
+    `max_workers` threads, and stores each article as soon as it arrives. A failed
+    fetch keeps the previous snapshot. With `offline` (default
+    `Config.WIKIPEDIA_OFFLINE`) nothing is fetched and stored snapshots are used
+    regardless of age. `client` defaults to the registry's "wikipedia_client".
+    """
+    store = store or SnapshotStore()
+    offline = Config.WIKIPEDIA_OFFLINE if offline is None else offline
+    max_workers = max_workers or Config.WIKIPEDIA_FETCH_WORKERS
+    report = RefreshReport()
+
+    stale = []
+    for keyword in keywords:
+        snapshot = store.get(keyword)
+        if offline:
+            (report.fresh if snapshot else report.missing).append(keyword)
+        elif is_stale(snapshot, max_age_seconds):
+            stale.append((keyword, snapshot is not None))
+        else:
+            report.fresh.append(keyword)
+    if not stale:
+        return report
+
+    if client is None:
+        from src.resources import registry
+
+        client = registry.get("wikipedia_client")
+
+    def fetch(keyword: str) -> Snapshot:
+        documents = client.fetch(keyword, WIKIPEDIA_MAX_CHARS)
+        snapshot = Snapshot(keyword, time.time(), WIKIPEDIA_MAX_CHARS, documents)
+        store.put(snapshot)
+        return snapshot
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(fetch, keyword): (keyword, has_old)
+            for keyword, has_old in stale
+        }
+        for future in tqdm(
+            as_completed(futures), total=len(futures), desc="Fetching Wikipedia"
+        ):
+            keyword, has_old = futures[future]
+            try:
+                future.result()
+                report.fetched.append(keyword)
+            except Exception as e:
+                report.failed[keyword] = str(e)
+                if not has_old:
+                    report.missing.append(keyword)
+    for keyword, error in report.failed.items():
+        print(f"Could not fetch Wikipedia article for '{keyword}': {error}")
+    return report
+
+
+def main(argv=None):
+    from src.data_processing.loader import read_wikipedia_keywords
+
+    parser = argparse.ArgumentParser(
+        description="Refresh the local Wikipedia snapshots used by index builds."
+    )
+    parser.add_argument(
+        "--max-age-days",
+        type=float,
+        default=Config.WIKIPEDIA_SNAPSHOT_MAX_AGE_DAYS,
+        help="Re-fetch snapshots older than this (0 re-fetches everything).",
+    )
+    parser.add_argument("--workers", type=int, default=Config.WIKIPEDIA_FETCH_WORKERS)
+    parser.add_argument(
+        "--offline", action="store_true", help="Only report what is stored."
+    )
+    args = parser.parse_args(argv)
+
+    report = refresh_snapshots(
+        read_wikipedia_keywords(),
+        max_workers=args.workers,
+        max_age_seconds=args.max_age_days * 86400,
+        offline=args.offline,
+    )
+    print(json.dumps(report.summary(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,6 @@
+import numpy as np
 import pandas as pd
 import re
-import ast
-import matplotlib.pyplot as plt
-from sklearn.metrics import confusion_matrix, ConfusionMatrixDisplay, f1_score
-from nltk.translate.bleu_score import sentence_bleu
 from src.config import Config
 
 
@@ -27,92 +24,61 @@ def parse_generated_answer(answer_text: str) -> int:
 
 
 def evaluate_performance(
-    questions: list, generated_answers: list, ground_truths: list, choices_list: list
+    questions: list,
+    generated_answers: list,
+    ground_truths: list,
+    choices_list: list,
+    show_plot: bool = True,
+    plot_path: str = None,
 ):
     """
     Evaluates the RAG system's performance with improved logging and confusion matrix.
+    Metrics come from the vectorized `MetricsEngine`; with `show_plot=False` nothing
+    is displayed, and the confusion matrix is only written to `plot_path` if given.
     """
-    print("--- Starting Evaluation ---")
-
-    predicted_indices = []
-    correct_answers_text = []
-    predicted_answers_text = []
-
-    for i, gen_answer in enumerate(generated_answers):
-        true_index = ground_truths[i]
-        choices = ast.literal_eval(
-            choices_list[i]
-        )  # Safely evaluate string representation of list
-
-        # Get the text of the correct answer
-        correct_text = (
-            choices[true_index - 1] if 0 < true_index <= len(choices) else "N/A"
-        )
-        correct_answers_text.append(correct_text)
+    from src.evaluation.metrics import (
+        MetricsEngine,
+        print_metrics,
+        save_confusion_matrix,
+    )
 
-        # Parse the generated answer to get the predicted index
-        predicted_index = parse_generated_answer(gen_answer)
-        predicted_indices.append(predicted_index)
+    print("--- Starting Evaluation ---")
 
-        # Get the text of the predicted answer
-        predicted_text = (
-            choices[predicted_index - 1]
-            if 0 < predicted_index <= len(choices)
-            else "N/A"
+    engine = MetricsEngine()
+    comparison_df = engine.update(
+        pd.DataFrame(
+            {
+                "question": questions,
+                "answer": generated_answers,
+                "ground_truth": ground_truths,
+                "choices": choices_list,
+            }
         )
-        predicted_answers_text.append(predicted_text)
-
-    # --- Quantitative Metrics ---
-    # Accuracy
-    correct_predictions = sum(
-        1 for i, p_idx in enumerate(predicted_indices) if p_idx == ground_truths[i]
     )
-    accuracy = correct_predictions / len(ground_truths) if len(ground_truths) > 0 else 0
-
-    # F1 Score (Macro)
-    # Use indices for classification report. Ensure labels are consistent.
-    labels = sorted(list(set(ground_truths)))
-    f1 = f1_score(
-        ground_truths,
-        predicted_indices,
-        labels=labels,
-        average="macro",
-        zero_division=0,
-    )
-
-    # BLEU Score (Average)
-    bleu_scores = [
-        sentence_bleu([str(gt).split()], str(p).split())
-        for gt, p in zip(correct_answers_text, predicted_answers_text)
-    ]
-    avg_bleu = sum(bleu_scores) / len(bleu_scores) if bleu_scores else 0
+    metrics = engine.snapshot()
 
     print("\n--- Quantitative Metrics Summary ---")
-    print(f"Accuracy: {accuracy:.4f}")
-    print(f"F1 Score (Macro): {f1:.4f}")
-    print(f"Average BLEU Score: {avg_bleu:.4f}")
+    print_metrics(metrics)
     print(f"Hallucination Rate: Not calculated (context unavailable)")
 
     # --- Qualitative Analysis ---
     print("\n--- Detailed Comparison Log ---")
-    comparison_df = pd.DataFrame(
-        {
-            "Question": questions,
-            "Correct Answer": correct_answers_text,
-            "Predicted Answer": predicted_answers_text,
-            "Is Correct?": [p == t for p, t in zip(predicted_indices, ground_truths)],
-        }
-    )
-    print(comparison_df.to_markdown(index=False))
-
-    # --- Confusion Matrix ---
-    print("\n--- Confusion Matrix ---")
-    cm = confusion_matrix(ground_truths, predicted_indices, labels=labels)
-    disp = ConfusionMatrixDisplay(
-        confusion_matrix=cm, display_labels=[f"Choice {l}" for l in labels]
-    )
+    print(comparison_df.drop(columns="BLEU").to_markdown(index=False))
+
+    if plot_path:
+        save_confusion_matrix(metrics, plot_path)
+    if show_plot:
+        import matplotlib.pyplot as plt
+        from sklearn.metrics import ConfusionMatrixDisplay
+
+        print("\n--- Confusion Matrix ---")
+        disp = ConfusionMatrixDisplay(
+            confusion_matrix=np.array(metrics.confusion_matrix),
+            display_labels=[f"Choice {l}" for l in metrics.labels],
+        )
 
-    fig, ax = plt.subplots(figsize=(8, 8))
-    disp.plot(ax=ax, cmap=plt.cm.Blues)
-    plt.title("Confusion Matrix of Predicted vs. True Answers")
-    plt.show()
+        fig, ax = plt.subplots(figsize=(8, 8))
+        disp.plot(ax=ax, cmap=plt.cm.Blues)
+        plt.title("Confusion Matrix of Predicted vs. True Answers")
+        plt.show()
+    return metrics
@@ -0,0 +1,317 @@
+import argparse
+import ast
+import functools
+import json
+import os
+import threading
+from collections import Counter
+from dataclasses import asdict, dataclass
+from typing import Dict, Iterable, List, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+from src.config import Config
+
+MISSING_CHOICE = "N/A"
+
+
+def parse_answer_indices(answers: Union[pd.Series, Sequence[str]]) -> np.ndarray:
+    """
+    Vectorized `parse_generated_answer`: the number in the first "(n)", else the
+    first digit, else -1.
+    """
+    answers = pd.Series(answers, dtype=object).fillna("").astype(str)
+    in_parentheses = answers.str.extract(r"\((\d+)\)", expand=False)
+    first_digit = answers.str.extract(r"(\d)", expand=False)
+    return in_parentheses.fillna(first_digit).fillna(-1).astype(np.int64).to_numpy()
+
+
+@functools.lru_cache(maxsize=100000)
+def _bleu(reference: str, hypothesis: str) -> float:
+    from nltk.translate.bleu_score import sentence_bleu
+
+    return float(sentence_bleu([reference.split()], hypothesis.split()))
+
+
+def bleu_scores(references: Sequence[str], hypotheses: Sequence[str]) -> np.ndarray:
+    """
+    Sentence BLEU per pair. Both sides are answer choices, so the same pairs recur
+    and each distinct pair is scored once per process.
+    """
+    return np.fromiter(
+        (_bleu(str(r), str(h)) for r, h in zip(references, hypotheses)),
+        dtype=np.float64,
+        count=len(references),
+    )
+
+
+class ChoiceTable:
+    """
+    Answer choices parsed once per distinct choices string (the dataset stores them
+    as Python list literals) into a padded matrix, so the text of any choice index
+    is looked up for a whole batch at once. New strings are appended in place; the
+    matrix doubles its capacity when full, so adding rows one at a time stays
+    linear in the number of distinct strings.
+    """
+
+    def __init__(self):
+        self._row_of: Dict[str, int] = {}
+        self._matrix = np.full((0, 1), MISSING_CHOICE, dtype=object)
+        self._lengths = np.zeros(0, dtype=np.int64)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._row_of)
+
+    def _append(self, values: List[str]) -> None:
+        row = len(self._row_of)
+        capacity, width = self._matrix.shape
+        if row >= capacity or len(values) > width:
+            grown = np.full(
+                (max(2 * capacity, row + 1, 64), max(width, len(values))),
+                MISSING_CHOICE,
+                dtype=object,
+            )
+            grown[:row, :width] = self._matrix[:row]
+            lengths = np.zeros(len(grown), dtype=np.int64)
+            lengths[:row] = self._lengths[:row]
+            self._matrix, self._lengths = grown, lengths
+        self._matrix[row, : len(values)] = values
+        self._lengths[row] = len(values)
+
+    def rows(self, choices: Union[pd.Series, Sequence[str]]) -> np.ndarray:
+        """Row ids of the given choices strings, parsing the ones not seen before."""
+        choices = pd.Series(choices, dtype=object)
+        with self._lock:
+            for value in pd.unique(choices):
+                if value not in self._row_of:
+                    self._append([str(c) for c in ast.literal_eval(value)])
+                    self._row_of[value] = len(self._row_of)
+            # A dict lookup per value: `Series.map(dict)` copies the whole dict.
+            return np.fromiter(
+                (self._row_of[value] for value in choices),
+                dtype=np.int64,
+                count=len(choices),
+            )
+
+    def text(self, rows: np.ndarray, indices: np.ndarray) -> np.ndarray:
+        """Text of the 1-based choice `indices` of `rows`, or "N/A" when out of range."""
+        texts = np.full(len(rows), MISSING_CHOICE, dtype=object)
+        valid = (indices > 0) & (indices <= self._lengths[rows])
+        texts[valid] = self._matrix[rows[valid], indices[valid] - 1]
+        return texts
+
+
+@dataclass
+class RunMetrics:
+    run: str
+    count: int
+    accuracy: float
+    macro_f1: float
+    bleu: float
+    labels: List[int]
+    confusion_matrix: List[List[int]]
+
+
+class RunAccumulator:
+    """Running counts of one evaluation run; every metric derives from them."""
+
+    def __init__(self):
+        self.count = 0
+        self.correct = 0
+        self.bleu_sum = 0.0
+        self.pairs: Counter = Counter()  # (true index, predicted index) -> count
+
+    def add(self, truth: np.ndarray, predicted: np.ndarray, bleu: np.ndarray) -> None:
+        self.count += len(truth)
+        self.correct += int(np.sum(truth == predicted))
+        self.bleu_sum += float(bleu.sum())
+        if len(truth):
+            pairs, counts = np.unique(
+                np.stack([truth, predicted]), axis=1, return_counts=True
+            )
+            for (t, p), n in zip(pairs.T.tolist(), counts.tolist()):
+                self.pairs[(t, p)] += n
+
+    def labels(self) -> List[int]:
+        return sorted({t for t, _ in self.pairs})
+
+    def confusion_matrix(self) -> np.ndarray:
+        """Confusion matrix over the ground-truth labels (rows: true, cols: predicted)."""
+        labels = self.labels()
+        position = {label: i for i, label in enumerate(labels)}
+        matrix = np.zeros((len(labels), len(labels)), dtype=np.int64)
+        for (t, p), n in self.pairs.items():
+            if p in position:
+                matrix[position[t], position[p]] += n
+        return matrix
+
+    def macro_f1(self) -> float:
+        """
+        Macro F1 over the ground-truth labels, like sklearn's `f1_score(...,
+        labels=sorted(set(truth)), average="macro", zero_division=0)`.
+        """
+        labels = self.labels()
+        if not labels:
+            return 0.0
+        true_counts, predicted_counts = Counter(), Counter()
+        for (t, p), n in self.pairs.items():
+            true_counts[t] += n
+            predicted_counts[p] += n
+        scores = []
+        for label in labels:
+            denominator = true_counts[label] + predicted_counts[label]
+            tp = self.pairs.get((label, label), 0)
+            scores.append(2 * tp / denominator if denominator else 0.0)
+        return float(np.mean(scores))
+
+    def snapshot(self, run: str) -> RunMetrics:
+        return RunMetrics(
+            run=run,
+            count=self.count,
+            accuracy=self.correct / self.count if self.count else 0.0,
+            macro_f1=self.macro_f1(),
+            bleu=self.bleu_sum / self.count if self.count else 0.0,
+            labels=self.labels(),
+            confusion_matrix=self.confusion_matrix().tolist(),
+        )
+
+
+class MetricsEngine:
+    """
+    Incremental accuracy, macro-F1, confusion matrix and BLEU for any number of
+    evaluation runs. Results are fed in batches (or one at a time, as the runner
+    finishes them); each batch is parsed with vectorized pandas/NumPy operations
+    and only folded into per-run counts, so the cost per result stays constant no
+    matter how many rows a run has. Thread-safe.
+    """
+
+    def __init__(self):
+        self.choices = ChoiceTable()
+        self._runs: Dict[str, RunAccumulator] = {}
+        self._lock = threading.Lock()
+
+    def update(
+        self, results: Union[pd.DataFrame, Iterable[dict]], run: str = "default"
+    ) -> pd.DataFrame:
+        """
+        Adds runner results (answer, ground_truth and choices columns) to `run`.
+        Returns the per-row comparison of the batch (question, correct and predicted
+        answer, correctness, BLEU); the question is empty for results without one.
+        """
+        if not isinstance(results, pd.DataFrame):
+            results = pd.DataFrame(list(results))
+        if results.empty:
+            return pd.DataFrame(
+                columns=[
+                    "Question",
+                    "Correct Answer",
+                    "Predicted Answer",
+                    "Is Correct?",
+                    "BLEU",
+                ]
+            )
+
+        truth = results["ground_truth"].to_numpy(dtype=np.int64)
+        predicted = parse_answer_indices(results["answer"])
+        rows = self.choices.rows(results["choices"])
+        correct_text = self.choices.text(rows, truth)
+        predicted_text = self.choices.text(rows, predicted)
+        bleu = bleu_scores(correct_text, predicted_text)
+
+        with self._lock:
+            self._runs.setdefault(run, RunAccumulator()).add(truth, predicted, bleu)
+
+        return pd.DataFrame(
+            {
+                "Question": (
+                    results["question"].values
+                    if "question" in results
+                    else [None] * len(results)
+                ),
+                "Correct Answer": correct_text,
+                "Predicted Answer": predicted_text,
+                "Is Correct?": truth == predicted,
+                "BLEU": bleu,
+            }
+        )
+
+    def runs(self) -> List[str]:
+        with self._lock:
+            return list(self._runs)
+
+    def snapshot(self, run: str = "default") -> RunMetrics:
+        with self._lock:
+            return self._runs.setdefault(run, RunAccumulator()).snapshot(run)
+
+    def summary(self) -> pd.DataFrame:
+        """One row of metrics per run."""
+        rows = [asdict(self.snapshot(run)) for run in self.runs()]
+        columns = ["run", "count", "accuracy", "macro_f1", "bleu"]
+        return pd.DataFrame(rows, columns=columns + ["labels", "confusion_matrix"])[
+            columns
+        ]
+
+
+def print_metrics(metrics: RunMetrics) -> None:
+    print(f"Accuracy: {metrics.accuracy:.4f}")
+    print(f"F1 Score (Macro): {metrics.macro_f1:.4f}")
+    print(f"Average BLEU Score: {metrics.bleu:.4f}")
+
+
+def save_confusion_matrix(metrics: RunMetrics, path: str) -> None:
+    """Renders the confusion matrix to an image file without a display."""
+    from matplotlib.figure import Figure
+    from sklearn.metrics import ConfusionMatrixDisplay
+
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    fig = Figure(figsize=(8, 8))
+    ax = fig.subplots()
+    ConfusionMatrixDisplay(
+        confusion_matrix=np.array(metrics.confusion_matrix),
+        display_labels=[f"Choice {label}" for label in metrics.labels],
+    ).plot(ax=ax, cmap="Blues")
+    ax.set_title(f"Confusion Matrix ({metrics.run})")
+    fig.savefig(path, bbox_inches="tight")
+
+
+def evaluate_checkpoints(
+    paths: Sequence[str], chunk_size: Optional[int] = None
+) -> MetricsEngine:
+    """Streams runner checkpoints (JSONL) into one engine, one run per file."""
+    chunk_size = chunk_size or Config.EVAL_METRICS_CHUNK_SIZE
+    engine = MetricsEngine()
+    for path in paths:
+        run = os.path.splitext(os.path.basename(path))[0]
+        for chunk in pd.read_json(path, lines=True, chunksize=chunk_size):
+            engine.update(chunk, run=run)
+    return engine
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Compute evaluation metrics for one or more runner checkpoints."
+    )
+    parser.add_argument("checkpoints", nargs="+", help="JSONL files from the runner.")
+    parser.add_argument(
+        "--plot-dir", default=None, help="Write each run's confusion matrix here."
+    )
+    parser.add_argument("--json", action="store_true", help="Print JSON instead.")
+    args = parser.parse_args(argv)
+
+    engine = evaluate_checkpoints(args.checkpoints)
+    if args.json:
+        print(json.dumps([asdict(engine.snapshot(r)) for r in engine.runs()], indent=2))
+    else:
+        print(engine.summary().to_string(index=False, float_format="%.4f"))
+    if args.plot_dir:
+        for run in engine.runs():
+            save_confusion_matrix(
+                engine.snapshot(run), os.path.join(args.plot_dir, f"{run}.png")
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+import argparse
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Optional
+
+import pandas as pd
+from tqdm import tqdm
+
+from src.config import Config
+
+
+def load_checkpoint(path: str) -> Dict[str, dict]:
+    """Reads the results already written to a JSONL checkpoint, keyed by question id."""
+    results = {}
+    if not os.path.exists(path):
+        return results
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A run killed mid-write can leave a truncated last line.
+                continue
+            results[str(record["id"])] = record
+    return results
+
+
+class CheckpointWriter:
+    """Appends one JSON line per finished question, flushed so a crash loses nothing."""
+
+    def __init__(self, path: str):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def write(self, record: dict) -> None:
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def answer_question(
+    graph, question_id: str, row: pd.Series, retrieved_docs: Optional[list] = None
+) -> dict:
+    """
+    Runs one question through the graph, retrying failures (e.g. Groq rate-limit
+    errors) with a linear backoff of `Config.BATCH_DELAY_SECONDS` per attempt. The
+    answer is never served from or stored in the semantic cache.
+    """
+    # The graph sees only the question, not its choices, so a cached answer of a
+    # similar question may pick an option of a different choice list.
+    inputs = {
+        "query": row["question"],
+        "conversation_history": "",
+        "cache_answers": False,
+    }
+    if retrieved_docs is not None:
+        inputs["retrieved_docs"] = retrieved_docs
+    last_error = None
+    for attempt in range(1, Config.EVAL_MAX_ATTEMPTS + 1):
+        start = time.perf_counter()
+        try:
+            result = graph.invoke(inputs)
+            return {
+                "id": question_id,
+                "question": row["question"],
+                "answer": result["answer"],
+                "ground_truth": int(row["answer"]),
+                "choices": row["choices"],
+                "latency_seconds": time.perf_counter() - start,
+                "attempts": attempt,
+                "timings": result.get("timings", {}),
+            }
+        except Exception as e:
+            last_error = e
+            if attempt < Config.EVAL_MAX_ATTEMPTS:
+                time.sleep(Config.BATCH_DELAY_SECONDS * attempt)
+    raise RuntimeError(f"Question {question_id} failed: {last_error}") from last_error
+
+
+def run_evaluation(
+    eval_df: pd.DataFrame,
+    graph=None,
+    max_workers: Optional[int] = None,
+    checkpoint_path: Optional[str] = None,
+    resume: bool = True,
+    batch_retrieval: bool = False,
+    metrics=None,
+) -> List[dict]:
+    """
+    Answers every question of `eval_df` concurrently and checkpoints each result to
+    JSONL. Questions already present in the checkpoint are skipped when `resume` is
+    set, so an interrupted run picks up where it stopped. Groq calls are throttled by
+    the shared rate limiter attached to the LLM (see `Config.GROQ_REQUESTS_PER_MINUTE`).
+    With `batch_retrieval`, documents for each group of `Config.BATCH_RETRIEVAL_SIZE`
+    questions are retrieved and reranked together before generation. A
+    `MetricsEngine` passed as `metrics` is updated as each answer arrives (resumed
+    answers included), and its running accuracy is shown on the progress bar.
+    Answers are never served from the semantic cache during a run.
+
+    Returns the results in the order of `eval_df`; failed questions are omitted and
+    will be retried by the next resumed run.
+    """
+    if batch_retrieval:
+        from src.rag_pipeline.batch_retrieval import retrieve_and_rerank_batch
+
+    if graph is None:
+        from src.rag_pipeline.graph import build_rag_graph
+
+        graph = build_rag_graph()
+
+    max_workers = max_workers or Config.EVAL_MAX_CONCURRENCY
+    checkpoint_path = checkpoint_path or Config.EVAL_CHECKPOINT_PATH
+    if not resume and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+
+    done = load_checkpoint(checkpoint_path)
+    pending = [
+        (str(index), row) for index, row in eval_df.iterrows() if str(index) not in done
+    ]
+    print(
+        f"{len(done)} questions already answered, {len(pending)} to run "
+        f"with {max_workers} workers."
+    )
+
+    if metrics is not None and done:
+        metrics.update(
+            done[str(index)] for index in eval_df.index if str(index) in done
+        )
+
+    writer = CheckpointWriter(checkpoint_path)
+    failures = 0
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = []
+            step = Config.BATCH_RETRIEVAL_SIZE if batch_retrieval else len(pending)
+            for start in range(0, len(pending), max(step, 1)):
+                group = pending[start : start + step]
+                prefetched = [None] * len(group)
+                if batch_retrieval:
+                    prefetched = retrieve_and_rerank_batch(
+                        [row["question"] for _, row in group]
+                    )
+                futures.extend(
+                    executor.submit(answer_question, graph, question_id, row, docs)
+                    for (question_id, row), docs in zip(group, prefetched)
+                )
+            progress = tqdm(
+                as_completed(futures), total=len(futures), desc="Answering questions"
+            )
+            for future in progress:
+                try:
+                    record = future.result()
+                except Exception as e:
+                    failures += 1
+                    print(e)
+                    continue
+                writer.write(record)
+                done[record["id"]] = record
+                if metrics is not None:
+                    metrics.update([record])
+                    progress.set_postfix(accuracy=f"{metrics.snapshot().accuracy:.3f}")
+    finally:
+        writer.close()
+
+    if failures:
+        print(f"{failures} questions failed; re-run with resume to retry them.")
+    return [done[str(index)] for index in eval_df.index if str(index) in done]
+
+
+def summarize_timings(results: List[dict]) -> Dict[str, float]:
+    """Mean per-stage latency over the results that recorded it."""
+    values: Dict[str, List[float]] = {}
+    for record in results:
+        timings = dict(record.get("timings") or {})
+        timings["latency_seconds"] = record["latency_seconds"]
+        for key, value in timings.items():
+            values.setdefault(key, []).append(value)
+    return {key: sum(v) / len(v) for key, v in values.items()}
+
+
+def evaluate_results(
+    results: List[dict], metrics=None, plot_path: Optional[str] = None
+):
+    """
+    Prints the metrics of runner results without blocking on a plot window; the
+    confusion matrix is written to `plot_path` instead. Reuses `metrics` when the
+    engine already saw the results during the run.
+    """
+    from src.evaluation.metrics import (
+        MetricsEngine,
+        print_metrics,
+        save_confusion_matrix,
+    )
+
+    if metrics is None:
+        metrics = MetricsEngine()
+        metrics.update(results)
+    snapshot = metrics.snapshot()
+    print(f"\n--- Quantitative Metrics Summary ({snapshot.count} questions) ---")
+    print_metrics(snapshot)
+    if plot_path:
+        save_confusion_matrix(snapshot, plot_path)
+        print(f"Confusion matrix written to '{plot_path}'.")
+    return snapshot
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Run the RAG evaluation concurrently with checkpointing."
+    )
+    parser.add_argument("--data", default=Config.EVAL_DATA_PATH)
+    parser.add_argument(
+        "--sample-frac", type=float, default=1.0, help="Fraction of questions to run."
+    )
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workers", type=int, default=Config.EVAL_MAX_CONCURRENCY)
+    parser.add_argument(
+        "--rpm",
+        type=float,
+        default=Config.GROQ_REQUESTS_PER_MINUTE,
+        help="Maximum Groq requests per minute.",
+    )
+    parser.add_argument("--checkpoint", default=Config.EVAL_CHECKPOINT_PATH)
+    parser.add_argument(
+        "--no-resume", action="store_true", help="Discard an existing checkpoint."
+    )
+    parser.add_argument(
+        "--batch-retrieval",
+        action="store_true",
+        help="Retrieve and rerank questions in cross-query batches.",
+    )
+    args = parser.parse_args(argv)
+
+    Config.GROQ_REQUESTS_PER_MINUTE = args.rpm
+    eval_df = pd.read_csv(args.data)
+    if args.sample_frac < 1.0:
+        eval_df = eval_df.sample(frac=args.sample_frac, random_state=args.seed)
+
+    from src.evaluation.metrics import MetricsEngine
+
+    metrics = MetricsEngine()
+    start = time.perf_counter()
+    results = run_evaluation(
+        eval_df,
+        max_workers=args.workers,
+        checkpoint_path=args.checkpoint,
+        resume=not args.no_resume,
+        batch_retrieval=args.batch_retrieval,
+        metrics=metrics,
+    )
+    print(f"Answered {len(results)} questions in {time.perf_counter() - start:.1f}s.")
+    if results:
+        print("\nMean latency per stage:")
+        for key, value in sorted(summarize_timings(results).items()):
+            print(f"  {key:<32} {value:.3f}")
+        evaluate_results(
+            results,
+            metrics=metrics,
+            plot_path=os.path.splitext(args.checkpoint)[0] + "_confusion.png",
+        )
+
+
+if __name__ == "__main__":
+    main()
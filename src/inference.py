@@ -0,0 +1,253 @@
+import argparse
+import json
+import os
+import random
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from src.config import Config
+
+INFERENCE_BACKENDS = ("torch", "onnx")
+
+
+def configure_threads() -> None:
+    """Applies `Config.INFERENCE_THREADS` to PyTorch (0 keeps the library default)."""
+    if Config.INFERENCE_THREADS > 0:
+        import torch
+
+        torch.set_num_threads(Config.INFERENCE_THREADS)
+
+
+def onnx_file_name() -> str:
+    """The ONNX file to load: the dynamically int8-quantized export unless disabled."""
+    if Config.ONNX_QUANTIZATION == "none":
+        return "onnx/model.onnx"
+    return f"onnx/model_qint8_{Config.ONNX_QUANTIZATION}.onnx"
+
+
+def model_tag(model_name: str, backend: Optional[str] = None) -> str:
+    """
+    Identifies a model and the backend serving it, e.g. for embedding cache keys:
+    quantized ONNX outputs differ slightly from PyTorch and must not be mixed.
+    """
+    backend = backend or Config.INFERENCE_BACKEND
+    if backend == "torch":
+        return model_name
+    return f"{model_name}@onnx-{Config.ONNX_QUANTIZATION}"
+
+
+def _onnx_model_kwargs() -> Dict[str, Any]:
+    try:
+        import onnxruntime
+    except ImportError as e:
+        raise ImportError(
+            "The ONNX backend needs ONNX Runtime and Optimum: "
+            "pip install 'optimum[onnxruntime]'"
+        ) from e
+
+    session_options = onnxruntime.SessionOptions()
+    if Config.INFERENCE_THREADS > 0:
+        session_options.intra_op_num_threads = Config.INFERENCE_THREADS
+        session_options.inter_op_num_threads = 1
+    return {
+        "file_name": onnx_file_name(),
+        "provider": "CPUExecutionProvider",
+        "session_options": session_options,
+    }
+
+
+def export_onnx_model(model_cls, model_name: str) -> str:
+    """
+    Exports a SentenceTransformer or CrossEncoder model to ONNX (plus a dynamically
+    int8-quantized copy for `Config.ONNX_QUANTIZATION`) under
+    `Config.ONNX_MODEL_DIRECTORY`, once. Returns the directory to load it from.
+    """
+    directory = os.path.join(Config.ONNX_MODEL_DIRECTORY, model_name.replace("/", "_"))
+    if os.path.exists(os.path.join(directory, onnx_file_name())):
+        return directory
+
+    from sentence_transformers import export_dynamic_quantized_onnx_model
+
+    print(f"Exporting '{model_name}' to ONNX in '{directory}'...")
+    model = model_cls(model_name, backend="onnx", device="cpu")
+    model.save_pretrained(directory)
+    if Config.ONNX_QUANTIZATION != "none":
+        export_dynamic_quantized_onnx_model(model, Config.ONNX_QUANTIZATION, directory)
+    return directory
+
+
+def load_embeddings(backend: Optional[str] = None):
+    """
+    Loads `Config.EMBEDDING_MODEL` with the selected inference backend: plain
+    PyTorch, or ONNX Runtime (exported and quantized on first use).
+    """
+    from langchain_huggingface.embeddings import HuggingFaceEmbeddings
+
+    backend = backend or Config.INFERENCE_BACKEND
+    configure_threads()
+    print(f"Initializing embedding model: {Config.EMBEDDING_MODEL} ({backend})")
+    if backend == "torch":
+        # Using 'cpu' for broader compatibility. Change to 'cuda' if a GPU is available.
+        return HuggingFaceEmbeddings(
+            model_name=Config.EMBEDDING_MODEL,
+            model_kwargs={"device": "cpu"},
+        )
+    if backend != "onnx":
+        raise ValueError(f"Unknown inference backend '{backend}'.")
+
+    from sentence_transformers import SentenceTransformer
+
+    return HuggingFaceEmbeddings(
+        model_name=export_onnx_model(SentenceTransformer, Config.EMBEDDING_MODEL),
+        model_kwargs={
+            "device": "cpu",
+            "backend": "onnx",
+            "model_kwargs": _onnx_model_kwargs(),
+        },
+    )
+
+
+def load_cross_encoder(backend: Optional[str] = None):
+    """Loads `Config.RERANKER_MODEL` with the selected inference backend."""
+    from langchain_community.cross_encoders import HuggingFaceCrossEncoder
+
+    backend = backend or Config.INFERENCE_BACKEND
+    configure_threads()
+    if backend == "torch":
+        return HuggingFaceCrossEncoder(model_name=Config.RERANKER_MODEL)
+    if backend != "onnx":
+        raise ValueError(f"Unknown inference backend '{backend}'.")
+
+    from sentence_transformers import CrossEncoder
+
+    return HuggingFaceCrossEncoder(
+        model_name=export_onnx_model(CrossEncoder, Config.RERANKER_MODEL),
+        model_kwargs={
+            "device": "cpu",
+            "backend": "onnx",
+            "model_kwargs": _onnx_model_kwargs(),
+        },
+    )
+
+
+# --- Parity and throughput comparison ---
+
+
+def _throughput(fn, items: List[Any], repeats: int = 1):
+    fn(items[: min(len(items), 8)])  # warm-up
+    start = time.perf_counter()
+    for _ in range(repeats):
+        outputs = fn(items)
+    return outputs, len(items) * repeats / (time.perf_counter() - start)
+
+
+def _top_k_overlap(reference: np.ndarray, candidate: np.ndarray, k: int) -> float:
+    """Mean share of each row's top-k columns of `reference` also top-k in `candidate`."""
+    k = min(k, reference.shape[1])
+    ref_top = np.argsort(-reference, axis=1)[:, :k]
+    cand_top = np.argsort(-candidate, axis=1)[:, :k]
+    return float(np.mean([len(set(r) & set(c)) / k for r, c in zip(ref_top, cand_top)]))
+
+
+def compare_embeddings(queries: List[str], passages: List[str]) -> Dict[str, float]:
+    """
+    Embeds the same passages with both backends: throughput of each, cosine between
+    the paired vectors, and agreement of each query's top-10 passages.
+    """
+    from src.vector_store.embedding_cache import embed_queries
+
+    results = {}
+    vectors = {}
+    for backend in INFERENCE_BACKENDS:
+        model = load_embeddings(backend)
+        passage_vectors, rate = _throughput(model.embed_documents, passages)
+        vectors[backend] = (
+            np.asarray(embed_queries(model, queries), dtype=np.float32),
+            np.asarray(passage_vectors, dtype=np.float32),
+        )
+        results[f"{backend}_texts_per_second"] = rate
+
+    (torch_q, torch_p), (onnx_q, onnx_p) = vectors["torch"], vectors["onnx"]
+    norms = np.linalg.norm(torch_p, axis=1) * np.linalg.norm(onnx_p, axis=1)
+    cosine = np.sum(torch_p * onnx_p, axis=1) / np.maximum(norms, 1e-12)
+    results.update(
+        {
+            "speedup": results["onnx_texts_per_second"]
+            / results["torch_texts_per_second"],
+            "cosine_mean": float(cosine.mean()),
+            "cosine_min": float(cosine.min()),
+            "top10_overlap": _top_k_overlap(torch_q @ torch_p.T, onnx_q @ onnx_p.T, 10),
+        }
+    )
+    return results
+
+
+def compare_cross_encoders(
+    queries: List[str], passages: List[str], passages_per_query: int = 20
+) -> Dict[str, float]:
+    """
+    Scores the same (query, passage) pairs with both backends: throughput of each,
+    the largest score difference and agreement of each query's top `RERANK_K`.
+    """
+    from src.rag_pipeline.reranking import score_pairs
+
+    rng = random.Random(0)
+    pairs = [
+        (query, passage)
+        for query in queries
+        for passage in rng.sample(passages, min(passages_per_query, len(passages)))
+    ]
+    results = {}
+    scores = {}
+    for backend in INFERENCE_BACKENDS:
+        model = load_cross_encoder(backend)
+        backend_scores, rate = _throughput(
+            lambda batch: score_pairs(model, batch), pairs
+        )
+        scores[backend] = np.asarray(backend_scores, dtype=np.float32).reshape(
+            len(queries), -1
+        )
+        results[f"{backend}_pairs_per_second"] = rate
+
+    results.update(
+        {
+            "speedup": results["onnx_pairs_per_second"]
+            / results["torch_pairs_per_second"],
+            "max_abs_diff": float(np.abs(scores["torch"] - scores["onnx"]).max()),
+            f"top{Config.RERANK_K}_overlap": _top_k_overlap(
+                scores["torch"], scores["onnx"], Config.RERANK_K
+            ),
+        }
+    )
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Compare the ONNX Runtime backend with PyTorch for the embedding "
+        "and reranker models: output parity and throughput."
+    )
+    parser.add_argument("--index", default=Config.LOCAL_INDEX_DIRECTORY)
+    parser.add_argument("--data", default=Config.EVAL_DATA_PATH)
+    parser.add_argument("--questions", type=int, default=20)
+    parser.add_argument("--passages", type=int, default=256)
+    args = parser.parse_args(argv)
+
+    from src.benchmark.suite import load_questions
+    from src.vector_store.local_store import LocalVectorStore
+
+    queries = load_questions(args.data, args.questions)
+    texts = LocalVectorStore.load(args.index).texts
+    passages = random.Random(0).sample(texts, min(args.passages, len(texts)))
+
+    results = {
+        "embeddings": compare_embeddings(queries, passages),
+        "cross_encoder": compare_cross_encoders(queries, passages),
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Sequence
+
+from langchain_core.documents import Document
+
+from src.config import Config
+from src.rag_pipeline.chains import search_by_vector
+from src.rag_pipeline.reranking import (
+    RerankCascade,
+    model_name,
+    prefilter,
+    run_cascades,
+)
+from src.resources import registry
+from src.vector_store.bm25 import fuse_results
+from src.vector_store.embedding_cache import embed_queries
+
+
+def batch_vector_search(
+    vector_store, query_vectors: Sequence[Sequence[float]], k: int
+) -> List[List[Document]]:
+    """
+    Runs one similarity search per query vector. The local store answers the whole
+    batch in a single vectorized pass; MongoDB Atlas searches run concurrently.
+    """
+    if hasattr(vector_store, "similarity_search_with_score_by_vector_batch"):
+        results = vector_store.similarity_search_with_score_by_vector_batch(
+            query_vectors, k
+        )
+        return [[doc for doc, _ in hits] for hits in results]
+
+    def search(vector):
+        return search_by_vector(vector_store, vector, k=k)
+
+    with ThreadPoolExecutor(max_workers=Config.BATCH_SEARCH_CONCURRENCY) as executor:
+        return list(executor.map(search, query_vectors))
+
+
+def retrieve_and_rerank_batch(
+    queries: List[str],
+    k: Optional[int] = None,
+    top_n: Optional[int] = None,
+) -> List[List[Document]]:
+    """
+    Batched equivalent of the retrieve node for many queries known up front: embeds
+    all queries in one call, runs the vector searches together and reranks all
+    queries in shared cross-encoder batches. Each query gets back the same top
+    `RERANK_K` documents as the per-query path: BM25 rank fusion when a BM25 index is
+    available, and with `RERANK_CASCADE_ENABLED` the cascade's prefilter, score cache
+    and early exit, run round by round for all queries at once (see `run_cascades`).
+    """
+    if not queries:
+        return []
+    k = k or Config.RETRIEVAL_K
+    top_n = top_n or Config.RERANK_K
+
+    embeddings = registry.get("embeddings")
+    vector_store = registry.get("vector_store")
+    cross_encoder = registry.get("cross_encoder")
+
+    query_vectors = embed_queries(embeddings, list(queries))
+    candidates = batch_vector_search(vector_store, query_vectors, k)
+
+    bm25_index = registry.get("bm25_index") if Config.HYBRID_RETRIEVAL_ENABLED else None
+    if bm25_index is not None:
+        # Same rank fusion as the retrieve node's HybridRetriever.
+        candidates = [
+            fuse_results(query, docs, bm25_index, vector_store)
+            for query, docs in zip(queries, candidates)
+        ]
+
+    model = model_name(cross_encoder)
+    cascades = []
+    for query, docs in zip(queries, candidates):
+        if Config.RERANK_CASCADE_ENABLED:
+            order = prefilter(
+                vector_store, query, docs, top_n, Config.RERANK_PREFILTER_K
+            )
+            cascade = RerankCascade(
+                query,
+                docs,
+                model,
+                top_n,
+                order,
+                score_cache=registry.get("rerank_score_cache"),
+            )
+        else:
+            # Like `CrossEncoderReranker`: every candidate in one batch, no exit.
+            cascade = RerankCascade(
+                query,
+                docs,
+                model,
+                top_n,
+                range(len(docs)),
+                step=max(len(docs), 1),
+                margin=float("inf"),
+            )
+        cascades.append(cascade)
+    run_cascades(cross_encoder, cascades)
+    return [cascade.ranked() for cascade in cascades]
@@ -1,39 +1,214 @@
+from typing import Any, List, Optional, Sequence
+
 from langchain.prompts import PromptTemplate
 from langchain_core.output_parsers import StrOutputParser
+from langchain_core.rate_limiters import InMemoryRateLimiter
 from langchain_groq import ChatGroq
 from langchain.retrievers import ContextualCompressionRetriever
 from langchain.retrievers.document_compressors import CrossEncoderReranker
-from langchain_community.cross_encoders import HuggingFaceCrossEncoder
+from langchain_community.cross_encoders import BaseCrossEncoder
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForRetrieverRun,
+    CallbackManagerForRetrieverRun,
+    Callbacks,
+)
+from langchain_core.documents import Document
 from langchain_core.retrievers import BaseRetriever
+from langchain_core.runnables.config import run_in_executor
+from langchain_core.vectorstores import VectorStore, VectorStoreRetriever
 
 from src.config import Config
+from src.inference import load_cross_encoder
+from src.rag_pipeline.reranking import CascadeReranker, RerankScoreCache
+from src.tracing import TokenUsageCallback, trace_stage
+from src.vector_store.bm25 import fuse_results
+
+
+def create_rate_limiter() -> InMemoryRateLimiter:
+    """
+    Creates the token-bucket limiter that throttles Groq requests to
+    `Config.GROQ_REQUESTS_PER_MINUTE`. Share one instance across threads.
+    """
+    return InMemoryRateLimiter(
+        requests_per_second=Config.GROQ_REQUESTS_PER_MINUTE / 60,
+        check_every_n_seconds=0.05,
+        max_bucket_size=Config.GROQ_MAX_BURST,
+    )
 
 
-def get_llm():
+def get_llm(rate_limiter: Optional[InMemoryRateLimiter] = None):
     """Initializes and returns the main LLM."""
     if not Config.GROQ_API_KEY:
         raise ValueError("No Groq API key found in configuration.")
     return ChatGroq(
-        temperature=0, groq_api_key=Config.GROQ_API_KEY, model_name=Config.LLM_MODEL
+        temperature=0,
+        groq_api_key=Config.GROQ_API_KEY,
+        model_name=Config.LLM_MODEL,
+        rate_limiter=rate_limiter,
+    )
+
+
+def search_by_vector(
+    vector_store: VectorStore, query_vector: List[float], **search_kwargs
+) -> List[Document]:
+    """
+    Similarity search with an already embedded query. `MongoDBAtlasVectorSearch`
+    does not implement `similarity_search_by_vector`, so it runs the same
+    `$vectorSearch` aggregation as `similarity_search` directly.
+    """
+    if hasattr(vector_store, "_similarity_search_with_score"):
+        return [
+            doc
+            for doc, _ in vector_store._similarity_search_with_score(
+                query_vector, **search_kwargs
+            )
+        ]
+    return vector_store.similarity_search_by_vector(query_vector, **search_kwargs)
+
+
+class TracedVectorStoreRetriever(VectorStoreRetriever):
+    """
+    Similarity retriever that embeds the query and searches the vector store as two
+    traced stages ("embed_query" and "vector_search") instead of one opaque call.
+    """
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun, **kwargs
+    ) -> List[Document]:
+        if self.search_type != "similarity":
+            return super()._get_relevant_documents(
+                query, run_manager=run_manager, **kwargs
+            )
+        search_kwargs = self.search_kwargs | kwargs
+        with trace_stage("embed_query"):
+            query_vector = self.vectorstore.embeddings.embed_query(query)
+        with trace_stage("vector_search", k=search_kwargs.get("k", 4)) as span:
+            docs = search_by_vector(self.vectorstore, query_vector, **search_kwargs)
+            span.set(docs=len(docs))
+        return docs
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun, **kwargs
+    ) -> List[Document]:
+        return await run_in_executor(
+            None,
+            self._get_relevant_documents,
+            query,
+            run_manager=run_manager.get_sync(),
+            **kwargs,
+        )
+
+
+class TracedCrossEncoderReranker(CrossEncoderReranker):
+    """`CrossEncoderReranker` that traces cross-encoder scoring as the "rerank" stage."""
+
+    def compress_documents(
+        self,
+        documents: Sequence[Document],
+        query: str,
+        callbacks: Optional[Callbacks] = None,
+    ) -> Sequence[Document]:
+        with trace_stage("rerank", pairs=len(documents)) as span:
+            reranked = super().compress_documents(documents, query, callbacks)
+            span.set(docs=len(reranked))
+        return reranked
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Fuses the dense retriever's hits with BM25 hits by reciprocal rank fusion and
+    keeps the top `top_k`, so exact-token matches (CVE ids, syscall names) reach the
+    reranker without raising the dense K.
+    """
+
+    dense_retriever: BaseRetriever
+    bm25_index: Any
+    vector_store: Any
+    top_k: int
+    bm25_k: int
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        dense_docs = self.dense_retriever.invoke(
+            query, config={"callbacks": run_manager.get_child()}
+        )
+        return fuse_results(
+            query,
+            dense_docs,
+            self.bm25_index,
+            self.vector_store,
+            top_k=self.top_k,
+            bm25_k=self.bm25_k,
+        )
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        return await run_in_executor(
+            None,
+            self._get_relevant_documents,
+            query,
+            run_manager=run_manager.get_sync(),
+        )
+
+
+def create_base_retriever(
+    vector_store: VectorStore, k: Optional[int] = None
+) -> TracedVectorStoreRetriever:
+    """Creates the first-stage similarity retriever over `vector_store`."""
+    return TracedVectorStoreRetriever(
+        vectorstore=vector_store,
+        search_type="similarity",
+        search_kwargs={"k": k or Config.RETRIEVAL_K},
+    )
+
+
+def create_hybrid_retriever(
+    dense_retriever: BaseRetriever, bm25_index, vector_store
+) -> HybridRetriever:
+    """Wraps a dense retriever with BM25 rank fusion (see `HybridRetriever`)."""
+    return HybridRetriever(
+        dense_retriever=dense_retriever,
+        bm25_index=bm25_index,
+        vector_store=vector_store,
+        top_k=Config.HYBRID_FUSED_K,
+        bm25_k=Config.BM25_K,
     )
 
 
 def create_reranking_retriever(
     base_retriever: BaseRetriever,
+    model: Optional[BaseCrossEncoder] = None,
+    vector_store: Optional[VectorStore] = None,
+    score_cache: Optional[RerankScoreCache] = None,
 ) -> ContextualCompressionRetriever:
     """
     Creates a retriever that reranks documents using a BGE cross-encoder.
+    Pass an already-loaded `model` to avoid loading the cross-encoder again.
+    With `Config.RERANK_CASCADE_ENABLED` the cross-encoder runs as a cascade (see
+    `cascade_rerank`): `vector_store` enables the bi-encoder prefilter and
+    `score_cache` reuses scores across queries.
     """
-    model = HuggingFaceCrossEncoder(model_name=Config.RERANKER_MODEL)
+    if model is None:
+        model = load_cross_encoder()
     # The new compressor will return the top 'k' documents after reranking
-    compressor = CrossEncoderReranker(model=model, top_n=Config.RERANK_K)
+    if Config.RERANK_CASCADE_ENABLED:
+        compressor = CascadeReranker(
+            model=model,
+            top_n=Config.RERANK_K,
+            vector_store=vector_store,
+            score_cache=score_cache,
+        )
+    else:
+        compressor = TracedCrossEncoderReranker(model=model, top_n=Config.RERANK_K)
     compression_retriever = ContextualCompressionRetriever(
         base_compressor=compressor, base_retriever=base_retriever
     )
     return compression_retriever
 
 
-def create_query_rewriter_chain():
+def create_query_rewriter_chain(llm=None):
     """Creates a chain to rewrite a query based on conversation history."""
     # (Your existing code is perfect)
     prompt = PromptTemplate(
@@ -50,10 +225,11 @@ def create_query_rewriter_chain():
         """,
         input_variables=["conversation_history", "query"],
     )
-    return prompt | get_llm() | StrOutputParser()
+    llm = (llm or get_llm()).with_config(callbacks=[TokenUsageCallback()])
+    return prompt | llm | StrOutputParser()
 
 
-def create_answer_generation_chain():
+def create_answer_generation_chain(llm=None):
     """
     Creates the final answer generation chain with citation instructions.
     """
@@ -77,4 +253,5 @@ def create_answer_generation_chain():
         """,
         input_variables=["context", "query"],
     )
-    return prompt | get_llm() | StrOutputParser()
+    llm = (llm or get_llm()).with_config(callbacks=[TokenUsageCallback()])
+    return prompt | llm | StrOutputParser()
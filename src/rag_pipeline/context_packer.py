@@ -0,0 +1,167 @@
+import os
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.documents import Document
+
+from src.config import Config
+
+# Separates non-adjacent chunks of the same page inside one context block.
+GAP_MARKER = "\n[...]\n"
+# Shortest suffix/prefix match treated as chunk overlap rather than coincidence.
+MIN_OVERLAP_CHARS = 20
+_SENTENCE_END = re.compile(r"[.!?](?:\s|$)")
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token), as used for tracing."""
+    return (len(text) + 3) // 4
+
+
+def _cite(source: str, page) -> str:
+    citation = f"`{os.path.basename(source)}`"
+    if page is not None:
+        citation += f", Page: {page + 1}"
+    return citation
+
+
+def source_label(doc: Document) -> str:
+    """
+    "Source: `file`, Page: n", followed by the other places the chunk's text
+    appears (its `also_in` metadata, written by deduplicating builds).
+    """
+    source_info = "Source: " + _cite(
+        doc.metadata.get("source", "Unknown Source"), doc.metadata.get("page")
+    )
+    also_in = doc.metadata.get("also_in")
+    if also_in:
+        source_info += (
+            " (also in "
+            + "; ".join(_cite(other["source"], other.get("page")) for other in also_in)
+            + ")"
+        )
+    return source_info
+
+
+def format_block(label: str, text: str) -> str:
+    return f"<{label}>\n{text}\n</{label}>"
+
+
+def overlap_length(left: str, right: str, max_chars: Optional[int] = None) -> int:
+    """
+    Length of the longest suffix of `left` that is also a prefix of `right` (the
+    text splitter repeats up to `CHUNK_OVERLAP` characters between neighbours), or 0
+    below `MIN_OVERLAP_CHARS`.
+    """
+    max_chars = max_chars or 2 * Config.CHUNK_OVERLAP
+    for length in range(
+        min(len(left), len(right), max_chars), MIN_OVERLAP_CHARS - 1, -1
+    ):
+        if left.endswith(right[:length]):
+            return length
+    return 0
+
+
+def merge_texts(texts: List[str]) -> List[str]:
+    """
+    Merges the chunks of one page: drops chunks contained in another chunk, then
+    repeatedly joins the pair with the longest suffix/prefix overlap, keeping the
+    shared span once. Returns the remaining texts in their original (rank) order.
+    """
+    texts = [
+        text
+        for i, text in enumerate(texts)
+        if not any(
+            text in other and (len(other) > len(text) or j < i)
+            for j, other in enumerate(texts)
+            if j != i
+        )
+    ]
+    while len(texts) > 1:
+        best = max(
+            (
+                (overlap_length(left, right), i, j)
+                for i, left in enumerate(texts)
+                for j, right in enumerate(texts)
+                if i != j
+            ),
+        )
+        length, i, j = best
+        if not length:
+            break
+        merged = texts[i] + texts[j][length:]
+        texts = [t for k, t in enumerate(texts) if k not in (i, j)]
+        texts.insert(min(i, j), merged)
+    return texts
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cuts `text` to about `max_tokens`, at the last sentence end when there is one."""
+    cut = text[: max_tokens * 4]
+    ends = [m.end() for m in _SENTENCE_END.finditer(cut)]
+    if ends and ends[-1] > len(cut) // 2:
+        cut = cut[: ends[-1]]
+    return cut.rstrip() + " [...]"
+
+
+@dataclass
+class PackedContext:
+    text: str
+    docs: int
+    blocks: int
+    tokens_before: int
+    tokens_after: int
+
+    @property
+    def tokens_saved(self) -> int:
+        return max(self.tokens_before - self.tokens_after, 0)
+
+
+def pack_context(
+    docs: Sequence[Document],
+    token_budget: Optional[int] = None,
+    baseline: Optional[str] = None,
+) -> PackedContext:
+    """
+    Packs reranked documents into source-tagged context blocks:
+
+    - chunks of the same source and page share one block, in the rank of their
+      best chunk, and neighbouring chunks are merged without their overlap;
+    - blocks are added best first until `token_budget` (estimated) tokens; the
+      block that crosses the budget is cut at a sentence end, or dropped when less
+      than `CONTEXT_MIN_BLOCK_TOKENS` would remain of it.
+
+    `tokens_before` is the size of `baseline`, the verbatim context it replaces.
+    """
+    token_budget = token_budget or Config.CONTEXT_TOKEN_BUDGET
+    groups: Dict[Tuple[str, object], List[str]] = {}
+    labels: Dict[Tuple[str, object], str] = {}
+    for doc in docs:
+        key = (doc.metadata.get("source", "Unknown Source"), doc.metadata.get("page"))
+        groups.setdefault(key, []).append(doc.page_content)
+        labels.setdefault(key, source_label(doc))
+
+    blocks, used = [], 0
+    for key, texts in groups.items():
+        label = labels[key]
+        body = GAP_MARKER.join(merge_texts(texts))
+        block = format_block(label, body)
+        tokens = estimate_tokens(block)
+        if used + tokens > token_budget:
+            remaining = token_budget - used - estimate_tokens(format_block(label, ""))
+            if remaining < Config.CONTEXT_MIN_BLOCK_TOKENS:
+                break
+            block = format_block(label, truncate_to_tokens(body, remaining))
+            tokens = estimate_tokens(block)
+        blocks.append(block)
+        used += tokens
+
+    text = "\n\n---\n\n".join(blocks)
+    return PackedContext(
+        text=text,
+        docs=len(docs),
+        blocks=len(blocks),
+        tokens_before=estimate_tokens(baseline) if baseline is not None else 0,
+        tokens_after=estimate_tokens(text),
+    )
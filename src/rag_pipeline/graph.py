@@ -1,116 +1,443 @@
-import os
-from pymongo import MongoClient
-from langchain_mongodb import MongoDBAtlasVectorSearch
-from langgraph.graph import StateGraph, END
+import asyncio
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, Tuple
+
+import numpy as np
 from src.config import Config
+from src.rag_pipeline.context_packer import format_block, pack_context, source_label
 from src.rag_pipeline.state import RAGState
-from src.rag_pipeline.chains import (
-    create_query_rewriter_chain,
-    create_answer_generation_chain,
-    create_reranking_retriever,
-)
-from src.vector_store.builder import get_embeddings_model
+from src.resources import registry
+from src.tracing import current_span, trace_stage, traced_node
+from src.vector_store.embedding_cache import embed_queries
+
+
+def _add_timings(state: RAGState, **timings: float) -> None:
+    merged = dict(state.get("timings") or {})
+    merged.update(timings)
+    state["timings"] = merged
+
+
+def _apply_rewrite(state: RAGState, rewritten: str, report: dict, start: float):
+    state["rewritten_query"] = rewritten
+    current_span().set(
+        llm_call=int(report["outcome"] == "llm"), tokens_saved=report["tokens_saved"]
+    )
+    if report["outcome"] == "no_history":
+        print("No conversation history, using original query.")
+    elif report["outcome"] == "standalone":
+        print("Query is standalone, skipping the rewrite.")
+    else:
+        print(f"Rewritten Query ({report['outcome']}): {rewritten}")
+    _add_timings(state, rewrite_seconds=time.perf_counter() - start)
+    return state
 
 
+@traced_node("rewrite_query")
 def rewrite_query(state: RAGState) -> RAGState:
-    """Rewrites the user's query to be standalone only if conversation history exists."""
+    """
+    Rewrites the user's query to be standalone when it may refer to the conversation
+    history (see `QueryRewriter`).
+    """
     print("--- REWRITING QUERY ---")
-    if state["conversation_history"]:
-        rewriter = create_query_rewriter_chain()
-        rewritten = rewriter.invoke(
-            {
-                "query": state["query"],
-                "conversation_history": state["conversation_history"],
-            }
-        )
-        state["rewritten_query"] = rewritten
-        print(f"Rewritten Query: {state['rewritten_query']}")
+    start = time.perf_counter()
+    rewritten, report = registry.get("query_rewriter").rewrite(
+        state["query"], state["conversation_history"]
+    )
+    return _apply_rewrite(state, rewritten, report, start)
+
+
+def _cache_answers(state: RAGState) -> bool:
+    """Whether answers are cached: the request's `cache_answers`, else the config."""
+    return state.get("cache_answers", Config.SEMANTIC_CACHE_ANSWERS)
+
+
+@traced_node("cache_lookup")
+def lookup_semantic_cache(state: RAGState) -> RAGState:
+    """
+    Serves the rewritten query from the semantic cache when a similar query was
+    answered before: a full hit skips retrieval and generation, a retrieval hit only
+    skips retrieval.
+    """
+    state["cache_hit"] = ""
+    if not Config.SEMANTIC_CACHE_ENABLED:
+        return state
+
+    print("--- CHECKING SEMANTIC CACHE ---")
+    query_vector = registry.get("embeddings").embed_query(state["rewritten_query"])
+    # Kept for `update_semantic_cache`, so a miss is not embedded twice.
+    state["query_vector"] = query_vector
+    entry = registry.get("semantic_cache").lookup(
+        query_vector, with_answer=_cache_answers(state)
+    )
+    current_span().set(hit=int(entry is not None))
+    if entry is None:
+        print("Semantic cache miss.")
+        return state
+
+    if _cache_answers(state) and entry.answer is not None:
+        state["retrieved_docs"] = list(entry.retrieved_docs)
+        state["answer"] = entry.answer
+        state["context"] = entry.context
+        state["cache_hit"] = "answer"
     else:
-        state["rewritten_query"] = state["query"]
-        print("No conversation history, using original query.")
+        # Documents prefetched by the caller take precedence over cached ones.
+        if not state.get("retrieved_docs"):
+            state["retrieved_docs"] = list(entry.retrieved_docs)
+        state["cache_hit"] = "retrieval"
+    print(f"Semantic cache {state['cache_hit']} hit for: {entry.query}")
+    return state
+
+
+def route_after_cache(state: RAGState) -> str:
+    """Skips the stages whose results came from the semantic cache."""
+    from langgraph.graph import END
+
+    hit = state.get("cache_hit")
+    if hit == "answer":
+        return END
+    if hit == "retrieval":
+        return "generate"
+    return "retrieve"
+
+
+@traced_node("cache_update")
+def update_semantic_cache(state: RAGState) -> RAGState:
+    """
+    Stores the documents and answer of a cache miss for similar future queries. Hits
+    are not stored again: the entry that served them already covers the query.
+    """
+    if not Config.SEMANTIC_CACHE_ENABLED or state.get("cache_hit"):
+        return state
+    query_vector = state.get("query_vector")
+    if query_vector is None:
+        query_vector = registry.get("embeddings").embed_query(state["rewritten_query"])
+    registry.get("semantic_cache").store(
+        state["rewritten_query"],
+        query_vector,
+        state["retrieved_docs"],
+        answer=state["answer"] if _cache_answers(state) else None,
+        context=state["context"],
+    )
     return state
 
 
+@traced_node("retrieve")
 def retrieve_and_rerank_documents(state: RAGState) -> RAGState:
     """
     Retrieves documents from MongoDB Atlas and reranks them in a single step.
     """
     print("--- RETRIEVING AND RERANKING DOCUMENTS ---")
-    embeddings = get_embeddings_model()
-    client = MongoClient(Config.MONGO_URI)
-    collection = client[Config.DB_NAME][Config.COLLECTION_NAME]
-
-    # 1. Create the base retriever from MongoDB Atlas
-    vector_store = MongoDBAtlasVectorSearch(
-        collection=collection,
-        embedding=embeddings,
-        index_name=Config.VECTOR_SEARCH_INDEX_NAME,
-    )
-    base_retriever = vector_store.as_retriever(
-        search_type="similarity", search_kwargs={"k": Config.RETRIEVAL_K}
-    )
+    if state.get("retrieved_docs"):
+        # Documents were prefetched (e.g. by the batched offline evaluation path).
+        print(f"Using {len(state['retrieved_docs'])} prefetched documents.")
+        return state
 
-    # 2. Create the reranking retriever which wraps the base retriever
-    reranking_retriever = create_reranking_retriever(base_retriever)
+    # The reranking retriever (MongoDB Atlas base retriever wrapped by the
+    # cross-encoder) is built once per process and shared across requests.
+    reranking_retriever = registry.get("reranking_retriever")
 
-    # 3. Invoke the retriever to get the final, reranked documents
+    # Invoke the retriever to get the final, reranked documents
     # This single call now performs both retrieval and reranking
+    start = time.perf_counter()
     reranked_docs = reranking_retriever.invoke(state["rewritten_query"])
 
     # We now store the final documents directly in a single state key
     state["retrieved_docs"] = reranked_docs
+    current_span().set(docs=len(reranked_docs))
+    _add_timings(state, retrieval_seconds=time.perf_counter() - start)
     print(f"Retrieved and reranked to {len(reranked_docs)} documents.")
     return state
 
 
-def generate_answer(state: RAGState) -> RAGState:
-    """Generates the final answer and formats the context for citation."""
-    print("--- GENERATING ANSWER ---")
+def format_context(docs) -> str:
+    """Formats the reranked documents as source-tagged context blocks for citation."""
+    context_with_sources = [
+        format_block(source_label(doc), doc.page_content) for doc in docs
+    ]
+    return "\n\n---\n\n".join(context_with_sources)
 
-    # The reranked documents are now in 'retrieved_docs'
-    docs_to_generate_from = state["retrieved_docs"]
-
-    context_with_sources = []
-    for doc in docs_to_generate_from:
-        source = doc.metadata.get("source", "Unknown Source")
-        source_name = os.path.basename(source)
-        page = doc.metadata.get("page")
-        source_info = f"Source: `{source_name}`"
-        if page is not None:
-            source_info += f", Page: {page + 1}"
-        context_with_sources.append(
-            f"<{source_info}>\n{doc.page_content}\n</{source_info}>"
-        )
-    context = "\n\n---\n\n".join(context_with_sources)
 
-    answer_generator = create_answer_generation_chain()
-    answer = answer_generator.invoke(
-        {"context": context, "query": state["rewritten_query"]}
+def build_context(state: RAGState) -> str:
+    """
+    The context sent to the LLM: the reranked documents packed into the token
+    budget (see `pack_context`), or verbatim with `CONTEXT_PACKING_ENABLED` off.
+    Tokens saved against the verbatim context are traced as "pack_context".
+    """
+    docs = state["retrieved_docs"]
+    verbatim = format_context(docs)
+    if not Config.CONTEXT_PACKING_ENABLED:
+        return verbatim
+    with trace_stage("pack_context", state, docs=len(docs)) as span:
+        packed = pack_context(docs, baseline=verbatim)
+        span.set(
+            blocks=packed.blocks,
+            tokens_before=packed.tokens_before,
+            tokens_after=packed.tokens_after,
+            tokens_saved=packed.tokens_saved,
+        )
+    print(
+        f"Packed context: {packed.tokens_after} tokens in {packed.blocks} blocks "
+        f"({packed.tokens_saved} saved)."
     )
+    return packed.text
+
 
+def _record_generation(state: RAGState, answer: str, context: str, start, first):
+    end = time.perf_counter()
+    ttft = (first if first is not None else end) - start
+    _add_timings(state, ttft_seconds=ttft, generation_seconds=end - start)
     state["answer"] = answer
     state["context"] = context
-    print(f"Generated Answer: {answer[:200]}...")
+    print(
+        f"Generated Answer (TTFT {ttft:.2f}s, total {end - start:.2f}s): "
+        f"{answer[:200]}..."
+    )
+
+
+def stream_answer(state: RAGState) -> Iterator[str]:
+    """
+    Streaming variant of `generate_answer`: yields answer tokens as the LLM produces
+    them. Once exhausted, `state` holds the answer, the context and the
+    time-to-first-token in `state["timings"]`.
+    """
+    print("--- GENERATING ANSWER ---")
+    context = build_context(state)
+    answer_generator = registry.get("answer_generation_chain")
+
+    parts, first = [], None
+    with trace_stage(
+        "generate", state, docs=len(state["retrieved_docs"]), context_chars=len(context)
+    ):
+        start = time.perf_counter()
+        for token in answer_generator.stream(
+            {"context": context, "query": state["rewritten_query"]}
+        ):
+            if first is None:
+                first = time.perf_counter()
+            parts.append(token)
+            yield token
+    _record_generation(state, "".join(parts), context, start, first)
+
+
+async def astream_answer(state: RAGState) -> AsyncIterator[str]:
+    """Async counterpart of `stream_answer`."""
+    print("--- GENERATING ANSWER ---")
+    context = build_context(state)
+    answer_generator = registry.get("answer_generation_chain")
+
+    parts, first = [], None
+    with trace_stage(
+        "generate", state, docs=len(state["retrieved_docs"]), context_chars=len(context)
+    ):
+        start = time.perf_counter()
+        async for token in answer_generator.astream(
+            {"context": context, "query": state["rewritten_query"]}
+        ):
+            if first is None:
+                first = time.perf_counter()
+            parts.append(token)
+            yield token
+    _record_generation(state, "".join(parts), context, start, first)
+
+
+def generate_answer(state: RAGState) -> RAGState:
+    """Generates the final answer and formats the context for citation."""
+    # Consuming the stream lets LangGraph forward tokens to `astream` callers and
+    # records time-to-first-token for regular invocations too.
+    for _ in stream_answer(state):
+        pass
     return state
 
 
-def build_rag_graph():
-    """Builds the simplified LangGraph for the RAG pipeline."""
+# --- Async nodes ---
+
+
+@traced_node("rewrite_query")
+async def arewrite_query(state: RAGState) -> RAGState:
+    """Async version of `rewrite_query`."""
+    print("--- REWRITING QUERY ---")
+    start = time.perf_counter()
+    rewritten, report = await registry.get("query_rewriter").arewrite(
+        state["query"], state["conversation_history"]
+    )
+    return _apply_rewrite(state, rewritten, report, start)
+
+
+@traced_node("retrieve")
+async def aretrieve_and_rerank_documents(state: RAGState) -> RAGState:
+    """Async version of `retrieve_and_rerank_documents`."""
+    print("--- RETRIEVING AND RERANKING DOCUMENTS ---")
+    if state.get("retrieved_docs"):
+        print(f"Using {len(state['retrieved_docs'])} prefetched documents.")
+        return state
+
+    start = time.perf_counter()
+    reranking_retriever = registry.get("reranking_retriever")
+    state["retrieved_docs"] = await reranking_retriever.ainvoke(
+        state["rewritten_query"]
+    )
+    current_span().set(docs=len(state["retrieved_docs"]))
+    _add_timings(state, retrieval_seconds=time.perf_counter() - start)
+    print(f"Retrieved and reranked to {len(state['retrieved_docs'])} documents.")
+    return state
+
+
+async def agenerate_answer(state: RAGState) -> RAGState:
+    """Async version of `generate_answer`."""
+    async for _ in astream_answer(state):
+        pass
+    return state
+
+
+async def alookup_semantic_cache(state: RAGState) -> RAGState:
+    """Async version of `lookup_semantic_cache` (the query is embedded in a thread)."""
+    return await asyncio.to_thread(lookup_semantic_cache, state)
+
+
+async def aupdate_semantic_cache(state: RAGState) -> RAGState:
+    """Async version of `update_semantic_cache`."""
+    return await asyncio.to_thread(update_semantic_cache, state)
+
+
+def query_similarity(query: str, rewritten_query: str) -> float:
+    """Cosine similarity between the embeddings of two queries."""
+    if " ".join(query.lower().split()) == " ".join(rewritten_query.lower().split()):
+        return 1.0
+    a, b = np.asarray(
+        embed_queries(registry.get("embeddings"), [query, rewritten_query]),
+        dtype=np.float32,
+    )
+    denominator = float(np.linalg.norm(a) * np.linalg.norm(b))
+    return float(a @ b) / denominator if denominator else 0.0
+
+
+@traced_node("rewrite_query_speculative")
+async def arewrite_query_speculatively(state: RAGState) -> RAGState:
+    """
+    Rewrites the query while retrieving documents for the raw query in parallel, so
+    the retrieval overlaps the Groq round trip. The speculative documents are kept
+    when the rewritten query embeds within `Config.SPECULATIVE_REUSE_THRESHOLD` of
+    the raw one; otherwise they are discarded and the retrieve node searches again
+    with the rewritten query.
+    """
+    outcome, _, _ = registry.get("query_rewriter").plan(
+        state["query"], state["conversation_history"]
+    )
+    if outcome != "llm":
+        # No LLM round trip, so there is nothing to overlap with.
+        return await arewrite_query(state)
+
+    print("--- REWRITING QUERY WITH SPECULATIVE RETRIEVAL ---")
+    reranking_retriever = registry.get("reranking_retriever")
+
+    async def speculative_retrieval():
+        with trace_stage("speculative_retrieval", state) as span:
+            start = time.perf_counter()
+            docs = await reranking_retriever.ainvoke(state["query"])
+            span.set(docs=len(docs))
+            return docs, time.perf_counter() - start
+
+    speculation = asyncio.create_task(speculative_retrieval())
+    state = await arewrite_query(state)
+    similarity = await asyncio.to_thread(
+        query_similarity, state["query"], state["rewritten_query"]
+    )
+
+    wait_start = time.perf_counter()
+    if similarity >= Config.SPECULATIVE_REUSE_THRESHOLD:
+        docs, seconds = await speculation
+        state["retrieved_docs"] = docs
+        state["speculation"] = "kept"
+        # Only the part of the retrieval that outlasted the rewrite is on the
+        # critical path.
+        _add_timings(
+            state,
+            speculative_retrieval_seconds=seconds,
+            retrieval_seconds=time.perf_counter() - wait_start,
+        )
+    else:
+        speculation.cancel()
+        state["speculation"] = "discarded"
+    state["speculation_similarity"] = similarity
+    print(
+        f"Speculative retrieval {state['speculation']} (similarity {similarity:.3f})."
+    )
+    return state
+
+
+def _compile_graph(rewrite, check_cache, retrieve, generate, update_cache):
+    # LangGraph is imported here so the app, which calls the nodes directly, never
+    # pays for importing it.
+    from langgraph.graph import StateGraph, END
+
     workflow = StateGraph(RAGState)
 
     # Add the nodes to the graph
-    workflow.add_node("rewrite_query", rewrite_query)
+    workflow.add_node("rewrite_query", rewrite)
+    workflow.add_node("check_cache", check_cache)
 
     # We use our new consolidated function for the 'retrieve' node
-    workflow.add_node("retrieve", retrieve_and_rerank_documents)
-    workflow.add_node("generate", generate_answer)
+    workflow.add_node("retrieve", retrieve)
+    workflow.add_node("generate", generate)
+    workflow.add_node("update_cache", update_cache)
 
     # Define the graph's flow
     workflow.set_entry_point("rewrite_query")
-    workflow.add_edge("rewrite_query", "retrieve")
+    workflow.add_edge("rewrite_query", "check_cache")
+
+    # Cache hits skip retrieval (and generation, for a full answer hit)
+    workflow.add_conditional_edges(
+        "check_cache", route_after_cache, ["retrieve", "generate", END]
+    )
 
     # The 'retrieve' node now directly connects to 'generate'
     workflow.add_edge("retrieve", "generate")
-    workflow.add_edge("generate", END)
+    workflow.add_edge("generate", "update_cache")
+    workflow.add_edge("update_cache", END)
 
     return workflow.compile()
+
+
+def build_rag_graph():
+    """Builds the simplified LangGraph for the RAG pipeline."""
+    return _compile_graph(
+        rewrite_query,
+        lookup_semantic_cache,
+        retrieve_and_rerank_documents,
+        generate_answer,
+        update_semantic_cache,
+    )
+
+
+def build_async_rag_graph(speculative: bool = True):
+    """
+    Builds the pipeline from async nodes; run it with `ainvoke`/`astream`. With
+    `speculative`, retrieval on the raw query overlaps the query rewrite (see
+    `arewrite_query_speculatively`).
+    """
+    return _compile_graph(
+        arewrite_query_speculatively if speculative else arewrite_query,
+        alookup_semantic_cache,
+        aretrieve_and_rerank_documents,
+        agenerate_answer,
+        aupdate_semantic_cache,
+    )
+
+
+async def astream_rag(graph, inputs: Dict[str, Any]) -> AsyncIterator[Tuple[str, Any]]:
+    """
+    Runs the compiled graph with `astream`, yielding `("token", text)` for each
+    answer token produced by the generate node as it arrives and finally
+    `("state", final_state)`. Tokens of the query rewriter are not forwarded.
+    """
+    final_state = None
+    async for mode, payload in graph.astream(
+        inputs, stream_mode=["messages", "values"]
+    ):
+        if mode == "values":
+            final_state = payload
+            continue
+        message, metadata = payload
+        if metadata.get("langgraph_node") == "generate" and message.content:
+            yield "token", message.content
+    yield "state", final_state
@@ -0,0 +1,308 @@
+import functools
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+from src.config import Config
+from src.rag_pipeline.context_packer import estimate_tokens, truncate_to_tokens
+from src.vector_store.embedding_cache import normalize_text
+
+# Approximate size of the rewrite prompt template around the history and query.
+PROMPT_OVERHEAD_TOKENS = 60
+
+# Words that only make sense with an earlier turn: pronouns, demonstratives and
+# phrases pointing back at the conversation.
+_REFERENCE_WORDS = re.compile(
+    r"\b(it|its|it's|itself|they|them|their|theirs|themselves|this|that|these|"
+    r"those|he|him|his|she|her|hers|former|latter|above|previous|previously|"
+    r"earlier|same|such|aforementioned|mentioned|again|else|another|other|"
+    r"one|ones)\b",
+    re.IGNORECASE,
+)
+_FOLLOW_UP_START = re.compile(
+    r"^\s*(and|but|or|so|also|what about|how about|why|why not|how so|then|"
+    r"more|tell me more|go on|continue|elaborate|explain (further|more)|"
+    r"give (me )?(an )?example|examples|for example|e\.g\.|ok|okay|yes|no)\b",
+    re.IGNORECASE,
+)
+_MIN_STANDALONE_WORDS = 4
+# Trailing citation list of generated answers, which adds nothing to a rewrite.
+_SOURCES_SECTION = re.compile(r"\n\s*(\*\*)?(sources|references)(\*\*)?\s*:", re.I)
+
+
+def reference_reason(query: str) -> Optional[str]:
+    """
+    Why `query` may depend on earlier turns (a pronoun, a follow-up opener, or too
+    few words to stand alone), or None when it reads as self-contained. Cheap and
+    conservative: any doubt sends the query to the LLM rewrite.
+    """
+    if len(query.split()) < _MIN_STANDALONE_WORDS:
+        return "short"
+    if _FOLLOW_UP_START.match(query):
+        return "follow_up"
+    match = _REFERENCE_WORDS.search(query)
+    if match:
+        return f"reference:{match.group(0).lower()}"
+    return None
+
+
+@functools.lru_cache(maxsize=4096)
+def summarize_turn(role: str, content: str, max_tokens: int) -> str:
+    """
+    One compact history line: user turns are kept up to `max_tokens`, assistant
+    answers lose their source list and are cut to their leading sentences.
+    Cached, so a conversation's earlier turns are summarized once.
+    """
+    text = content
+    if role == "assistant":
+        match = _SOURCES_SECTION.search(text)
+        if match:
+            text = text[: match.start()]
+    text = " ".join(text.split())
+    if estimate_tokens(text) > max_tokens:
+        text = truncate_to_tokens(text, max_tokens)
+    return f"{role}: {text}"
+
+
+def compact_history(
+    messages: Sequence[Dict[str, str]],
+    max_tokens: Optional[int] = None,
+    turn_tokens: Optional[int] = None,
+) -> str:
+    """
+    Builds the conversation history for the rewrite prompt from chat messages
+    ({"role", "content"}) within `max_tokens` (`REWRITE_HISTORY_TOKEN_BUDGET`).
+    Every turn is summarized to at most `turn_tokens` (`REWRITE_TURN_TOKENS`) and
+    the newest turns are kept; the questions of older turns are folded into one
+    "earlier" line, so long answers cannot crowd out the recent questions.
+    """
+    max_tokens = max_tokens or Config.REWRITE_HISTORY_TOKEN_BUDGET
+    turn_tokens = turn_tokens or Config.REWRITE_TURN_TOKENS
+    lines, used, kept = [], 0, 0
+    for message in reversed(messages):
+        line = summarize_turn(message["role"], message["content"], turn_tokens)
+        cost = estimate_tokens(line) + 1
+        if used + cost > max_tokens:
+            break
+        lines.append(line)
+        used += cost
+        kept += 1
+
+    older = [
+        " ".join(m["content"].split()[:12])
+        for m in messages[: len(messages) - kept]
+        if m["role"] == "user"
+    ]
+    room = min(turn_tokens, max_tokens - used) - 5
+    if older and room > 0:
+        lines.append("earlier: " + truncate_to_tokens("; ".join(older), room))
+    return "\n".join(reversed(lines))
+
+
+def fit_history(history: str, max_tokens: Optional[int] = None) -> str:
+    """Keeps the newest lines of a history string that fit in `max_tokens`."""
+    max_tokens = max_tokens or Config.REWRITE_HISTORY_TOKEN_BUDGET
+    if estimate_tokens(history) <= max_tokens:
+        return history
+    lines, used = [], 0
+    for line in reversed(history.splitlines()):
+        cost = estimate_tokens(line) + 1
+        if used + cost > max_tokens:
+            if not lines:
+                lines.append(truncate_to_tokens(line, max_tokens))
+            break
+        lines.append(line)
+        used += cost
+    return "\n".join(reversed(lines))
+
+
+class RewriteCache:
+    """
+    SQLite cache of rewritten queries keyed by (LLM, normalized query, normalized
+    history), so a repeated follow-up in the same context skips the LLM across
+    runs. Holds at most `max_entries` rewrites, evicting the least recently used.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_entries: Optional[int] = None):
+        self.path = path or Config.REWRITE_CACHE_PATH
+        self.max_entries = max_entries or Config.REWRITE_CACHE_MAX_ENTRIES
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS rewrites ("
+            "key TEXT PRIMARY KEY, rewritten TEXT NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_last_access ON rewrites (last_access)"
+        )
+        self._conn.commit()
+        self._size = self._conn.execute("SELECT COUNT(*) FROM rewrites").fetchone()[0]
+
+    @staticmethod
+    def key(query: str, history: str) -> str:
+        text = f"{normalize_text(query)}\x00{normalize_text(history)}"
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return f"{Config.LLM_MODEL}:{digest}"
+
+    def get(self, query: str, history: str) -> Optional[str]:
+        key = self.key(query, history)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT rewritten FROM rewrites WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None:
+                self._conn.execute(
+                    "UPDATE rewrites SET last_access = ? WHERE key = ?",
+                    (time.time(), key),
+                )
+                self._conn.commit()
+        return row[0] if row else None
+
+    def put(self, query: str, history: str, rewritten: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO rewrites (key, rewritten, last_access) "
+                "VALUES (?, ?, ?)",
+                (self.key(query, history), rewritten, time.time()),
+            )
+            self._size += 1
+            if self._size > self.max_entries:
+                self._size = self._conn.execute(
+                    "SELECT COUNT(*) FROM rewrites"
+                ).fetchone()[0]
+                excess = self._size - self.max_entries
+                if excess > 0:
+                    self._conn.execute(
+                        "DELETE FROM rewrites WHERE key IN ("
+                        "SELECT key FROM rewrites ORDER BY last_access LIMIT ?)",
+                        (excess,),
+                    )
+                    self._size -= excess
+            self._conn.commit()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM rewrites")
+            self._conn.commit()
+            self._size = 0
+
+
+class QueryRewriter:
+    """
+    Rewrite-avoidance in front of the query rewriter chain. A query is sent to the
+    LLM only when there is history, it may refer to earlier turns (see
+    `reference_reason`), and no cached rewrite exists for the same query and
+    history. The history is bounded to `REWRITE_HISTORY_TOKEN_BUDGET` tokens. The
+    chain is loaded from the registry on the first LLM call, and the counters
+    record the LLM calls and prompt tokens avoided.
+    """
+
+    def __init__(self, cache: Optional[RewriteCache] = None, chain=None):
+        self.cache = cache
+        self._chain = chain
+        self._lock = threading.Lock()
+        self.counters = {
+            "queries": 0,
+            "llm_calls": 0,
+            "skipped_no_history": 0,
+            "skipped_standalone": 0,
+            "cache_hits": 0,
+            "prompt_tokens": 0,
+            "prompt_tokens_saved": 0,
+        }
+
+    @property
+    def chain(self):
+        if self._chain is None:
+            from src.resources import registry
+
+            self._chain = registry.get("query_rewriter_chain")
+        return self._chain
+
+    def _count(self, **increments: int) -> None:
+        with self._lock:
+            for name, value in increments.items():
+                self.counters[name] += value
+
+    def plan(self, query: str, history: str) -> Tuple[str, Optional[str], str]:
+        """
+        Decides how to rewrite without calling the LLM. Returns (outcome, rewritten
+        query or None when the LLM must run, bounded history), where outcome is
+        "no_history", "standalone", "cached" or "llm".
+        """
+        if not history.strip():
+            return "no_history", query, history
+        if Config.REWRITE_SKIP_STANDALONE and reference_reason(query) is None:
+            return "standalone", query, history
+        history = fit_history(history)
+        if self.cache is not None:
+            cached = self.cache.get(query, history)
+            if cached is not None:
+                return "cached", cached, history
+        return "llm", None, history
+
+    def _record(self, outcome: str, query: str, raw_history: str, history: str):
+        """Counts the outcome and reports the estimated prompt tokens it saved."""
+        if outcome == "no_history":
+            self._count(queries=1, skipped_no_history=1)
+            return {"outcome": outcome, "tokens_saved": 0}
+        full_prompt = PROMPT_OVERHEAD_TOKENS + estimate_tokens(query + raw_history)
+        if outcome == "llm":
+            sent_prompt = PROMPT_OVERHEAD_TOKENS + estimate_tokens(query + history)
+            saved = full_prompt - sent_prompt
+            self._count(
+                queries=1,
+                llm_calls=1,
+                prompt_tokens=sent_prompt,
+                prompt_tokens_saved=saved,
+            )
+        else:
+            saved = full_prompt
+            counter = "cache_hits" if outcome == "cached" else "skipped_standalone"
+            self._count(queries=1, prompt_tokens_saved=saved, **{counter: 1})
+        return {"outcome": outcome, "tokens_saved": saved}
+
+    def rewrite(self, query: str, history: str) -> Tuple[str, Dict[str, Any]]:
+        """Returns the standalone query and how it was obtained (outcome, tokens saved)."""
+        outcome, rewritten, bounded = self.plan(query, history)
+        if rewritten is None:
+            rewritten = self.chain.invoke(
+                {"query": query, "conversation_history": bounded}
+            )
+            if self.cache is not None:
+                self.cache.put(query, bounded, rewritten)
+        return rewritten, self._record(outcome, query, history, bounded)
+
+    async def arewrite(self, query: str, history: str) -> Tuple[str, Dict[str, Any]]:
+        """Async version of `rewrite`."""
+        outcome, rewritten, bounded = self.plan(query, history)
+        if rewritten is None:
+            rewritten = await self.chain.ainvoke(
+                {"query": query, "conversation_history": bounded}
+            )
+            if self.cache is not None:
+                self.cache.put(query, bounded, rewritten)
+        return rewritten, self._record(outcome, query, history, bounded)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.counters)
+        with_history = stats["queries"] - stats["skipped_no_history"]
+        avoided = stats["skipped_standalone"] + stats["cache_hits"]
+        stats["llm_calls_saved"] = avoided
+        stats["llm_call_rate"] = (
+            stats["llm_calls"] / with_history if with_history else 0.0
+        )
+        if self.cache is not None:
+            stats["cache_entries"] = len(self.cache)
+        return stats
@@ -0,0 +1,384 @@
+import hashlib
+import operator
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_community.cross_encoders import BaseCrossEncoder
+from langchain_core.callbacks import Callbacks
+from langchain_core.documents import BaseDocumentCompressor, Document
+from pydantic import ConfigDict
+
+from src.config import Config
+from src.tracing import trace_stage
+from src.vector_store.embedding_cache import normalize_text
+
+
+def score_pairs(
+    cross_encoder, pairs: List[Tuple[str, str]], batch_size: Optional[int] = None
+) -> List[float]:
+    """
+    Scores (query, passage) pairs with the cross-encoder in large batches, returning
+    the same scores as `HuggingFaceCrossEncoder.score`. Pairs are sorted by length
+    first so each batch pads its pairs to a similar length.
+    """
+    if not pairs:
+        return []
+    client = getattr(cross_encoder, "client", None)
+    if client is None or not hasattr(client, "predict"):
+        return list(cross_encoder.score(pairs))
+
+    order = sorted(range(len(pairs)), key=lambda i: len(pairs[i][0]) + len(pairs[i][1]))
+    sorted_scores = client.predict(
+        [pairs[i] for i in order],
+        batch_size=batch_size or Config.RERANK_BATCH_SIZE,
+        show_progress_bar=False,
+    )
+    # Two-logit models score relevance in the second column.
+    if len(sorted_scores.shape) > 1:
+        sorted_scores = sorted_scores[:, 1]
+    scores = np.empty(len(pairs), dtype=np.float32)
+    scores[order] = sorted_scores
+    return scores.tolist()
+
+
+def rerank(
+    query: str, documents: List[Document], scores: Sequence[float], top_n: int
+) -> List[Document]:
+    """Orders documents by score exactly like `CrossEncoderReranker`."""
+    ranked = sorted(zip(documents, scores), key=operator.itemgetter(1), reverse=True)
+    return [doc for doc, _ in ranked[:top_n]]
+
+
+def query_key(query: str) -> str:
+    """
+    Hash of the query with case, whitespace and trailing punctuation normalized, so
+    trivially different spellings of a question share cached scores.
+    """
+    text = normalize_text(query).casefold().rstrip("?.! ")
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def chunk_key(doc: Document) -> str:
+    """The chunk id, or a hash of the text for documents without one."""
+    if doc.id:
+        return doc.id
+    return hashlib.sha256(doc.page_content.encode("utf-8")).hexdigest()
+
+
+class RerankScoreCache:
+    """
+    In-memory LRU cache of cross-encoder scores keyed by (model, query hash, chunk
+    id). Chunk ids are derived from the chunk's content hash, so a cached score stays
+    valid across index rebuilds and never needs invalidating.
+    """
+
+    def __init__(self, max_entries: Optional[int] = None):
+        self.max_entries = max_entries or Config.RERANK_SCORE_CACHE_MAX_ENTRIES
+        self._scores: "OrderedDict[Tuple[str, str, str], float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def __len__(self) -> int:
+        return len(self._scores)
+
+    def get_many(
+        self, model: str, query: str, doc_ids: Sequence[str]
+    ) -> Dict[str, float]:
+        """Returns the cached scores of `doc_ids` for `query`, keyed by chunk id."""
+        qkey = query_key(query)
+        found = {}
+        with self._lock:
+            for doc_id in doc_ids:
+                key = (model, qkey, doc_id)
+                score = self._scores.get(key)
+                if score is None:
+                    self.counters["misses"] += 1
+                    continue
+                self._scores.move_to_end(key)
+                self.counters["hits"] += 1
+                found[doc_id] = score
+        return found
+
+    def put_many(self, model: str, query: str, scores: Dict[str, float]) -> None:
+        qkey = query_key(query)
+        with self._lock:
+            for doc_id, score in scores.items():
+                key = (model, qkey, doc_id)
+                self._scores[key] = float(score)
+                self._scores.move_to_end(key)
+            while len(self._scores) > self.max_entries:
+                self._scores.popitem(last=False)
+                self.counters["evictions"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._scores.clear()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.counters["hits"] + self.counters["misses"]
+            return {
+                **self.counters,
+                "entries": len(self._scores),
+                "hit_rate": self.counters["hits"] / lookups if lookups else 0.0,
+            }
+
+
+def model_name(cross_encoder) -> str:
+    """Identifies the cross-encoder in score cache keys."""
+    return getattr(cross_encoder, "model_name", None) or type(cross_encoder).__name__
+
+
+def stored_vectors(vector_store, documents: Sequence[Document]) -> Optional[np.ndarray]:
+    """
+    The stored embeddings of `documents`, or None when the store cannot provide
+    all of them. The local store reads its matrix rows; `MongoDBAtlasVectorSearch`
+    fetches the embedding field of the chunk ids in one query.
+    """
+    ids = [doc.id for doc in documents]
+    if not all(ids):
+        return None
+
+    rows = getattr(vector_store, "_id_to_row", None)
+    if rows is not None:
+        if not all(_id in rows for _id in ids):
+            return None
+        return np.asarray(vector_store.vectors[[rows[_id] for _id in ids]])
+
+    collection = getattr(vector_store, "_collection", None)
+    embedding_key = getattr(vector_store, "_embedding_key", None)
+    if collection is None or embedding_key is None:
+        return None
+    from langchain_mongodb.utils import oid_to_str, str_to_oid
+
+    found = {
+        oid_to_str(record["_id"]): record[embedding_key]
+        for record in collection.find(
+            {"_id": {"$in": [str_to_oid(_id) for _id in ids]}}, {embedding_key: 1}
+        )
+        if embedding_key in record
+    }
+    if not all(_id in found for _id in ids):
+        return None
+    return np.asarray([found[_id] for _id in ids], dtype=np.float32)
+
+
+def bi_encoder_scores(
+    vector_store, query: str, documents: Sequence[Document]
+) -> Optional[np.ndarray]:
+    """
+    Cosine similarity of the query and the stored document embeddings (see
+    `stored_vectors`), or None when they are not available. Documents are never
+    re-embedded: that would cost more than the cross-encoder calls it saves.
+    """
+    doc_vectors = stored_vectors(vector_store, documents)
+    if doc_vectors is None:
+        return None
+    query_vector = np.asarray(
+        vector_store.embeddings.embed_query(query), dtype=np.float32
+    )
+    norms = np.linalg.norm(doc_vectors, axis=1) * np.linalg.norm(query_vector)
+    return doc_vectors @ query_vector / np.maximum(norms, 1e-12)
+
+
+def prefilter(
+    vector_store,
+    query: str,
+    documents: Sequence[Document],
+    top_n: int,
+    prefilter_k: int,
+) -> List[int]:
+    """
+    Indices of the candidates worth cross-encoding, best bi-encoder cosine first:
+    the top `prefilter_k` by cosine plus the first `top_n` of the incoming ranking,
+    so exact keyword hits from rank fusion are never dropped on embedding
+    similarity alone. Without stored embeddings every candidate is kept in the
+    incoming order.
+    """
+    with trace_stage("rerank_prefilter", docs=len(documents)) as span:
+        cosine = bi_encoder_scores(vector_store, query, documents)
+        span.set(skipped=int(cosine is None))
+    if cosine is None:
+        return list(range(len(documents)))
+    order = [int(i) for i in np.argsort(-cosine, kind="stable")]
+    keep = set(order[:prefilter_k]) | set(range(min(top_n, len(documents))))
+    return [i for i in order if i in keep]
+
+
+class RerankCascade:
+    """
+    The scoring schedule of `cascade_rerank` for one query, advanced one batch at a
+    time so several queries can share cross-encoder calls (see `run_cascades`).
+    `order` is the scoring order (e.g. from `prefilter`); documents outside it are
+    never scored.
+    """
+
+    def __init__(
+        self,
+        query: str,
+        documents: Sequence[Document],
+        model: str,
+        top_n: int,
+        order: Sequence[int],
+        score_cache: Optional[RerankScoreCache] = None,
+        step: Optional[int] = None,
+        margin: Optional[float] = None,
+    ):
+        self.query = query
+        self.documents = list(documents)
+        self.model = model
+        self.top_n = top_n
+        self.step = step or Config.RERANK_CASCADE_STEP
+        self.margin = Config.RERANK_EARLY_EXIT_MARGIN if margin is None else margin
+        self.score_cache = score_cache
+        self.order = list(order)
+        self.keys = [chunk_key(doc) for doc in self.documents]
+        self.scores: Dict[int, float] = {}
+        if score_cache is not None:
+            hits = score_cache.get_many(model, query, [self.keys[i] for i in order])
+            self.scores = {i: hits[self.keys[i]] for i in order if self.keys[i] in hits}
+        self.cached = len(self.scores)
+        self.scored = 0
+        self._pending = [i for i in self.order if i not in self.scores]
+
+    def next_batch(self) -> List[int]:
+        """
+        Indices to score next: enough to fill the top `top_n`, else `step`. Empty
+        once every candidate is scored or the cascade exited early.
+        """
+        return self._pending[: max(self.top_n - len(self.scores), self.step)]
+
+    def pairs(self, batch: Sequence[int]) -> List[Tuple[str, str]]:
+        return [(self.query, self.documents[i].page_content) for i in batch]
+
+    def add_scores(self, batch: Sequence[int], batch_scores: Sequence[float]) -> None:
+        """
+        Records the scores of `batch` and stops the cascade once the whole batch
+        falls more than `margin` below the current `top_n`-th score.
+        """
+        self._pending = self._pending[len(batch) :]
+        self.scored += len(batch)
+        if self.score_cache is not None:
+            self.score_cache.put_many(
+                self.model,
+                self.query,
+                {self.keys[i]: s for i, s in zip(batch, batch_scores)},
+            )
+        cutoff = None
+        if len(self.scores) >= self.top_n:
+            cutoff = sorted(self.scores.values(), reverse=True)[self.top_n - 1]
+        self.scores.update(zip(batch, batch_scores))
+        if cutoff is not None and max(batch_scores) < cutoff - self.margin:
+            self._pending = []
+
+    def ranked(self) -> List[Document]:
+        """The top `top_n` scored documents by cross-encoder score."""
+        ranked = sorted(self.scores, key=lambda i: self.scores[i], reverse=True)
+        return [self.documents[i] for i in ranked[: self.top_n]]
+
+
+def run_cascades(cross_encoder, cascades: Sequence[RerankCascade]) -> None:
+    """
+    Runs the cascades to completion in rounds: each round scores the next batch of
+    every unfinished cascade in one cross-encoder call. Each cascade scores the same
+    batches and stops at the same point as when run alone.
+    """
+    while True:
+        batches = [(cascade, cascade.next_batch()) for cascade in cascades]
+        batches = [(cascade, batch) for cascade, batch in batches if batch]
+        if not batches:
+            return
+        scores = iter(
+            score_pairs(
+                cross_encoder,
+                [pair for cascade, batch in batches for pair in cascade.pairs(batch)],
+            )
+        )
+        for cascade, batch in batches:
+            cascade.add_scores(batch, [next(scores) for _ in batch])
+
+
+def cascade_rerank(
+    query: str,
+    documents: Sequence[Document],
+    cross_encoder,
+    top_n: Optional[int] = None,
+    vector_store=None,
+    score_cache: Optional[RerankScoreCache] = None,
+    prefilter_k: Optional[int] = None,
+    step: Optional[int] = None,
+    margin: Optional[float] = None,
+) -> List[Document]:
+    """
+    Reranks `documents` with as few cross-encoder calls as possible:
+
+    1. Prefilter on bi-encoder cosine when a `vector_store` is given (see
+       `prefilter`).
+    2. Cached scores for (query, chunk) are reused without scoring.
+    3. The rest are scored in bi-encoder order: the first batch fills the top
+       `top_n`, then batches of `step`. Scoring stops once a whole batch falls more
+       than `margin` below the current `top_n`-th score, since candidates further
+       down the bi-encoder ranking are unlikely to beat it.
+
+    Returns the top `top_n` documents by cross-encoder score.
+    """
+    top_n = top_n or Config.RERANK_K
+    prefilter_k = prefilter_k or Config.RERANK_PREFILTER_K
+    documents = list(documents)
+
+    with trace_stage("rerank", candidates=len(documents)) as span:
+        if not documents:
+            span.set(pairs=0, docs=0)
+            return []
+
+        order = list(range(len(documents)))
+        if vector_store is not None:
+            order = prefilter(vector_store, query, documents, top_n, prefilter_k)
+
+        cascade = RerankCascade(
+            query,
+            documents,
+            model_name(cross_encoder),
+            top_n,
+            order,
+            score_cache=score_cache,
+            step=step,
+            margin=margin,
+        )
+        run_cascades(cross_encoder, [cascade])
+        ranked = cascade.ranked()
+        span.set(
+            prefiltered=len(order),
+            cached=cascade.cached,
+            pairs=cascade.scored,
+            docs=len(ranked),
+        )
+    return ranked
+
+
+class CascadeReranker(BaseDocumentCompressor):
+    """Document compressor running `cascade_rerank` (drop-in for `CrossEncoderReranker`)."""
+
+    model: BaseCrossEncoder
+    top_n: int = 3
+    vector_store: Optional[Any] = None
+    score_cache: Optional[RerankScoreCache] = None
+
+    model_config = ConfigDict(arbitrary_types_allowed=True, extra="forbid")
+
+    def compress_documents(
+        self,
+        documents: Sequence[Document],
+        query: str,
+        callbacks: Optional[Callbacks] = None,
+    ) -> Sequence[Document]:
+        return cascade_rerank(
+            query,
+            documents,
+            self.model,
+            top_n=self.top_n,
+            vector_store=self.vector_store,
+            score_cache=self.score_cache,
+        )
@@ -0,0 +1,179 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from langchain_core.documents import Document
+
+from src.config import Config
+
+
+@dataclass
+class CacheEntry:
+    query: str
+    embedding: np.ndarray
+    retrieved_docs: List[Document]
+    answer: Optional[str]
+    context: Optional[str]
+    created_at: float
+
+
+class SemanticCache:
+    """
+    In-memory cache of retrieval and generation results keyed by the embedding of
+    the rewritten query. A lookup returns the most similar cached entry when its
+    cosine similarity is at least `threshold`, so rephrasings of a question share
+    one entry.
+
+    Entries expire after `ttl_seconds` and the least recently used entry is evicted
+    beyond `max_entries`. The whole cache is dropped when `version_fn` (the vector
+    store's build id) changes, so answers never outlive the index they came from.
+    """
+
+    def __init__(
+        self,
+        threshold: Optional[float] = None,
+        max_entries: Optional[int] = None,
+        ttl_seconds: Optional[float] = None,
+        version_fn: Optional[Callable[[], Optional[str]]] = None,
+    ):
+        self.threshold = threshold or Config.SEMANTIC_CACHE_THRESHOLD
+        self.max_entries = max_entries or Config.SEMANTIC_CACHE_MAX_ENTRIES
+        self.ttl_seconds = ttl_seconds or Config.SEMANTIC_CACHE_TTL_SECONDS
+        self.version_fn = version_fn
+        self._entries: "OrderedDict[int, CacheEntry]" = OrderedDict()
+        self._matrix: Optional[np.ndarray] = None
+        self._matrix_keys: List[int] = []
+        self._next_key = 0
+        self._version: Optional[str] = None
+        self._version_checked_at = 0.0
+        self._lock = threading.Lock()
+        self.counters = {
+            "lookups": 0,
+            "answer_hits": 0,
+            "retrieval_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "invalidations": 0,
+        }
+
+    # --- Internal helpers (call with the lock held) ---
+
+    def _check_version(self) -> None:
+        if self.version_fn is None:
+            return
+        now = time.time()
+        if now - self._version_checked_at < Config.SEMANTIC_CACHE_VERSION_CHECK_SECONDS:
+            return
+        self._version_checked_at = now
+        try:
+            version = self.version_fn()
+        except Exception as e:
+            print(f"Could not read the vector store build id: {e}")
+            return
+        if self._version is not None and version != self._version:
+            self._clear()
+        self._version = version
+
+    def _clear(self) -> None:
+        self._entries.clear()
+        self._matrix = None
+        self.counters["invalidations"] += 1
+
+    def _expire(self) -> None:
+        cutoff = time.time() - self.ttl_seconds
+        expired = [k for k, e in self._entries.items() if e.created_at < cutoff]
+        for key in expired:
+            del self._entries[key]
+        if expired:
+            self._matrix = None
+            self.counters["expirations"] += len(expired)
+
+    def _similarities(self, embedding: np.ndarray) -> np.ndarray:
+        if self._matrix is None:
+            self._matrix_keys = list(self._entries)
+            self._matrix = (
+                np.stack([self._entries[k].embedding for k in self._matrix_keys])
+                if self._matrix_keys
+                else np.empty((0, len(embedding)), dtype=np.float32)
+            )
+        return self._matrix @ embedding
+
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    # --- Public API ---
+
+    def lookup(self, embedding, with_answer: bool = True) -> Optional[CacheEntry]:
+        """
+        Returns the closest live entry above the similarity threshold, if any. A hit
+        counts as an answer hit only when `with_answer` is set and the entry has one.
+        """
+        vector = self._normalize(embedding)
+        with self._lock:
+            self.counters["lookups"] += 1
+            self._check_version()
+            self._expire()
+            if not self._entries:
+                self.counters["misses"] += 1
+                return None
+
+            similarities = self._similarities(vector)
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                self.counters["misses"] += 1
+                return None
+
+            key = self._matrix_keys[best]
+            entry = self._entries[key]
+            self._entries.move_to_end(key)
+            answered = with_answer and entry.answer is not None
+            hit = "answer_hits" if answered else "retrieval_hits"
+            self.counters[hit] += 1
+            return entry
+
+    def store(
+        self,
+        query: str,
+        embedding,
+        retrieved_docs: List[Document],
+        answer: Optional[str] = None,
+        context: Optional[str] = None,
+    ) -> None:
+        """Adds an entry, evicting the least recently used one when full."""
+        entry = CacheEntry(
+            query=query,
+            embedding=self._normalize(embedding),
+            retrieved_docs=list(retrieved_docs),
+            answer=answer,
+            context=context,
+            created_at=time.time(),
+        )
+        with self._lock:
+            self._check_version()
+            self._entries[self._next_key] = entry
+            self._next_key += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.counters["evictions"] += 1
+            self._matrix = None
+
+    def invalidate(self) -> None:
+        """Drops every entry, e.g. after the vector store was rebuilt."""
+        with self._lock:
+            self._clear()
+
+    def stats(self) -> Dict[str, float]:
+        """Returns hit/miss counters and the overall hit rate."""
+        with self._lock:
+            stats = dict(self.counters)
+            stats["entries"] = len(self._entries)
+        hits = stats["answer_hits"] + stats["retrieval_hits"]
+        stats["hit_rate"] = hits / stats["lookups"] if stats["lookups"] else 0.0
+        return stats
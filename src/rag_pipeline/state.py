@@ -1,4 +1,4 @@
-from typing import List, TypedDict
+from typing import Any, Dict, List, TypedDict
 from langchain_core.documents import Document
 
 
@@ -14,3 +14,17 @@ class RAGState(TypedDict):
     reranked_docs: List[Document]
     answer: str
     context: str
+    # "answer" or "retrieval" when served from the semantic cache, else empty
+    cache_hit: str
+    # Per-request override of Config.SEMANTIC_CACHE_ANSWERS (set by the caller)
+    cache_answers: bool
+    # Embedding of `rewritten_query` computed by the semantic cache lookup
+    query_vector: List[float]
+    # "kept" or "discarded" when retrieval ran speculatively on the raw query
+    speculation: str
+    # Cosine similarity of the raw and rewritten query that decided `speculation`
+    speculation_similarity: float
+    # Per-request latencies in seconds (rewrite, retrieval, TTFT, generation, ...)
+    timings: Dict[str, float]
+    # Stage records (wall/CPU time, sizes) appended by src/tracing.py
+    trace: List[Dict[str, Any]]
@@ -0,0 +1,306 @@
+import threading
+import time
+from dataclasses import dataclass, asdict
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import psutil
+
+from src.config import Config
+
+
+@dataclass
+class ResourceStats:
+    """Load statistics recorded the first time a resource is created."""
+
+    name: str
+    load_seconds: float
+    rss_delta_mb: float
+    rss_after_mb: float
+    loaded_at: float
+
+
+def _rss_mb() -> float:
+    return psutil.Process().memory_info().rss / (1024 * 1024)
+
+
+class ResourceRegistry:
+    """
+    Process-wide registry of expensive, shareable resources (models, clients, chains).
+
+    Each resource is created at most once per process by its registered loader and
+    then handed out to every caller, so Streamlit sessions, worker threads and graph
+    nodes all share the same embedding model, cross-encoder and connection pool.
+    Loading is guarded by a per-resource lock, so concurrent first calls block on a
+    single load instead of racing to build duplicates.
+    """
+
+    def __init__(self):
+        self._loaders: Dict[str, Callable[[], Any]] = {}
+        self._resources: Dict[str, Any] = {}
+        self._stats: Dict[str, ResourceStats] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, loader: Callable[[], Any]) -> None:
+        """Registers (or replaces) the loader used to build a resource."""
+        with self._lock:
+            self._loaders[name] = loader
+            self._locks.setdefault(name, threading.Lock())
+
+    def names(self) -> List[str]:
+        """Returns the names of all registered resources."""
+        return list(self._loaders)
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._resources
+
+    def get(self, name: str) -> Any:
+        """Returns the named resource, loading it on first use."""
+        try:
+            return self._resources[name]
+        except KeyError:
+            pass
+
+        if name not in self._loaders:
+            raise KeyError(f"No resource registered under '{name}'.")
+
+        with self._locks[name]:
+            # Another thread may have finished loading while we waited for the lock.
+            if name in self._resources:
+                return self._resources[name]
+
+            print(f"Loading resource '{name}'...")
+            rss_before = _rss_mb()
+            start = time.perf_counter()
+            resource = self._loaders[name]()
+            elapsed = time.perf_counter() - start
+            rss_after = _rss_mb()
+
+            self._stats[name] = ResourceStats(
+                name=name,
+                load_seconds=elapsed,
+                rss_delta_mb=rss_after - rss_before,
+                rss_after_mb=rss_after,
+                loaded_at=time.time(),
+            )
+            self._resources[name] = resource
+            print(f"Loaded resource '{name}' in {elapsed:.2f}s.")
+            return resource
+
+    def override(self, name: str, resource: Any) -> None:
+        """Installs a ready-made resource, e.g. a stub or a pre-configured client."""
+        with self._lock:
+            self._locks.setdefault(name, threading.Lock())
+            self._loaders.setdefault(name, lambda: resource)
+            self._resources[name] = resource
+            self._stats.pop(name, None)
+
+    def wrap(self, name: str, wrapper: Callable[[Any], Any]) -> None:
+        """
+        Makes the named resource `wrapper(resource)`: wraps its loader and, when it is
+        already loaded, the loaded instance. Resources built from the unwrapped one
+        before are not rebuilt.
+        """
+        with self._lock:
+            loader = self._loaders[name]
+            self._loaders[name] = lambda: wrapper(loader())
+            if name in self._resources:
+                self._resources[name] = wrapper(self._resources[name])
+
+    def reset(self, name: Optional[str] = None) -> None:
+        """Drops one (or every) loaded resource so the next `get` reloads it."""
+        with self._lock:
+            names = [name] if name else list(self._resources)
+            for key in names:
+                self._resources.pop(key, None)
+                self._stats.pop(key, None)
+
+    def warm_up(self, names: Optional[Iterable[str]] = None) -> List[ResourceStats]:
+        """
+        Eagerly loads the given resources (default: `Config.WARMUP_RESOURCES`).
+        Resources are loaded one at a time so the memory delta of each is attributable.
+        """
+        names = list(names) if names is not None else list(Config.WARMUP_RESOURCES)
+        for name in names:
+            try:
+                self.get(name)
+            except Exception as e:
+                print(f"Could not warm up resource '{name}': {e}")
+        return [self._stats[n] for n in names if n in self._stats]
+
+    def report(self) -> List[Dict[str, Any]]:
+        """Returns load time and memory statistics for every loaded resource."""
+        return [asdict(stats) for stats in self._stats.values()]
+
+    def print_report(self) -> None:
+        print("\n--- Resource Load Report ---")
+        if not self._stats:
+            print("No resources loaded.")
+            return
+        for stats in self._stats.values():
+            print(
+                f"{stats.name:<28} {stats.load_seconds:>8.2f}s "
+                f"{stats.rss_delta_mb:>+10.1f} MB (RSS {stats.rss_after_mb:.1f} MB)"
+            )
+
+
+registry = ResourceRegistry()
+
+
+def get_resource(name: str) -> Any:
+    """Shortcut for `registry.get(name)`."""
+    return registry.get(name)
+
+
+# --- Default loaders ---
+# Imports happen inside the loaders so that importing this module stays cheap and
+# modules that depend on the registry do not create import cycles.
+
+
+def _load_embeddings():
+    from src.inference import load_embeddings
+
+    embeddings = load_embeddings()
+    if Config.EMBEDDING_CACHE_ENABLED:
+        from src.inference import model_tag
+        from src.vector_store.embedding_cache import CachedEmbeddings
+
+        embeddings = CachedEmbeddings(
+            embeddings, model_name=model_tag(Config.EMBEDDING_MODEL)
+        )
+    return embeddings
+
+
+def _load_cross_encoder():
+    from src.inference import load_cross_encoder
+
+    return load_cross_encoder()
+
+
+def _load_mongo_client():
+    from pymongo import MongoClient
+
+    if not Config.MONGO_URI:
+        raise ValueError("No MongoDB URI found in configuration.")
+    return MongoClient(Config.MONGO_URI)
+
+
+def _load_vector_store():
+    if Config.VECTOR_STORE_BACKEND == "local":
+        from src.vector_store.local_store import LocalVectorStore
+
+        return LocalVectorStore.load(
+            Config.LOCAL_INDEX_DIRECTORY, registry.get("embeddings")
+        )
+
+    from langchain_mongodb import MongoDBAtlasVectorSearch
+
+    client = registry.get("mongo_client")
+    return MongoDBAtlasVectorSearch(
+        collection=client[Config.DB_NAME][Config.COLLECTION_NAME],
+        embedding=registry.get("embeddings"),
+        index_name=Config.VECTOR_SEARCH_INDEX_NAME,
+    )
+
+
+def _load_bm25_index():
+    from src.vector_store.bm25 import BM25Index
+
+    return BM25Index.load()
+
+
+def _load_groq_rate_limiter():
+    from src.rag_pipeline.chains import create_rate_limiter
+
+    return create_rate_limiter()
+
+
+def _load_llm():
+    from src.rag_pipeline.chains import get_llm
+
+    return get_llm(rate_limiter=registry.get("groq_rate_limiter"))
+
+
+def _load_query_rewriter_chain():
+    from src.rag_pipeline.chains import create_query_rewriter_chain
+
+    return create_query_rewriter_chain(llm=registry.get("llm"))
+
+
+def _load_query_rewriter():
+    from src.rag_pipeline.query_rewriting import QueryRewriter, RewriteCache
+
+    return QueryRewriter(RewriteCache() if Config.REWRITE_CACHE_ENABLED else None)
+
+
+def _load_answer_generation_chain():
+    from src.rag_pipeline.chains import create_answer_generation_chain
+
+    return create_answer_generation_chain(llm=registry.get("llm"))
+
+
+def _load_reranking_retriever():
+    from src.rag_pipeline.chains import (
+        create_base_retriever,
+        create_hybrid_retriever,
+        create_reranking_retriever,
+    )
+
+    vector_store = registry.get("vector_store")
+    base_retriever = create_base_retriever(vector_store)
+    if Config.HYBRID_RETRIEVAL_ENABLED:
+        bm25_index = registry.get("bm25_index")
+        if bm25_index is not None:
+            base_retriever = create_hybrid_retriever(
+                base_retriever, bm25_index, vector_store
+            )
+        else:
+            print("No BM25 index found, using dense retrieval only.")
+    return create_reranking_retriever(
+        base_retriever,
+        model=registry.get("cross_encoder"),
+        vector_store=vector_store,
+        score_cache=registry.get("rerank_score_cache"),
+    )
+
+
+def _load_rerank_score_cache():
+    from src.rag_pipeline.reranking import RerankScoreCache
+
+    return RerankScoreCache()
+
+
+def _load_wikipedia_client():
+    from src.data_processing.wikipedia import WikipediaAPIClient
+
+    return WikipediaAPIClient()
+
+
+def _load_semantic_cache():
+    from src.rag_pipeline.semantic_cache import SemanticCache
+    from src.vector_store.manifest import read_build_id
+
+    if Config.VECTOR_STORE_BACKEND == "local":
+        version_fn = read_build_id
+    else:
+        collection = registry.get("mongo_client")[Config.DB_NAME][
+            Config.MANIFEST_COLLECTION_NAME
+        ]
+        version_fn = lambda: read_build_id(collection)
+    return SemanticCache(version_fn=version_fn)
+
+
+registry.register("embeddings", _load_embeddings)
+registry.register("cross_encoder", _load_cross_encoder)
+registry.register("mongo_client", _load_mongo_client)
+registry.register("vector_store", _load_vector_store)
+registry.register("bm25_index", _load_bm25_index)
+registry.register("groq_rate_limiter", _load_groq_rate_limiter)
+registry.register("llm", _load_llm)
+registry.register("query_rewriter_chain", _load_query_rewriter_chain)
+registry.register("query_rewriter", _load_query_rewriter)
+registry.register("answer_generation_chain", _load_answer_generation_chain)
+registry.register("rerank_score_cache", _load_rerank_score_cache)
+registry.register("reranking_retriever", _load_reranking_retriever)
+registry.register("semantic_cache", _load_semantic_cache)
+registry.register("wikipedia_client", _load_wikipedia_client)
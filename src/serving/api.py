@@ -0,0 +1,287 @@
+import argparse
+import asyncio
+import json
+import os
+from typing import Any, Dict, List
+
+from prometheus_client import Counter, Gauge
+
+from src.config import Config
+from src.resources import registry
+from src.serving.batching import BatcherOverloaded, batcher_stats, enable_micro_batching
+from src.tracing import tracer
+
+_PENDING = Gauge(
+    "rag_service_requests_pending",
+    "Answer requests admitted by the service (running or waiting).",
+    registry=tracer.metrics,
+)
+_REJECTED = Counter(
+    "rag_service_requests_rejected",
+    "Answer requests rejected with 503 because the service was saturated.",
+    registry=tracer.metrics,
+)
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def _sources(docs) -> List[Dict[str, Any]]:
+    """Source file and page of each document, with the duplicates it stands in for."""
+    return [
+        {
+            "source": os.path.basename(doc.metadata.get("source", "Unknown Source")),
+            "page": doc.metadata.get("page"),
+            "also_in": [
+                {"source": os.path.basename(other["source"]), "page": other.get("page")}
+                for other in doc.metadata.get("also_in") or []
+            ],
+        }
+        for doc in docs or []
+    ]
+
+
+def response_body(state: Dict[str, Any]) -> Dict[str, Any]:
+    """The JSON answer for a final graph state."""
+    return {
+        "answer": state.get("answer", ""),
+        "rewritten_query": state.get("rewritten_query", ""),
+        "cache_hit": state.get("cache_hit", ""),
+        "sources": _sources(state.get("retrieved_docs")),
+        "timings": state.get("timings", {}),
+    }
+
+
+class RAGService:
+    """
+    ASGI application serving the async RAG graph to many users from one process.
+
+    Concurrent requests share the embedding model and cross-encoder through
+    micro-batchers (see `src/serving/batching.py`), so their query embeddings and
+    rerank pairs run in merged model calls. At most `SERVICE_MAX_CONCURRENCY`
+    requests run the graph at once; up to `SERVICE_MAX_PENDING` are admitted in
+    total and the rest are answered with 503 and `Retry-After`, as are requests
+    that hit a full batcher queue.
+
+    Routes:
+    - POST /answer: {"query", "conversation_history"?} -> answer, sources, timings
+    - POST /answer/stream: the same, as newline-delimited JSON events
+      ({"token": ...} per answer token, then the full response)
+    - GET /health, GET /stats (queue depths, batch sizes, stage latencies),
+      GET /metrics (Prometheus)
+    """
+
+    def __init__(self, graph=None):
+        self.graph = graph
+        self.pending = 0
+        self._semaphore = asyncio.Semaphore(Config.SERVICE_MAX_CONCURRENCY)
+        self._startup_lock = asyncio.Lock()
+
+    # --- Lifecycle ---
+
+    def _load(self) -> None:
+        from src.rag_pipeline.graph import build_async_rag_graph
+
+        if Config.MICRO_BATCH_ENABLED:
+            enable_micro_batching(registry)
+        registry.warm_up()
+        self.graph = build_async_rag_graph()
+
+    async def startup(self) -> None:
+        """Loads the models and builds the graph once (lifespan or first request)."""
+        async with self._startup_lock:
+            if self.graph is None:
+                await asyncio.to_thread(self._load)
+
+    async def _lifespan(self, receive, send) -> None:
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                try:
+                    await self.startup()
+                except Exception as e:
+                    await send({"type": "lifespan.startup.failed", "message": str(e)})
+                    return
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    # --- ASGI plumbing ---
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+
+        route = (scope["method"], scope["path"].rstrip("/") or "/")
+        try:
+            if route == ("GET", "/health"):
+                await self._send_json(send, 200, {"status": "ok"})
+            elif route == ("GET", "/stats"):
+                await self._send_json(send, 200, self.stats())
+            elif route == ("GET", "/metrics"):
+                await self._send(
+                    send,
+                    200,
+                    tracer.prometheus_text(),
+                    "text/plain; version=0.0.4; charset=utf-8",
+                )
+            elif route == ("POST", "/answer"):
+                await self._answer(await self._read_json(receive), send)
+            elif route == ("POST", "/answer/stream"):
+                await self._stream_answer(await self._read_json(receive), send)
+            else:
+                raise HTTPError(404, f"No route for {route[0]} {route[1]}.")
+        except HTTPError as e:
+            headers = [(b"retry-after", b"1")] if e.status == 503 else []
+            await self._send_json(send, e.status, {"error": str(e)}, headers)
+
+    @staticmethod
+    async def _read_json(receive) -> Dict[str, Any]:
+        body, more = b"", True
+        while more:
+            message = await receive()
+            body += message.get("body", b"")
+            more = message.get("more_body", False)
+        try:
+            payload = json.loads(body or b"{}")
+        except json.JSONDecodeError as e:
+            raise HTTPError(400, f"Invalid JSON: {e}") from None
+        if not isinstance(payload, dict) or not str(payload.get("query", "")).strip():
+            raise HTTPError(400, "The body must be a JSON object with a 'query'.")
+        return payload
+
+    @staticmethod
+    async def _start(send, status: int, content_type: str, headers=()) -> None:
+        await send(
+            {
+                "type": "http.response.start",
+                "status": status,
+                "headers": [(b"content-type", content_type.encode()), *headers],
+            }
+        )
+
+    async def _send(
+        self, send, status: int, body: bytes, content_type: str, headers=()
+    ):
+        await self._start(send, status, content_type, headers)
+        await send({"type": "http.response.body", "body": body})
+
+    async def _send_json(self, send, status: int, payload, headers=()) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        await self._send(send, status, body, "application/json", headers)
+
+    # --- Answering ---
+
+    def _admit(self) -> None:
+        """Admission control: counts the request in, or rejects it when saturated."""
+        if self.pending >= Config.SERVICE_MAX_PENDING:
+            _REJECTED.inc()
+            raise HTTPError(503, "The service is saturated, retry shortly.")
+        self.pending += 1
+        _PENDING.set(self.pending)
+
+    def _release(self) -> None:
+        self.pending -= 1
+        _PENDING.set(self.pending)
+
+    @staticmethod
+    def _inputs(payload: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "query": str(payload["query"]),
+            "conversation_history": str(payload.get("conversation_history") or ""),
+        }
+
+    async def _answer(self, payload: Dict[str, Any], send) -> None:
+        await self.startup()
+        self._admit()
+        try:
+            async with self._semaphore:
+                state = await self.graph.ainvoke(self._inputs(payload))
+        except BatcherOverloaded as e:
+            raise HTTPError(503, str(e)) from e
+        except Exception as e:
+            raise HTTPError(500, f"{type(e).__name__}: {e}") from e
+        finally:
+            self._release()
+        await self._send_json(send, 200, response_body(state))
+
+    async def _stream_answer(self, payload: Dict[str, Any], send) -> None:
+        from src.rag_pipeline.graph import astream_rag
+
+        await self.startup()
+        self._admit()
+        started = False
+        try:
+            async with self._semaphore:
+                async for kind, value in astream_rag(self.graph, self._inputs(payload)):
+                    if not started:
+                        await self._start(send, 200, "application/x-ndjson")
+                        started = True
+                    event = (
+                        {"token": value} if kind == "token" else response_body(value)
+                    )
+                    await send(
+                        {
+                            "type": "http.response.body",
+                            "body": json.dumps(event, ensure_ascii=False).encode()
+                            + b"\n",
+                            "more_body": True,
+                        }
+                    )
+        except Exception as e:
+            if not started:
+                status = 503 if isinstance(e, BatcherOverloaded) else 500
+                raise HTTPError(status, f"{type(e).__name__}: {e}") from e
+            error = json.dumps({"error": f"{type(e).__name__}: {e}"}).encode()
+            await send(
+                {"type": "http.response.body", "body": error + b"\n", "more_body": True}
+            )
+        finally:
+            self._release()
+        await send({"type": "http.response.body", "body": b""})
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": self.pending,
+            "max_concurrency": Config.SERVICE_MAX_CONCURRENCY,
+            "max_pending": Config.SERVICE_MAX_PENDING,
+            "batchers": batcher_stats(registry),
+            "query_rewriter": (
+                registry.get("query_rewriter").stats()
+                if registry.is_loaded("query_rewriter")
+                else None
+            ),
+            "stages": tracer.summary(),
+        }
+
+
+app = RAGService()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the RAG pipeline over HTTP.")
+    parser.add_argument("--host", default=Config.SERVICE_HOST)
+    parser.add_argument("--port", type=int, default=Config.SERVICE_PORT)
+    args = parser.parse_args(argv)
+
+    try:
+        import uvicorn
+    except ImportError as e:
+        raise ImportError(
+            "Serving needs an ASGI server: pip install uvicorn "
+            "(or run `src.serving.api:app` with any other ASGI server)."
+        ) from e
+
+    # One process: the micro-batchers only merge requests within a process.
+    uvicorn.run(app, host=args.host, port=args.port, workers=1)
+
+
+if __name__ == "__main__":
+    main()
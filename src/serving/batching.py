@@ -0,0 +1,314 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from langchain_community.cross_encoders import BaseCrossEncoder
+from langchain_core.embeddings import Embeddings
+from prometheus_client import Counter, Gauge, Histogram
+
+from src.config import Config
+from src.tracing import SIZE_BUCKETS, tracer
+
+_QUEUE_DEPTH = Gauge(
+    "rag_batcher_queue_depth",
+    "Requests waiting for the micro-batcher.",
+    ["batcher"],
+    registry=tracer.metrics,
+)
+_BATCH_SIZE = Histogram(
+    "rag_batcher_batch_size",
+    "Items (texts or pairs) per merged model call.",
+    ["batcher"],
+    buckets=SIZE_BUCKETS,
+    registry=tracer.metrics,
+)
+_BATCH_REQUESTS = Histogram(
+    "rag_batcher_batch_requests",
+    "Caller requests merged into one model call.",
+    ["batcher"],
+    buckets=SIZE_BUCKETS,
+    registry=tracer.metrics,
+)
+_QUEUE_WAIT = Histogram(
+    "rag_batcher_queue_wait_seconds",
+    "Time a request waited before its model call started.",
+    ["batcher"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+    registry=tracer.metrics,
+)
+_REJECTED = Counter(
+    "rag_batcher_rejected",
+    "Requests rejected because the micro-batcher queue was full.",
+    ["batcher"],
+    registry=tracer.metrics,
+)
+
+
+class BatcherOverloaded(RuntimeError):
+    """Raised when a micro-batcher's queue stays full for `MICRO_BATCH_QUEUE_TIMEOUT`."""
+
+
+class BatcherClosed(BatcherOverloaded):
+    """Raised for requests submitted to (or left queued in) a closed micro-batcher."""
+
+
+@dataclass
+class _Request:
+    items: List[Any]
+    future: Future = field(default_factory=Future)
+    enqueued_at: float = field(default_factory=time.perf_counter)
+
+
+class MicroBatcher:
+    """
+    Merges the items (texts, pairs) of concurrent callers into shared model calls.
+
+    A worker thread takes the first waiting request, then keeps collecting requests
+    for up to `max_wait_ms` or until `max_batch_size` items are gathered, runs `fn`
+    once on all their items and hands each caller its slice of the results. A
+    request is never split; one larger than `max_batch_size` is run on its own.
+    The queue holds at most `max_queue` requests: callers block while it is full
+    and get `BatcherOverloaded` after `queue_timeout` seconds, which pushes back
+    on the service instead of letting the wait grow without bound. After `close`,
+    new requests get `BatcherClosed`.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        fn: Callable[[List[Any]], Sequence[Any]],
+        max_batch_size: Optional[int] = None,
+        max_wait_ms: Optional[float] = None,
+        max_queue: Optional[int] = None,
+        queue_timeout: Optional[float] = None,
+    ):
+        self.name = name
+        self.fn = fn
+        self.max_batch_size = max_batch_size or Config.MICRO_BATCH_MAX_SIZE
+        self.max_wait = (
+            Config.MICRO_BATCH_MAX_WAIT_MS if max_wait_ms is None else max_wait_ms
+        ) / 1000
+        self.queue_timeout = (
+            Config.MICRO_BATCH_QUEUE_TIMEOUT if queue_timeout is None else queue_timeout
+        )
+        self._queue: "queue.Queue[Optional[_Request]]" = queue.Queue(
+            max_queue or Config.MICRO_BATCH_MAX_QUEUE
+        )
+        self.counters = {"requests": 0, "items": 0, "batches": 0, "rejected": 0}
+        self._carry: Optional[_Request] = None
+        self._stopping = False
+        self._lock = threading.Lock()
+        # Guards `_closed` and counts the requests being put into the queue, so
+        # `close` enqueues its sentinel behind all of them.
+        self._closed = False
+        self._submitting = 0
+        self._submit_condition = threading.Condition()
+        self._worker = threading.Thread(
+            target=self._run, name=f"micro-batcher-{name}", daemon=True
+        )
+        self._worker.start()
+
+    def submit(self, items: Sequence[Any]) -> List[Any]:
+        """Runs `fn` on `items` as part of a merged batch; blocks until done."""
+        items = list(items)
+        if not items:
+            return []
+        request = _Request(items)
+        with self._submit_condition:
+            if self._closed:
+                raise BatcherClosed(f"The '{self.name}' batcher is closed.")
+            self._submitting += 1
+        try:
+            self._queue.put(request, timeout=self.queue_timeout)
+        except queue.Full:
+            with self._lock:
+                self.counters["rejected"] += 1
+            _REJECTED.labels(self.name).inc()
+            raise BatcherOverloaded(
+                f"The '{self.name}' batcher queue is full "
+                f"({self._queue.maxsize} requests)."
+            ) from None
+        finally:
+            with self._submit_condition:
+                self._submitting -= 1
+                self._submit_condition.notify_all()
+        _QUEUE_DEPTH.labels(self.name).set(self._queue.qsize())
+        return request.future.result()
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            batches = self.counters["batches"]
+            return {
+                **self.counters,
+                "queue_depth": self._queue.qsize(),
+                "mean_batch_size": self.counters["items"] / batches if batches else 0.0,
+            }
+
+    def close(self) -> None:
+        """
+        Rejects new requests and stops the worker after the requests already
+        queued, including those being enqueued while it is called.
+        """
+        with self._submit_condition:
+            closing, self._closed = not self._closed, True
+            self._submit_condition.wait_for(lambda: self._submitting == 0)
+        if closing:
+            self._queue.put(None)
+        self._worker.join()
+
+    def _collect(self, first: _Request) -> List[_Request]:
+        batch, size = [first], len(first.items)
+        deadline = time.perf_counter() + self.max_wait
+        while size < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            try:
+                if timeout > 0:
+                    request = self._queue.get(timeout=timeout)
+                else:
+                    request = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if request is None:
+                self._stopping = True
+                break
+            if size + len(request.items) > self.max_batch_size:
+                # Starts the next batch.
+                self._carry = request
+                break
+            batch.append(request)
+            size += len(request.items)
+        return batch
+
+    def _run(self) -> None:
+        try:
+            while not self._stopping:
+                if self._carry is not None:
+                    first, self._carry = self._carry, None
+                else:
+                    first = self._queue.get()
+                if first is None:
+                    return
+                self._run_batch(self._collect(first))
+        finally:
+            self._fail_queued()
+
+    def _fail_queued(self) -> None:
+        """Fails the requests left behind by the stopped worker, so no caller hangs."""
+        leftover = [self._carry] if self._carry is not None else []
+        self._carry = None
+        while True:
+            try:
+                leftover.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        for request in leftover:
+            if request is not None and not request.future.done():
+                request.future.set_exception(
+                    BatcherClosed(f"The '{self.name}' batcher is closed.")
+                )
+
+    def _run_batch(self, batch: List[_Request]) -> None:
+        _QUEUE_DEPTH.labels(self.name).set(self._queue.qsize())
+        started = time.perf_counter()
+        items = [item for request in batch for item in request.items]
+        for request in batch:
+            _QUEUE_WAIT.labels(self.name).observe(started - request.enqueued_at)
+        _BATCH_SIZE.labels(self.name).observe(len(items))
+        _BATCH_REQUESTS.labels(self.name).observe(len(batch))
+        with self._lock:
+            self.counters["requests"] += len(batch)
+            self.counters["items"] += len(items)
+            self.counters["batches"] += 1
+
+        try:
+            results = list(self.fn(items))
+        except Exception as e:
+            for request in batch:
+                request.future.set_exception(e)
+            return
+        offset = 0
+        for request in batch:
+            request.future.set_result(results[offset : offset + len(request.items)])
+            offset += len(request.items)
+
+
+class BatchingEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that sends the texts of concurrent callers through shared
+    micro-batchers (one for queries, one for documents), so simultaneous requests
+    share one model forward pass instead of competing for the CPU with their own.
+    """
+
+    def __init__(self, underlying: Embeddings, **batcher_kwargs):
+        from src.vector_store.embedding_cache import embed_queries
+
+        self.underlying = underlying
+        self.query_batcher = MicroBatcher(
+            "embed_query",
+            lambda texts: embed_queries(underlying, texts),
+            **batcher_kwargs,
+        )
+        self.document_batcher = MicroBatcher(
+            "embed_documents", underlying.embed_documents, **batcher_kwargs
+        )
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.document_batcher.submit(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.query_batcher.submit([text])[0]
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        return self.query_batcher.submit(texts)
+
+    def batchers(self) -> List[MicroBatcher]:
+        return [self.query_batcher, self.document_batcher]
+
+
+class BatchingCrossEncoder(BaseCrossEncoder):
+    """
+    Cross-encoder wrapper that merges the (query, passage) pairs of concurrent
+    rerank calls into shared `score_pairs` calls.
+    """
+
+    def __init__(self, underlying, **batcher_kwargs):
+        from src.rag_pipeline.reranking import model_name, score_pairs
+
+        self.underlying = underlying
+        # Score cache keys stay those of the wrapped model.
+        self.model_name = model_name(underlying)
+        self.batcher = MicroBatcher(
+            "rerank", lambda pairs: score_pairs(underlying, pairs), **batcher_kwargs
+        )
+
+    def score(self, text_pairs: List[tuple]) -> List[float]:
+        return self.batcher.submit(text_pairs)
+
+    def batchers(self) -> List[MicroBatcher]:
+        return [self.batcher]
+
+
+def enable_micro_batching(registry) -> None:
+    """
+    Wraps the registry's embedding model and cross-encoder in micro-batching
+    wrappers. Call it before the resources that use them (vector store, reranking
+    retriever) are loaded, e.g. before `registry.warm_up()`.
+    """
+    registry.wrap("embeddings", BatchingEmbeddings)
+    registry.wrap("cross_encoder", BatchingCrossEncoder)
+
+
+def batcher_stats(registry) -> Dict[str, Dict[str, float]]:
+    """Counters and queue depth of every micro-batcher among the loaded resources."""
+    stats = {}
+    for name in ("embeddings", "cross_encoder"):
+        if registry.is_loaded(name):
+            for batcher in getattr(registry.get(name), "batchers", list)():
+                stats[batcher.name] = batcher.stats()
+    return stats
@@ -0,0 +1,130 @@
+import argparse
+import json
+import re
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Sequence
+
+from src.config import Config
+
+# Modules every query path imports before any model is loaded.
+STARTUP_MODULES = ("src.cli", "src.resources", "src.rag_pipeline.graph")
+
+_IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def parse_importtime(output: str) -> List[Dict]:
+    """Parses `python -X importtime` output into (module, depth, self/cumulative s)."""
+    records = []
+    for line in output.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            records.append(
+                {
+                    "module": module,
+                    "depth": len(indent) // 2,
+                    "self_seconds": int(self_us) / 1e6,
+                    "cumulative_seconds": int(cumulative_us) / 1e6,
+                }
+            )
+    return records
+
+
+def import_profile(modules: Sequence[str] = STARTUP_MODULES, top: int = 15) -> Dict:
+    """
+    Imports `modules` in a fresh interpreter with `-X importtime` and attributes
+    the import time to top-level packages (e.g. all `langchain_core.*` modules count
+    towards `langchain_core`). Returns the total and the `top` heaviest packages.
+    """
+    statement = "; ".join(f"import {module}" for module in modules)
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    records = parse_importtime(completed.stderr)
+    by_package: Dict[str, float] = defaultdict(float)
+    for record in records:
+        by_package[record["module"].split(".")[0]] += record["self_seconds"]
+    packages = sorted(by_package.items(), key=lambda item: -item[1])
+    return {
+        "modules": list(modules),
+        "import_seconds": sum(
+            r["cumulative_seconds"] for r in records if r["depth"] == 0
+        ),
+        "packages": [
+            {"package": package, "seconds": seconds}
+            for package, seconds in packages[:top]
+        ],
+    }
+
+
+def cold_start_seconds(
+    modules: Sequence[str] = STARTUP_MODULES, runs: int = 3
+) -> float:
+    """Best wall time of `runs` fresh interpreters that start and import `modules`."""
+    statement = "; ".join(f"import {module}" for module in modules)
+    best = float("inf")
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", statement], check=True)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def startup_report(
+    modules: Sequence[str] = STARTUP_MODULES,
+    runs: int = 3,
+    target: Optional[float] = None,
+) -> Dict:
+    target = Config.STARTUP_TARGET_SECONDS if target is None else target
+    report = import_profile(modules)
+    report["cold_start_seconds"] = cold_start_seconds(modules, runs)
+    report["target_seconds"] = target
+    report["within_target"] = report["cold_start_seconds"] <= target
+    return report
+
+
+def print_report(report: Dict) -> None:
+    print(f"Imports: {', '.join(report['modules'])}")
+    print(
+        f"Cold start {report['cold_start_seconds']:.3f}s "
+        f"(imports {report['import_seconds']:.3f}s), target "
+        f"{report['target_seconds']:.2f}s: "
+        f"{'OK' if report['within_target'] else 'OVER TARGET'}"
+    )
+    print(f"\n{'package':<32} {'seconds':>8}")
+    for row in report["packages"]:
+        print(f"{row['package']:<32} {row['seconds']:>8.3f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Import-time profile and cold-start check of the query path."
+    )
+    parser.add_argument("modules", nargs="*", default=list(STARTUP_MODULES))
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument(
+        "--target",
+        type=float,
+        default=None,
+        help="Cold-start budget in seconds (default STARTUP_TARGET_SECONDS).",
+    )
+    parser.add_argument("--json", action="store_true", help="Print JSON instead.")
+    args = parser.parse_args(argv)
+
+    report = startup_report(args.modules, args.runs, args.target)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+    if not report["within_target"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,316 @@
+import argparse
+import contextvars
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from typing import Any, Deque, Dict, Iterator, List, Optional
+
+import numpy as np
+from langchain_core.callbacks import BaseCallbackHandler
+from prometheus_client import CollectorRegistry, Histogram, generate_latest
+
+from src.config import Config
+
+# Latency buckets from a few milliseconds (cache lookups) up to a minute (LLM calls
+# queued behind the rate limiter).
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)  # fmt: skip
+SIZE_BUCKETS = (1, 5, 10, 20, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+@dataclass
+class StageRecord:
+    """Wall time, CPU time and input/output sizes of one pipeline stage."""
+
+    stage: str
+    wall_seconds: float
+    cpu_seconds: float
+    started_at: float
+    parent: Optional[str] = None
+    sizes: Dict[str, int] = field(default_factory=dict)
+
+
+class Span:
+    """Handle of a running stage; sizes set on it are recorded when the stage ends."""
+
+    def __init__(self, stage: str, parent: Optional["Span"]):
+        self.stage = stage
+        self.parent = parent
+        self.sizes: Dict[str, int] = {}
+
+    def set(self, **sizes: int) -> None:
+        self.sizes.update(sizes)
+
+    def add(self, **sizes: int) -> None:
+        for key, value in sizes.items():
+            self.sizes[key] = self.sizes.get(key, 0) + value
+
+
+# The records of the request being traced and the innermost open span. Both follow
+# the request into threads started by `asyncio.to_thread`/`run_in_executor`.
+_current_records: contextvars.ContextVar[Optional[List[Dict[str, Any]]]] = (
+    contextvars.ContextVar("trace_records", default=None)
+)
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar(
+    "trace_span", default=None
+)
+
+
+class Tracer:
+    """
+    Process-wide sink for stage records. Keeps Prometheus histograms of wall time,
+    CPU time and sizes per stage, a bounded window of recent records for
+    percentile summaries, and optionally appends every record to a JSONL log.
+    """
+
+    def __init__(self, log_path: Optional[str] = None, window: int = 10000):
+        self.log_path = log_path
+        self.metrics = CollectorRegistry()
+        self._wall = Histogram(
+            "rag_stage_wall_seconds",
+            "Wall-clock time per pipeline stage.",
+            ["stage"],
+            buckets=LATENCY_BUCKETS,
+            registry=self.metrics,
+        )
+        self._cpu = Histogram(
+            "rag_stage_cpu_seconds",
+            "CPU time of the calling thread per pipeline stage.",
+            ["stage"],
+            buckets=LATENCY_BUCKETS,
+            registry=self.metrics,
+        )
+        self._sizes = Histogram(
+            "rag_stage_size",
+            "Input/output sizes per pipeline stage (documents, pairs, tokens).",
+            ["stage", "name"],
+            buckets=SIZE_BUCKETS,
+            registry=self.metrics,
+        )
+        self._recent: Dict[str, Deque[StageRecord]] = defaultdict(
+            lambda: deque(maxlen=window)
+        )
+        self._lock = threading.Lock()
+        self._log_file = None
+
+    def record(self, record: StageRecord) -> None:
+        self._wall.labels(record.stage).observe(record.wall_seconds)
+        self._cpu.labels(record.stage).observe(record.cpu_seconds)
+        for name, value in record.sizes.items():
+            self._sizes.labels(record.stage, name).observe(value)
+        with self._lock:
+            self._recent[record.stage].append(record)
+            if self.log_path:
+                if self._log_file is None:
+                    if os.path.dirname(self.log_path):
+                        os.makedirs(os.path.dirname(self.log_path), exist_ok=True)
+                    self._log_file = open(self.log_path, "a", encoding="utf-8")
+                self._log_file.write(json.dumps(asdict(record)) + "\n")
+                self._log_file.flush()
+
+    def prometheus_text(self) -> bytes:
+        """Renders the histograms in the Prometheus text exposition format."""
+        return generate_latest(self.metrics)
+
+    def records(self) -> List[StageRecord]:
+        with self._lock:
+            return [r for stage in self._recent.values() for r in stage]
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """p50/p95/p99 wall and CPU time per stage over the recent records."""
+        return summarize_records(self.records())
+
+
+tracer = Tracer(log_path=Config.TRACE_LOG_PATH if Config.TRACE_LOG_ENABLED else None)
+
+
+@contextmanager
+def trace_stage(
+    stage: str, state: Optional[dict] = None, **sizes: int
+) -> Iterator[Span]:
+    """
+    Times the enclosed block as one pipeline stage. Passing the graph `state` makes
+    it the active request: this stage and every stage nested in it (e.g. in the
+    retriever or the LLM callbacks) are appended to `state["trace"]`.
+    """
+    parent = _current_span.get()
+    span = Span(stage, parent)
+    span.set(**sizes)
+
+    records_token = None
+    if state is not None:
+        records_token = _current_records.set(state.setdefault("trace", []))
+    span_token = _current_span.set(span)
+    started_at = time.time()
+    wall_start = time.perf_counter()
+    cpu_start = time.thread_time()
+    try:
+        yield span
+    finally:
+        record = StageRecord(
+            stage=stage,
+            wall_seconds=time.perf_counter() - wall_start,
+            cpu_seconds=time.thread_time() - cpu_start,
+            started_at=started_at,
+            parent=parent.stage if parent else None,
+            sizes=dict(span.sizes),
+        )
+        request_records = _current_records.get()
+        _current_span.reset(span_token)
+        if records_token is not None:
+            _current_records.reset(records_token)
+        if request_records is not None:
+            request_records.append(asdict(record))
+        tracer.record(record)
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def traced_node(stage: str):
+    """Decorator tracing a (sync or async) graph node as one stage of its request."""
+
+    def decorator(node):
+        if inspect.iscoroutinefunction(node):
+
+            @functools.wraps(node)
+            async def async_wrapper(state, *args, **kwargs):
+                with trace_stage(stage, state):
+                    return await node(state, *args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(node)
+        def wrapper(state, *args, **kwargs):
+            with trace_stage(stage, state):
+                return node(state, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+class TokenUsageCallback(BaseCallbackHandler):
+    """
+    Adds the prompt/completion token counts reported by the LLM to the stage that
+    made the call. Counts are estimated (~4 characters per token) when the
+    provider does not report usage, e.g. on some streaming responses.
+    """
+
+    def __init__(self):
+        self._prompt_chars: Dict[Any, int] = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs) -> None:
+        self._prompt_chars[run_id] = sum(
+            len(str(m.content)) for batch in messages for m in batch
+        )
+
+    def on_llm_end(self, response, *, run_id, **kwargs) -> None:
+        prompt_chars = self._prompt_chars.pop(run_id, 0)
+        span = current_span()
+        if span is None:
+            return
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, "message", None)
+                usage = getattr(message, "usage_metadata", None)
+                if usage:
+                    span.add(
+                        prompt_tokens=usage["input_tokens"],
+                        completion_tokens=usage["output_tokens"],
+                    )
+                else:
+                    span.add(
+                        prompt_tokens=prompt_chars // 4,
+                        completion_tokens=len(generation.text) // 4,
+                    )
+
+    def on_llm_error(self, error, *, run_id, **kwargs) -> None:
+        self._prompt_chars.pop(run_id, None)
+
+
+def start_metrics_server(port: Optional[int] = None) -> None:
+    """Serves the tracer's histograms for Prometheus at http://0.0.0.0:<port>/metrics."""
+    from prometheus_client import start_http_server
+
+    start_http_server(port or Config.METRICS_PORT, registry=tracer.metrics)
+
+
+# --- Summaries ---
+
+
+def _percentiles(values: List[float]) -> Dict[str, float]:
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {"p50": float(p50), "p95": float(p95), "p99": float(p99)}
+
+
+def summarize_records(records) -> Dict[str, Dict[str, float]]:
+    """p50/p95/p99 wall and CPU time per stage for `StageRecord`s or their dicts."""
+    wall, cpu = defaultdict(list), defaultdict(list)
+    for record in records:
+        if isinstance(record, StageRecord):
+            record = asdict(record)
+        wall[record["stage"]].append(record["wall_seconds"])
+        cpu[record["stage"]].append(record["cpu_seconds"])
+
+    summary = {}
+    for stage in sorted(wall):
+        summary[stage] = {"count": len(wall[stage])}
+        summary[stage].update(
+            {f"wall_{k}": v for k, v in _percentiles(wall[stage]).items()}
+        )
+        summary[stage].update(
+            {f"cpu_{k}": v for k, v in _percentiles(cpu[stage]).items()}
+        )
+    return summary
+
+
+def load_trace_log(path: str) -> List[Dict[str, Any]]:
+    records = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                records.append(json.loads(line))
+    return records
+
+
+def print_summary(summary: Dict[str, Dict[str, float]]) -> None:
+    print(
+        f"{'stage':<28} {'count':>6} {'wall p50':>9} {'p95':>9} {'p99':>9} "
+        f"{'cpu p50':>9} {'p95':>9} {'p99':>9}"
+    )
+    for stage, stats in summary.items():
+        print(
+            f"{stage:<28} {stats['count']:>6} "
+            f"{stats['wall_p50']:>9.3f} {stats['wall_p95']:>9.3f} "
+            f"{stats['wall_p99']:>9.3f} {stats['cpu_p50']:>9.3f} "
+            f"{stats['cpu_p95']:>9.3f} {stats['cpu_p99']:>9.3f}"
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Summarize a stage trace log as p50/p95/p99 latencies."
+    )
+    parser.add_argument("log", nargs="?", default=Config.TRACE_LOG_PATH)
+    parser.add_argument("--json", action="store_true", help="Print JSON instead.")
+    args = parser.parse_args(argv)
+
+    summary = summarize_records(load_trace_log(args.log))
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        print_summary(summary)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,296 @@
+import argparse
+import json
+import math
+import os
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.config import Config
+
+ANN_INDEX_MODES = ("none", "ivf")
+IVF_FILE = "ivf.npz"
+
+
+def nlist_for(num_rows: int) -> int:
+    """Number of inverted lists for `num_rows` vectors (`IVF_NLIST`, or sqrt(n))."""
+    nlist = Config.IVF_NLIST or int(math.sqrt(num_rows))
+    return max(1, min(nlist, num_rows))
+
+
+def assign_lists(
+    vectors: np.ndarray, centroids: np.ndarray, block_rows: Optional[int] = None
+) -> np.ndarray:
+    """Index of the closest (highest cosine) centroid for every row, in row blocks."""
+    block_rows = block_rows or Config.LOCAL_SEARCH_BLOCK_ROWS
+    labels = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), block_rows):
+        block = np.asarray(vectors[start : start + block_rows], dtype=np.float32)
+        labels[start : start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return labels
+
+
+def spherical_kmeans(
+    vectors: np.ndarray,
+    nlist: int,
+    iterations: Optional[int] = None,
+    seed: int = 0,
+) -> np.ndarray:
+    """
+    Trains `nlist` unit-norm centroids on normalized vectors with spherical k-means
+    (assign by cosine, re-normalize the cluster means). At most
+    `IVF_TRAIN_POINTS_PER_LIST` rows per list are sampled for training; empty
+    clusters are re-seeded with random training rows.
+    """
+    iterations = iterations or Config.IVF_TRAIN_ITERATIONS
+    rng = np.random.RandomState(seed)
+    sample_size = min(len(vectors), nlist * Config.IVF_TRAIN_POINTS_PER_LIST)
+    sample = np.sort(rng.choice(len(vectors), sample_size, replace=False))
+    train = np.asarray(vectors[sample], dtype=np.float32)
+    centroids = train[rng.choice(len(train), nlist, replace=False)].copy()
+
+    for _ in range(iterations):
+        labels = assign_lists(train, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, train)
+        counts = np.bincount(labels, minlength=nlist)
+        empty = np.flatnonzero(counts == 0)
+        sums[empty] = train[rng.choice(len(train), len(empty), replace=False)]
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        updated = sums / norms
+        if np.allclose(updated, centroids, atol=1e-6):
+            break
+        centroids = updated
+    return centroids.astype(np.float32)
+
+
+class IVFIndex:
+    """
+    Inverted-file index over the rows of a normalized embedding matrix. Every row
+    belongs to the list of its closest centroid; lists are stored back to back in
+    `rows`, with list `i` at `rows[offsets[i]:offsets[i + 1]]`. A search scores
+    only the rows of the `nprobe` lists whose centroids are closest to the query,
+    so its cost grows with `nprobe / nlist` of the corpus instead of all of it.
+    """
+
+    def __init__(self, centroids: np.ndarray, offsets: np.ndarray, rows: np.ndarray):
+        self.centroids = np.asarray(centroids, dtype=np.float32)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.rows = np.asarray(rows, dtype=np.int64)
+
+    @property
+    def nlist(self) -> int:
+        return len(self.centroids)
+
+    @property
+    def num_rows(self) -> int:
+        return len(self.rows)
+
+    @classmethod
+    def build(
+        cls,
+        vectors: np.ndarray,
+        nlist: Optional[int] = None,
+        centroids: Optional[np.ndarray] = None,
+    ) -> "IVFIndex":
+        """
+        Assigns every row to its list. Given `centroids` (e.g. from the previous
+        build), only the assignment runs; otherwise the centroids are trained first.
+        """
+        if centroids is None:
+            centroids = spherical_kmeans(vectors, nlist or nlist_for(len(vectors)))
+        labels = assign_lists(vectors, centroids)
+        rows = np.argsort(labels, kind="stable")
+        counts = np.bincount(labels, minlength=len(centroids))
+        offsets = np.concatenate([[0], np.cumsum(counts)])
+        return cls(centroids, offsets, rows)
+
+    def reusable_centroids(self, num_rows: int, dim: int) -> Optional[np.ndarray]:
+        """This index's centroids if they still suit `num_rows` rows of `dim`."""
+        target = nlist_for(num_rows)
+        if self.centroids.shape[1] != dim or not target / 2 <= self.nlist <= target * 2:
+            return None
+        return self.centroids
+
+    def search(
+        self,
+        queries: np.ndarray,
+        vectors: np.ndarray,
+        k: int,
+        nprobe: Optional[int] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top-k (indices, scores) of normalized queries, scanning the `nprobe` closest
+        lists (default `IVF_NPROBE`). When those lists hold fewer than `k` rows, the
+        next closest lists are probed too, so every query gets min(k, num_rows) hits.
+        """
+        nprobe = min(nprobe or Config.IVF_NPROBE, self.nlist)
+        k = min(k, self.num_rows)
+        best_idx = np.empty((len(queries), k), dtype=np.int64)
+        best_scores = np.empty((len(queries), k), dtype=np.float32)
+        if k == 0:
+            return best_idx, best_scores
+
+        sizes = np.diff(self.offsets)
+        list_order = np.argsort(-(queries @ self.centroids.T), axis=1)
+        for i, (query, lists) in enumerate(zip(queries, list_order)):
+            probe, covered = nprobe, sizes[lists[:nprobe]].sum()
+            while covered < k:
+                covered += sizes[lists[probe]]
+                probe += 1
+            candidates = np.sort(
+                np.concatenate(
+                    [
+                        self.rows[self.offsets[l] : self.offsets[l + 1]]
+                        for l in lists[:probe]
+                    ]
+                )
+            )
+            scores = np.asarray(vectors[candidates]) @ query
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top], kind="stable")]
+            best_idx[i], best_scores[i] = candidates[top], scores[top]
+        return best_idx, best_scores
+
+    # --- Persistence ---
+
+    @classmethod
+    def load(cls, path: str) -> Optional["IVFIndex"]:
+        filename = os.path.join(path, IVF_FILE)
+        if not os.path.exists(filename):
+            return None
+        with np.load(filename) as data:
+            return cls(data["centroids"], data["offsets"], data["rows"])
+
+    def save(self, path: str) -> None:
+        """Writes the index next to the vectors it covers (temporary file + rename)."""
+        filename = os.path.join(path, IVF_FILE)
+        with open(filename + ".tmp", "wb") as f:
+            np.savez(f, centroids=self.centroids, offsets=self.offsets, rows=self.rows)
+        os.replace(filename + ".tmp", filename)
+
+
+# --- Recall vs. latency report ---
+
+
+def ann_report(
+    vector_store,
+    query_vectors: np.ndarray,
+    k: Optional[int] = None,
+    nprobes: Sequence[int] = (1, 2, 4, 8, 16, 32),
+    nlist: Optional[int] = None,
+) -> List[Dict[str, float]]:
+    """
+    Compares IVF searches at each `nprobe` with the exact search on
+    `query_vectors`: recall@k, search latency and the share of rows scanned. Uses
+    the store's saved IVF index unless `nlist` asks for a fresh one.
+    """
+    from src.vector_store.local_store import normalize_rows, top_k_cosine
+    from src.vector_store.quantization import recall_at_k
+
+    k = k or Config.RETRIEVAL_K
+    vectors = np.asarray(vector_store.vectors)
+    queries = normalize_rows(query_vectors)
+    per_query = 1000 / max(len(queries), 1)
+
+    start = time.perf_counter()
+    exact, _ = top_k_cosine(queries, vectors, k, Config.LOCAL_SEARCH_BLOCK_ROWS)
+    rows = [
+        {
+            "nprobe": "exact",
+            "nlist": 1,
+            "scanned": 1.0,
+            "recall": 1.0,
+            "search_ms": (time.perf_counter() - start) * per_query,
+        }
+    ]
+
+    index = None if nlist else vector_store.ann_index
+    if index is None:
+        start = time.perf_counter()
+        index = IVFIndex.build(vectors, nlist)
+        print(
+            f"Built IVF index ({index.nlist} lists) in {time.perf_counter() - start:.2f}s."
+        )
+    sizes = np.diff(index.offsets)
+    centroid_order = np.argsort(-(queries @ index.centroids.T), axis=1)
+    for nprobe in nprobes:
+        if nprobe > index.nlist:
+            continue
+        start = time.perf_counter()
+        found, _ = index.search(queries, vectors, k, nprobe)
+        elapsed = time.perf_counter() - start
+        scanned = sizes[centroid_order[:, :nprobe]].sum(axis=1).mean() / len(vectors)
+        rows.append(
+            {
+                "nprobe": nprobe,
+                "nlist": index.nlist,
+                "scanned": float(scanned),
+                "recall": recall_at_k(exact, found),
+                "search_ms": elapsed * per_query,
+            }
+        )
+    return rows
+
+
+def print_report(rows: List[Dict[str, float]], k: int) -> None:
+    print(
+        f"{'nprobe':>7} {'nlist':>6} {'scanned':>8} "
+        f"{'recall@' + str(k):>10} {'ms/query':>9}"
+    )
+    for row in rows:
+        print(
+            f"{row['nprobe']:>7} {row['nlist']:>6} {row['scanned']:>8.1%} "
+            f"{row['recall']:>10.3f} {row['search_ms']:>9.2f}"
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Recall vs. latency of the IVF index on the eval questions."
+    )
+    parser.add_argument("--index", default=Config.LOCAL_INDEX_DIRECTORY)
+    parser.add_argument("--data", default=Config.EVAL_DATA_PATH)
+    parser.add_argument("--questions", type=int, default=None)
+    parser.add_argument("--k", type=int, default=Config.RETRIEVAL_K)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument(
+        "--nlist",
+        type=int,
+        default=None,
+        help="Train a fresh index with this many lists instead of the saved one.",
+    )
+    parser.add_argument(
+        "--stub-models",
+        action="store_true",
+        help="Embed with the benchmark's hashing embeddings (for a benchmark index).",
+    )
+    parser.add_argument("--json", action="store_true", help="Print JSON instead.")
+    args = parser.parse_args(argv)
+
+    from src.benchmark.suite import load_questions
+    from src.resources import registry
+    from src.vector_store.embedding_cache import embed_queries
+    from src.vector_store.local_store import LocalVectorStore
+
+    if args.stub_models:
+        from src.benchmark.stubs import HashingEmbeddings
+
+        registry.override("embeddings", HashingEmbeddings())
+    embeddings = registry.get("embeddings")
+    vector_store = LocalVectorStore.load(args.index, embeddings)
+    questions = load_questions(args.data, args.questions)
+    query_vectors = np.asarray(embed_queries(embeddings, questions), dtype=np.float32)
+
+    rows = ann_report(vector_store, query_vectors, args.k, args.nprobe, args.nlist)
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        print(f"{len(questions)} questions, {len(vector_store)} vectors")
+        print_report(rows, args.k)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+import json
+import os
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from scipy import sparse
+
+from src.config import Config
+from src.tracing import trace_stage
+
+MATRIX_FILE = "bm25.npz"
+VOCABULARY_FILE = "bm25.json"
+
+# Keeps compound identifiers such as "cve-2014-6271", "ms17-010" or "x86_64" intact.
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[-_.][a-z0-9]+)*")
+_STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from has have how if in into is it its "
+    "not of on or that the their then there these this to was what when where which "
+    "who why will with you your".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercased word tokens without stopwords. Compound identifiers are kept whole and
+    also split into their parts, so "CVE-2014-6271" matches both exactly and by
+    component.
+    """
+    tokens = []
+    for token in _TOKEN_PATTERN.findall(text.lower()):
+        if token in _STOPWORDS:
+            continue
+        tokens.append(token)
+        if not token.isalnum():
+            tokens.extend(
+                part
+                for part in re.split(r"[-_.]", token)
+                if part and part not in _STOPWORDS
+            )
+    return tokens
+
+
+def reciprocal_rank_fusion(
+    rankings: Sequence[Sequence[str]], k: Optional[int] = None
+) -> List[Tuple[str, float]]:
+    """
+    Fuses ranked id lists with reciprocal rank fusion: each id scores
+    sum(1 / (k + rank)) over the lists it appears in. Returns (id, score) pairs,
+    best first; ties keep the order of first appearance.
+    """
+    k = k or Config.RRF_K
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+class BM25Index:
+    """
+    Okapi BM25 over the chunks of the vector store. The per-term BM25 weight of every
+    (term, chunk) pair is precomputed into a float32 CSR matrix with one row per term,
+    so scoring a query is a sum of a few sparse rows.
+    """
+
+    def __init__(
+        self,
+        vocabulary: Dict[str, int],
+        matrix: sparse.csr_matrix,
+        ids: List[str],
+    ):
+        self.vocabulary = vocabulary
+        self.matrix = matrix
+        self.ids = ids
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def from_texts(
+        cls,
+        ids: Sequence[str],
+        texts: Iterable[str],
+        k1: Optional[float] = None,
+        b: Optional[float] = None,
+    ) -> "BM25Index":
+        k1 = Config.BM25_K1 if k1 is None else k1
+        b = Config.BM25_B if b is None else b
+
+        vocabulary: Dict[str, int] = {}
+        rows, cols, counts, lengths = [], [], [], []
+        for col, text in enumerate(texts):
+            term_counts = Counter(tokenize(text))
+            lengths.append(sum(term_counts.values()))
+            for term, count in term_counts.items():
+                rows.append(vocabulary.setdefault(term, len(vocabulary)))
+                cols.append(col)
+                counts.append(count)
+
+        num_docs = len(lengths)
+        if not num_docs:
+            return cls({}, sparse.csr_matrix((0, 0), dtype=np.float32), [])
+
+        rows = np.asarray(rows, dtype=np.int32)
+        cols = np.asarray(cols, dtype=np.int32)
+        tf = np.asarray(counts, dtype=np.float32)
+        lengths = np.asarray(lengths, dtype=np.float32)
+
+        doc_freq = np.bincount(rows, minlength=len(vocabulary)).astype(np.float32)
+        idf = np.log1p((num_docs - doc_freq + 0.5) / (doc_freq + 0.5))
+        norm = k1 * (1 - b + b * lengths / max(lengths.mean(), 1e-9))
+        weights = idf[rows] * tf * (k1 + 1) / (tf + norm[cols])
+
+        matrix = sparse.csr_matrix(
+            (weights.astype(np.float32), (rows, cols)),
+            shape=(len(vocabulary), num_docs),
+        )
+        return cls(vocabulary, matrix, list(ids))
+
+    def scores(self, query: str) -> np.ndarray:
+        """BM25 score of every chunk for `query` (repeated query terms count once)."""
+        rows = sorted(
+            {self.vocabulary[t] for t in tokenize(query) if t in self.vocabulary}
+        )
+        if not rows:
+            return np.zeros(len(self.ids), dtype=np.float32)
+        return np.asarray(self.matrix[rows].sum(axis=0)).ravel()
+
+    def search(self, query: str, k: Optional[int] = None) -> List[Tuple[str, float]]:
+        """Top `k` chunk ids with a positive BM25 score, best first."""
+        k = k or Config.BM25_K
+        scores = self.scores(query)
+        if not scores.size:
+            return []
+        k = min(k, scores.size)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(self.ids[i], float(scores[i])) for i in top if scores[i] > 0]
+
+    # --- Persistence ---
+
+    def save(self, directory: Optional[str] = None) -> None:
+        directory = directory or Config.BM25_INDEX_DIRECTORY
+        os.makedirs(directory, exist_ok=True)
+        matrix_path = os.path.join(directory, MATRIX_FILE)
+        vocabulary_path = os.path.join(directory, VOCABULARY_FILE)
+        # Write both files before swapping either in, so readers never mix builds.
+        sparse.save_npz(matrix_path + ".tmp.npz", self.matrix)
+        terms = sorted(self.vocabulary, key=self.vocabulary.get)
+        with open(vocabulary_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"terms": terms, "ids": self.ids}, f)
+        os.replace(matrix_path + ".tmp.npz", matrix_path)
+        os.replace(vocabulary_path + ".tmp", vocabulary_path)
+
+    @classmethod
+    def load(cls, directory: Optional[str] = None) -> Optional["BM25Index"]:
+        """Loads a saved index, or returns None when none has been built yet."""
+        directory = directory or Config.BM25_INDEX_DIRECTORY
+        matrix_path = os.path.join(directory, MATRIX_FILE)
+        vocabulary_path = os.path.join(directory, VOCABULARY_FILE)
+        if not (os.path.exists(matrix_path) and os.path.exists(vocabulary_path)):
+            return None
+        with open(vocabulary_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        vocabulary = {term: row for row, term in enumerate(data["terms"])}
+        return cls(vocabulary, sparse.load_npz(matrix_path).tocsr(), data["ids"])
+
+
+def fetch_documents(vector_store, ids: Sequence[str]) -> Dict[str, Document]:
+    """Fetches chunks by id from the vector store, keyed by id."""
+    if not ids:
+        return {}
+    return {doc.id: doc for doc in vector_store.get_by_ids(list(ids))}
+
+
+def fuse_results(
+    query: str,
+    dense_docs: List[Document],
+    bm25_index: BM25Index,
+    vector_store,
+    top_k: Optional[int] = None,
+    bm25_k: Optional[int] = None,
+) -> List[Document]:
+    """
+    Fuses dense hits with the BM25 hits for `query` by reciprocal rank fusion and
+    returns the top `top_k` documents; BM25-only hits are fetched from the store.
+    """
+    top_k = top_k or Config.HYBRID_FUSED_K
+    with trace_stage("bm25_search") as span:
+        sparse_hits = bm25_index.search(query, bm25_k)
+        span.set(docs=len(sparse_hits))
+
+    with trace_stage("fusion", dense=len(dense_docs)) as span:
+        by_id = {doc.id: doc for doc in dense_docs}
+        fused = reciprocal_rank_fusion(
+            [[doc.id for doc in dense_docs], [doc_id for doc_id, _ in sparse_hits]]
+        )[:top_k]
+        missing = [doc_id for doc_id, _ in fused if doc_id not in by_id]
+        by_id.update(fetch_documents(vector_store, missing))
+        docs = [by_id[doc_id] for doc_id, _ in fused if doc_id in by_id]
+        span.set(fetched=len(missing), docs=len(docs))
+    return docs
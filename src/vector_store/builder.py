@@ -1,38 +1,157 @@
-from pymongo import MongoClient
-from langchain_mongodb import MongoDBAtlasVectorSearch
-from langchain_huggingface.embeddings import HuggingFaceEmbeddings
+import os
+import queue
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+from langchain_core.documents import Document
+from tqdm import tqdm
 from src.config import Config
-from src.data_processing.loader import load_and_chunk_docs
+from src.data_processing.dedup import (
+    ChunkDeduplicator,
+    DedupStats,
+    duplicate_sources,
+    seed_deduplicator,
+)
+from src.data_processing.loader import (
+    SourceRef,
+    discover_sources,
+    iter_source_chunks,
+)
+from src.inference import load_embeddings
+from src.resources import registry
+from src.tracing import print_summary, trace_stage, tracer
+from src.vector_store.ingest import (
+    EmbeddingIngestStage,
+    IngestStats,
+    LocalStoreSink,
+    MongoBulkSink,
+)
+from src.vector_store.bm25 import BM25Index
+from src.vector_store.local_store import HEADER_FILE, LocalVectorStore
+from src.vector_store.manifest import BuildManifest, SourceEntry, assign_chunk_ids
 
 
 def get_embeddings_model():
-    """Initializes and returns the embeddings model."""
-    print(f"Initializing embedding model: {Config.EMBEDDING_MODEL}")
-    # Using 'cpu' for broader compatibility. Change to 'cuda' if a GPU is available.
-    return HuggingFaceEmbeddings(
-        model_name=Config.EMBEDDING_MODEL,
-        model_kwargs={"device": "cpu"},
-    )
+    """Initializes and returns the embeddings model on `Config.INFERENCE_BACKEND`."""
+    return load_embeddings()
+
+
+def _reset_query_resources():
+    """Drops cached retrievers and answers so the next query sees the new index."""
+    registry.reset("vector_store")
+    registry.reset("bm25_index")
+    registry.reset("reranking_retriever")
+    if registry.is_loaded("semantic_cache"):
+        registry.get("semantic_cache").invalidate()
 
 
-def build_vector_store():
+class BatchWriter(threading.Thread):
     """
-    Builds and populates the MongoDB Atlas vector store.
-    This function will clear the existing collection and create a new vector search index
-    if it doesn't already exist.
+    Background thread that feeds chunks to the embedding/insert stage while the main
+    thread keeps parsing. Chunks are grouped into batches of `Config.INGEST_BATCH_SIZE`; at most
+    `Config.INGEST_QUEUE_BATCHES` batches wait in the queue, so a slow embedding stage
+    applies backpressure to parsing instead of buffering the whole corpus.
     """
-    if not Config.MONGO_URI:
-        print("ERROR: MONGO_URI is not set in the .env file. Aborting.")
-        return
 
-    print("--- Starting MongoDB Atlas Vector Store Build Process ---")
+    def __init__(self, stage: EmbeddingIngestStage, batch_size: Optional[int] = None):
+        super().__init__(name="vector-store-writer", daemon=True)
+        self.stage = stage
+        self.batch_size = batch_size or Config.INGEST_BATCH_SIZE
+        self._queue = queue.Queue(maxsize=Config.INGEST_QUEUE_BATCHES)
+        self._docs, self._ids = [], []
+        self._error: Optional[BaseException] = None
+        self.written = 0
+
+    def add(self, doc: Document, doc_id: str) -> None:
+        if self._error is not None:
+            raise RuntimeError("Vector store writer failed.") from self._error
+        self._docs.append(doc)
+        self._ids.append(doc_id)
+        if len(self._docs) >= self.batch_size:
+            self._flush()
+
+    def _flush(self) -> None:
+        if self._docs:
+            self._queue.put((self._docs, self._ids))
+            self._docs, self._ids = [], []
+
+    def run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            if self._error is not None:
+                continue  # Drain the queue so the producer never blocks forever.
+            docs, ids = item
+            try:
+                self.stage.process(docs, ids)
+                self.written += len(docs)
+            except BaseException as e:
+                self._error = e
+
+    def close(self) -> None:
+        """Flushes the last partial batch and waits for every write to finish."""
+        self._flush()
+        self._queue.put(None)
+        self.join()
+        if self._error is not None:
+            raise RuntimeError("Vector store writer failed.") from self._error
+
+
+@dataclass
+class BuildReport:
+    """Summary of what a (full or incremental) build changed."""
+
+    sources_skipped: List[str] = field(default_factory=list)
+    sources_added: List[str] = field(default_factory=list)
+    sources_updated: List[str] = field(default_factory=list)
+    sources_removed: List[str] = field(default_factory=list)
+    sources_failed: List[str] = field(default_factory=list)
+    sources_duplicate: List[str] = field(default_factory=list)
+    chunks_added: int = 0
+    chunks_unchanged: int = 0
+    chunks_removed: int = 0
+    chunks_deduplicated: int = 0
+    ingest: IngestStats = field(default_factory=IngestStats)
+    dedup: Optional[DedupStats] = None
+
+    def print_summary(self):
+        print("\n--- Build Summary ---")
+        print(f"Sources skipped (unchanged): {len(self.sources_skipped)}")
+        for label, sources in [
+            ("added", self.sources_added),
+            ("updated", self.sources_updated),
+            ("removed", self.sources_removed),
+            ("failed", self.sources_failed),
+            ("identical to another source (not ingested)", self.sources_duplicate),
+        ]:
+            print(f"Sources {label}: {len(sources)}")
+            for source_id in sources:
+                print(f"  - {source_id}")
+        print(f"Chunks added: {self.chunks_added}")
+        print(f"Chunks unchanged: {self.chunks_unchanged}")
+        print(f"Chunks removed: {self.chunks_removed}")
+        if self.dedup is not None and self.dedup.chunks_seen:
+            print(
+                f"Chunks deduplicated: {self.dedup.chunks_dropped} of "
+                f"{self.dedup.chunks_seen} checked ({self.dedup.exact_duplicates} "
+                f"exact, {self.dedup.near_duplicates} near), shrinking them by "
+                f"{self.dedup.shrink_ratio:.1%} ("
+                f"{self.dedup.chars_dropped / self.dedup.chars_seen:.1%} of the text)."
+            )
+        throughput = self.ingest.summary()
+        print(
+            f"Embedded {throughput['chunks']} chunks in {throughput['batches']} "
+            f"batches: {throughput['chunks_per_second']:.1f} chunks/s, "
+            f"{throughput['tokens_per_second']:.0f} tokens/s "
+            f"(embed {throughput['embed_seconds']:.1f}s, "
+            f"write {throughput['write_seconds']:.1f}s, "
+            f"{throughput['resumed_chunks']} chunks already committed)."
+        )
 
-    # Initialize MongoDB client and collection
-    client = MongoClient(Config.MONGO_URI)
-    db = client[Config.DB_NAME]
-    collection = db[Config.COLLECTION_NAME]
 
-    # Create the Vector Search Index if it doesn't exist
+def ensure_search_index(collection, embeddings) -> bool:
+    """Creates the Atlas Vector Search index if it doesn't exist yet."""
     index_name = Config.VECTOR_SEARCH_INDEX_NAME
     try:
         if not any(
@@ -41,7 +160,6 @@ def build_vector_store():
             print(f"Vector search index '{index_name}' not found. Creating it now...")
 
             # Get the embedding dimension from the model
-            embeddings = get_embeddings_model()
             embedding_dimension = len(embeddings.embed_query("test"))
 
             index_definition = {
@@ -70,33 +188,413 @@ def build_vector_store():
     except Exception as e:
         print(f"An error occurred while checking or creating the search index: {e}")
         print("Please ensure you have the necessary permissions in MongoDB Atlas.")
-        return
+        return False
+    return True
 
-    # Clear existing documents from the collection
-    print(
-        f"Clearing all existing documents from the '{Config.COLLECTION_NAME}' collection..."
+
+def update_chunk_metadata(vector_store, updates: Dict[str, Dict[str, Any]]) -> int:
+    """
+    Merges metadata fields into stored chunks without re-embedding them (chunk id ->
+    fields; a field set to None is removed), in the local store or in the MongoDB
+    collection behind `MongoDBAtlasVectorSearch`. Returns the number of updates.
+    """
+    if not updates:
+        return 0
+    if hasattr(vector_store, "update_metadata"):
+        return vector_store.update_metadata(updates)
+
+    from pymongo import UpdateOne
+    from langchain_mongodb.utils import str_to_oid
+
+    operations = []
+    for chunk_id, fields in updates.items():
+        change = {}
+        set_fields = {k: v for k, v in fields.items() if v is not None}
+        unset_fields = {k: "" for k, v in fields.items() if v is None}
+        if set_fields:
+            change["$set"] = set_fields
+        if unset_fields:
+            change["$unset"] = unset_fields
+        if change:
+            operations.append(UpdateOne({"_id": str_to_oid(chunk_id)}, change))
+    if operations:
+        vector_store._collection.bulk_write(operations, ordered=False)
+    return len(operations)
+
+
+def stored_metadata_values(vector_store, key: str) -> Dict[str, Any]:
+    """The value of metadata field `key` of every stored chunk that has it."""
+    if hasattr(vector_store, "metadata_values"):
+        return vector_store.metadata_values(key)
+
+    from langchain_mongodb.utils import oid_to_str
+
+    return {
+        oid_to_str(record["_id"]): record[key]
+        for record in vector_store._collection.find({key: {"$exists": True}}, {key: 1})
+    }
+
+
+def delete_unlisted_chunks(vector_store, manifest: BuildManifest) -> int:
+    """
+    Deletes the chunks in the MongoDB collection behind `vector_store` that no
+    source in `manifest` lists. Returns the number deleted.
+    """
+    from langchain_mongodb.utils import oid_to_str
+
+    listed = {
+        chunk_id for entry in manifest.sources.values() for chunk_id in entry.chunk_ids
+    }
+    unlisted = [
+        chunk_id
+        for chunk_id in (
+            oid_to_str(record["_id"])
+            for record in vector_store._collection.find({}, {"_id": 1})
+        )
+        if chunk_id not in listed
+    ]
+    if unlisted:
+        vector_store.delete(ids=unlisted)
+    return len(unlisted)
+
+
+def sync_duplicate_citations(vector_store, manifest: BuildManifest) -> int:
+    """
+    Stores `manifest.duplicate_citations()` as the `also_in` metadata of the kept
+    chunks, so a retrieved chunk also cites the sources and pages of the duplicates
+    dropped in its place. Only chunks whose citations changed are written.
+    """
+    citations = manifest.duplicate_citations()
+    current = stored_metadata_values(vector_store, "also_in")
+    updates = {
+        chunk_id: {"also_in": also_in}
+        for chunk_id, also_in in citations.items()
+        if current.get(chunk_id) != also_in
+    }
+    updates.update(
+        {
+            chunk_id: {"also_in": None}
+            for chunk_id in current
+            if chunk_id not in citations
+        }
     )
-    collection.delete_many({})
-    print("Collection cleared.")
-
-    # Load and chunk documents
-    documents = load_and_chunk_docs()
-    if not documents:
-        print("No documents to process. Vector store build complete.")
-        return
-
-    # Get embeddings model (if not already loaded)
-    if "embeddings" not in locals():
-        embeddings = get_embeddings_model()
-
-    # Populate the vector store
-    print(f"Populating vector store with {len(documents)} document chunks...")
-    MongoDBAtlasVectorSearch.from_documents(
-        documents=documents,
-        embedding=embeddings,
-        collection=collection,
-        index_name=index_name,
+    return update_chunk_metadata(vector_store, updates)
+
+
+def sync_sources(
+    vector_store,
+    manifest: BuildManifest,
+    stage: EmbeddingIngestStage,
+    sources: Optional[List[SourceRef]] = None,
+    deduplicate: Optional[bool] = None,
+) -> BuildReport:
+    """
+    Brings the vector store in line with `sources` (default: every configured source).
+    Sources whose content hash matches the manifest are skipped; new or changed
+    sources are parsed, chunked and only their new chunks are embedded and upserted by
+    stable chunk id (chunks already stored only get their metadata rewritten); chunks
+    that no longer exist (changed or removed sources) are deleted. The manifest is updated in place.
+
+    With `deduplicate` (default `Config.DEDUP_ENABLED`), a file identical to another
+    source is recorded as its duplicate without being parsed, and chunks that
+    repeat a chunk already kept (exactly or nearly, see `ChunkDeduplicator`) are not
+    embedded; the manifest maps each dropped chunk to the chunk kept instead.
+    Skipped sources whose dropped chunks pointed at chunks deleted by this build are
+    processed again so their text is not lost. Kept chunks cite the sources of their
+    dropped duplicates in their `also_in` metadata (see `sync_duplicate_citations`).
+    """
+    deduplicate = Config.DEDUP_ENABLED if deduplicate is None else deduplicate
+    report = BuildReport(ingest=stage.stats)
+    sources = discover_sources() if sources is None else sources
+    current_ids = {source.source_id for source in sources}
+    duplicate_of = duplicate_sources(sources) if deduplicate else {}
+
+    stale_chunk_ids = []
+    for source_id in list(manifest.sources):
+        if source_id not in current_ids:
+            stale_chunk_ids.extend(manifest.sources.pop(source_id).chunk_ids)
+            report.sources_removed.append(source_id)
+
+    pending = []
+    for source in sources:
+        entry = manifest.sources.get(source.source_id)
+        if (
+            entry is not None
+            and entry.content_hash == source.content_hash
+            and entry.duplicate_of == duplicate_of.get(source.source_id)
+            and (deduplicate or not entry.duplicates)
+        ):
+            report.sources_skipped.append(source.source_id)
+        elif source.source_id in duplicate_of:
+            if entry is not None:
+                stale_chunk_ids.extend(entry.chunk_ids)
+            manifest.sources[source.source_id] = SourceEntry(
+                source.content_hash, duplicate_of=duplicate_of[source.source_id]
+            )
+            report.sources_duplicate.append(source.source_id)
+        else:
+            pending.append(source)
+
+    print(
+        f"{len(report.sources_skipped)} sources unchanged, {len(pending)} new or "
+        f"changed, {len(report.sources_removed)} removed, "
+        f"{len(report.sources_duplicate)} identical to another source."
     )
 
+    deduplicator = None
+    if deduplicate:
+        deduplicator = ChunkDeduplicator()
+        report.dedup = deduplicator.stats
+        kept = [
+            (chunk_id, chunk_hash)
+            for source_id in report.sources_skipped
+            for chunk_id, chunk_hash in zip(
+                manifest.sources[source_id].chunk_ids,
+                manifest.sources[source_id].chunk_hashes,
+            )
+        ]
+        with trace_stage("build.dedup_seed", chunks=len(kept)):
+            seed_deduplicator(
+                deduplicator,
+                vector_store,
+                [chunk_id for chunk_id, _ in kept],
+                [chunk_hash for _, chunk_hash in kept],
+            )
+
+    writer = BatchWriter(stage)
+    # Chunks of changed sources whose text is already stored keep their vector, but
+    # take the new metadata (their page may have moved).
+    retained_metadata: Dict[str, Dict[str, Any]] = {}
+
+    def apply_source(source: SourceRef, chunks: List[Document], repair: bool) -> None:
+        chunk_ids, chunk_hashes = assign_chunk_ids(source.source_id, chunks)
+        previous = manifest.sources.get(source.source_id)
+        previous_ids = set(previous.chunk_ids) if previous else set()
+
+        kept_ids, kept_hashes, dropped = [], [], {}
+        new_count = 0
+        for chunk_id, chunk_hash, chunk in zip(chunk_ids, chunk_hashes, chunks):
+            # When repairing, chunks already stored stay; only dropped ones are
+            # checked again.
+            if deduplicator is not None and not (repair and chunk_id in previous_ids):
+                representative = deduplicator.check(
+                    chunk_id, chunk.page_content, chunk_hash
+                )
+                if representative is not None:
+                    dropped[chunk_id] = {
+                        "kept": representative,
+                        "page": chunk.metadata.get("page"),
+                    }
+                    continue
+            kept_ids.append(chunk_id)
+            kept_hashes.append(chunk_hash)
+            if chunk_id not in previous_ids:
+                writer.add(chunk, chunk_id)
+                new_count += 1
+            elif not repair:
+                retained_metadata[chunk_id] = chunk.metadata
+
+        stale_chunk_ids.extend(previous_ids - set(kept_ids))
+        report.chunks_added += new_count
+        report.chunks_unchanged += len(kept_ids) - new_count
+        report.chunks_deduplicated += len(dropped)
+        manifest.sources[source.source_id] = SourceEntry(
+            source.content_hash, kept_ids, kept_hashes, duplicates=dropped
+        )
+
+    def process(sources_to_load: List[SourceRef], desc: str, repair: bool) -> None:
+        for source, chunks, error in tqdm(
+            iter_source_chunks(sources_to_load),
+            total=len(sources_to_load),
+            desc=desc,
+        ):
+            if error is not None:
+                print(f"Could not load source '{source.source_id}': {error}")
+                report.sources_failed.append(source.source_id)
+                continue
+            updated = repair or source.source_id in manifest.sources
+            apply_source(source, chunks, repair)
+            (report.sources_updated if updated else report.sources_added).append(
+                source.source_id
+            )
+
+    writer.start()
+    try:
+        process(pending, "Processing new and changed sources", repair=False)
+        if deduplicator is not None:
+            stale = set(stale_chunk_ids)
+            deduplicator.remove(stale)
+            orphaned = [
+                source
+                for source in sources
+                if source.source_id in report.sources_skipped
+                and any(
+                    duplicate["kept"] in stale
+                    for duplicate in manifest.sources[
+                        source.source_id
+                    ].duplicates.values()
+                )
+            ]
+            if orphaned:
+                for source in orphaned:
+                    report.sources_skipped.remove(source.source_id)
+                process(orphaned, "Restoring chunks of deleted duplicates", True)
+    finally:
+        writer.close()
+
+    if retained_metadata:
+        with trace_stage("build.retained_metadata") as span:
+            span.set(chunks=update_chunk_metadata(vector_store, retained_metadata))
+    if stale_chunk_ids:
+        with trace_stage("build.delete_stale", chunks=len(stale_chunk_ids)):
+            vector_store.delete(ids=list(stale_chunk_ids))
+    report.chunks_removed = len(stale_chunk_ids)
+    with trace_stage("build.citations") as span:
+        span.set(chunks=sync_duplicate_citations(vector_store, manifest))
+    return report
+
+
+def build_bm25_index(vector_store, collection=None) -> BM25Index:
+    """
+    Builds the BM25 index over every chunk in the store and saves it to
+    `Config.BM25_INDEX_DIRECTORY`. Pass the MongoDB `collection` to read chunks from
+    Atlas; otherwise the local store's texts are used. The index is always a local
+    directory, also for the MongoDB backend. The index is rebuilt from
+    scratch, which is cheap next to embedding, so it always matches the store.
+    """
+    if collection is not None:
+        from langchain_mongodb.utils import oid_to_str
+
+        ids, texts = [], []
+        for record in collection.find({}, {"text": 1}):
+            if "text" in record:
+                ids.append(oid_to_str(record["_id"]))
+                texts.append(record["text"])
+    else:
+        ids, texts = vector_store.ids, vector_store.texts
+
+    with trace_stage("build.bm25", chunks=len(ids)):
+        index = BM25Index.from_texts(ids, texts)
+        index.save()
+    print(f"BM25 index built over {len(index)} chunks ({len(index.vocabulary)} terms).")
+    return index
+
+
+def build_vector_store(incremental: bool = False) -> Optional[BuildReport]:
+    """
+    Builds and populates the vector store selected by `Config.VECTOR_STORE_BACKEND`.
+
+    A full build clears the store and embeds every source (on MongoDB, the stored
+    manifest is emptied first, so an interrupted full build resumes when re-run
+    incrementally). An incremental build diffs
+    source and chunk hashes against the stored manifest and only parses and embeds new
+    or changed sources, removing chunks whose sources disappeared. With
+    `Config.HYBRID_RETRIEVAL_ENABLED`, the BM25 index is rebuilt afterwards.
+    """
+    use_mongo = Config.VECTOR_STORE_BACKEND != "local"
+    if use_mongo and not Config.MONGO_URI:
+        print("ERROR: MONGO_URI is not set in the .env file. Aborting.")
+        return None
+
+    backend_name = "MongoDB Atlas" if use_mongo else "Local"
+    mode = "incremental" if incremental else "full"
+    print(f"--- Starting {backend_name} Vector Store Build Process ({mode}) ---")
+
+    embeddings = registry.get("embeddings")
+    if use_mongo:
+        # Reuse the process-wide MongoDB client
+        db = registry.get("mongo_client")[Config.DB_NAME]
+        collection = db[Config.COLLECTION_NAME]
+        manifest_collection = db[Config.MANIFEST_COLLECTION_NAME]
+        if not ensure_search_index(collection, embeddings):
+            return None
+        from langchain_mongodb import MongoDBAtlasVectorSearch
+
+        vector_store = MongoDBAtlasVectorSearch(
+            collection=collection,
+            embedding=embeddings,
+            index_name=Config.VECTOR_SEARCH_INDEX_NAME,
+        )
+        manifest = BuildManifest.load_mongo(manifest_collection)
+        sink = MongoBulkSink(collection)
+    else:
+        index_header = os.path.join(Config.LOCAL_INDEX_DIRECTORY, HEADER_FILE)
+        if incremental and os.path.exists(index_header):
+            vector_store = LocalVectorStore.load(embedding=embeddings)
+        else:
+            vector_store = LocalVectorStore(embeddings)
+        manifest = BuildManifest.load_local()
+        # Journal committed slices, so an interrupted build resumes incrementally.
+        sink = LocalStoreSink(
+            vector_store, Config.LOCAL_INDEX_DIRECTORY, resume=incremental
+        )
+
+    if not incremental:
+        manifest = BuildManifest()
+        if use_mongo:
+            # Empty the stored manifest before the store: a build interrupted after
+            # the clear then re-runs every source instead of skipping sources whose
+            # chunks are gone.
+            manifest.save_mongo(manifest_collection)
+        # Clear existing documents from the store
+        print(f"Clearing all existing documents from the {backend_name} store...")
+        with trace_stage("build.clear"):
+            vector_store.delete()
+        print("Store cleared.")
+    # Without a manifest, chunks left by an interrupted build are matched by id
+    # only, so the ones no source produces any more are removed afterwards.
+    unlisted_cleanup = use_mongo and not manifest.sources
+
+    stage = EmbeddingIngestStage(embeddings, sink)
+    with trace_stage("build.sync_sources") as span:
+        report = sync_sources(vector_store, manifest, stage)
+        span.set(
+            chunks_added=report.chunks_added,
+            chunks_removed=report.chunks_removed,
+            chunks_deduplicated=report.chunks_deduplicated,
+        )
+
+    if unlisted_cleanup:
+        with trace_stage("build.delete_unlisted") as span:
+            span.set(chunks=delete_unlisted_chunks(vector_store, manifest))
+
+    manifest.mark_built()
+    with trace_stage("build.save"):
+        if use_mongo:
+            manifest.save_mongo(manifest_collection)
+        else:
+            vector_store.save()
+            manifest.save_local()
+            sink.finish()
+    if Config.HYBRID_RETRIEVAL_ENABLED:
+        build_bm25_index(vector_store, collection if use_mongo else None)
+    _reset_query_resources()
+
+    report.print_summary()
+    if hasattr(embeddings, "stats"):
+        print(f"Embedding cache: {embeddings.stats()}")
+    print("\n--- Stage Timings ---")
+    print_summary(tracer.summary())
     print("\n--- Vector Store Build Process Finished Successfully ---")
-    print(f"Collection '{Config.COLLECTION_NAME}' is populated.")
+    return report
+
+
+def export_mongo_to_local(path: str = None) -> LocalVectorStore:
+    """Copies the MongoDB Atlas collection (with its embeddings) into a local index."""
+    client = registry.get("mongo_client")
+    collection = client[Config.DB_NAME][Config.COLLECTION_NAME]
+    vector_store = LocalVectorStore.from_mongo_collection(
+        collection, registry.get("embeddings"), path=path
+    )
+    vector_store.save()
+    return vector_store
+
+
+def import_local_to_mongo(path: str = None) -> int:
+    """Upserts a local index (with its embeddings) into the MongoDB Atlas collection."""
+    client = registry.get("mongo_client")
+    collection = client[Config.DB_NAME][Config.COLLECTION_NAME]
+    vector_store = LocalVectorStore.load(path, registry.get("embeddings"))
+    written = vector_store.to_mongo_collection(collection)
+    _reset_query_resources()
+    return written
@@ -0,0 +1,184 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from src.config import Config
+
+
+def normalize_text(text: str) -> str:
+    """Unicode-normalizes text and collapses whitespace, which the tokenizer ignores."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def cache_key(model_name: str, kind: str, text: str) -> str:
+    """Cache key for one text: (model, query/document, normalized text hash)."""
+    digest = hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+    return f"{model_name}:{kind}:{digest}"
+
+
+def embed_queries(embeddings: Embeddings, texts: List[str]) -> List[List[float]]:
+    """
+    Embeds several queries in one model call when that is equivalent to calling
+    `embed_query` on each (true for HuggingFace embeddings without query-specific
+    encode kwargs); otherwise falls back to one `embed_query` call per text.
+    """
+    if hasattr(embeddings, "embed_queries"):
+        return embeddings.embed_queries(texts)
+    from langchain_huggingface.embeddings import HuggingFaceEmbeddings
+
+    if isinstance(embeddings, HuggingFaceEmbeddings) and not (
+        embeddings.query_encode_kwargs
+    ):
+        return embeddings.embed_documents(texts)
+    return [embeddings.embed_query(text) for text in texts]
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that persists every computed vector in a SQLite database keyed
+    by (embedding model, normalized text hash), so identical chunks and repeated
+    questions are only embedded once across runs.
+
+    The cache holds at most `max_entries` vectors; when it grows past that, the least
+    recently used entries are evicted. Hit/miss counters are kept per process.
+    """
+
+    # SQLite limits the number of bound parameters per statement.
+    _LOOKUP_BATCH = 500
+
+    def __init__(
+        self,
+        underlying: Embeddings,
+        model_name: Optional[str] = None,
+        path: Optional[str] = None,
+        max_entries: Optional[int] = None,
+    ):
+        self.underlying = underlying
+        self.model_name = model_name or Config.EMBEDDING_MODEL
+        self.path = path or Config.EMBEDDING_CACHE_PATH
+        self.max_entries = max_entries or Config.EMBEDDING_CACHE_MAX_ENTRIES
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_last_access ON embeddings (last_access)"
+        )
+        self._conn.commit()
+        self._size = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def _lookup(self, keys: Sequence[str]) -> Dict[str, List[float]]:
+        found = {}
+        unique_keys = list(dict.fromkeys(keys))
+        for start in range(0, len(unique_keys), self._LOOKUP_BATCH):
+            batch = unique_keys[start : start + self._LOOKUP_BATCH]
+            placeholders = ",".join("?" * len(batch))
+            rows = self._conn.execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                batch,
+            ).fetchall()
+            for key, blob in rows:
+                found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+        if found:
+            now = time.time()
+            self._conn.executemany(
+                "UPDATE embeddings SET last_access = ? WHERE key = ?",
+                [(now, key) for key in found],
+            )
+        return found
+
+    def _store(self, items: Dict[str, List[float]]) -> None:
+        now = time.time()
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO embeddings (key, vector, last_access) VALUES (?, ?, ?)",
+            [
+                (key, np.asarray(vector, dtype=np.float32).tobytes(), now)
+                for key, vector in items.items()
+            ],
+        )
+        self._size += len(items)
+        if self._size > self.max_entries:
+            self._size = self._conn.execute(
+                "SELECT COUNT(*) FROM embeddings"
+            ).fetchone()[0]
+            excess = self._size - self.max_entries
+            if excess > 0:
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE key IN ("
+                    "SELECT key FROM embeddings ORDER BY last_access LIMIT ?)",
+                    (excess,),
+                )
+                self.evictions += excess
+                self._size -= excess
+
+    def _embed(self, texts: List[str], kind: str) -> List[List[float]]:
+        keys = [cache_key(self.model_name, kind, text) for text in texts]
+        with self._lock:
+            found = self._lookup(keys)
+            self._conn.commit()
+            num_missing = sum(1 for key in keys if key not in found)
+            self.hits += len(keys) - num_missing
+            self.misses += num_missing
+
+        # Embed each distinct missing text once.
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+
+        if missing:
+            if kind == "query":
+                computed = embed_queries(self.underlying, list(missing.values()))
+            else:
+                computed = self.underlying.embed_documents(list(missing.values()))
+            new_items = dict(zip(missing.keys(), computed))
+            with self._lock:
+                self._store(new_items)
+                self._conn.commit()
+            found.update(new_items)
+
+        return [list(found[key]) for key in keys]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed(list(texts), "document")
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed([text], "query")[0]
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Embeds several queries, computing all cache misses in one batch."""
+        return self._embed(list(texts), "query")
+
+    def stats(self) -> Dict[str, float]:
+        """Returns hit/miss counters and the current number of cached vectors."""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "evictions": self.evictions,
+            "entries": self._size,
+            "max_entries": self.max_entries,
+        }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM embeddings")
+            self._conn.commit()
+            self._size = 0
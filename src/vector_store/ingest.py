@@ -0,0 +1,291 @@
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Set
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from src.config import Config
+from src.tracing import trace_stage
+
+
+@dataclass
+class BatchStats:
+    """Throughput of one embedded and committed batch."""
+
+    chunks: int
+    tokens: int
+    embed_seconds: float
+    write_seconds: float
+
+    @property
+    def seconds(self) -> float:
+        return self.embed_seconds + self.write_seconds
+
+    @property
+    def chunks_per_second(self) -> float:
+        return self.chunks / self.seconds if self.seconds else 0.0
+
+    @property
+    def tokens_per_second(self) -> float:
+        return self.tokens / self.seconds if self.seconds else 0.0
+
+
+@dataclass
+class IngestStats:
+    """Per-batch and aggregate throughput of an ingest run."""
+
+    batches: List[BatchStats] = field(default_factory=list)
+    resumed_chunks: int = 0
+
+    def summary(self) -> Dict[str, float]:
+        chunks = sum(b.chunks for b in self.batches)
+        tokens = sum(b.tokens for b in self.batches)
+        seconds = sum(b.seconds for b in self.batches)
+        return {
+            "batches": len(self.batches),
+            "chunks": chunks,
+            "tokens": tokens,
+            "resumed_chunks": self.resumed_chunks,
+            "embed_seconds": sum(b.embed_seconds for b in self.batches),
+            "write_seconds": sum(b.write_seconds for b in self.batches),
+            "chunks_per_second": chunks / seconds if seconds else 0.0,
+            "tokens_per_second": tokens / seconds if seconds else 0.0,
+        }
+
+
+class MongoBulkSink:
+    """Writes embedded chunks to a collection in the `MongoDBAtlasVectorSearch` layout."""
+
+    def __init__(
+        self, collection, text_key: str = "text", embedding_key: str = "embedding"
+    ):
+        self.collection = collection
+        self.text_key = text_key
+        self.embedding_key = embedding_key
+
+    def existing_ids(self, ids: Sequence[str]) -> Set[str]:
+        from langchain_mongodb.utils import oid_to_str, str_to_oid
+
+        cursor = self.collection.find(
+            {"_id": {"$in": [str_to_oid(i) for i in ids]}}, {"_id": 1}
+        )
+        return {oid_to_str(record["_id"]) for record in cursor}
+
+    def write(
+        self,
+        ids: Sequence[str],
+        texts: Sequence[str],
+        metadatas: Sequence[Dict[str, Any]],
+        vectors: Sequence[Sequence[float]],
+    ) -> None:
+        from pymongo import ReplaceOne
+        from langchain_mongodb.utils import str_to_oid
+
+        operations = []
+        for _id, text, metadata, vector in zip(ids, texts, metadatas, vectors):
+            doc = {
+                **metadata,
+                "_id": str_to_oid(_id),
+                self.text_key: text,
+                self.embedding_key: list(vector),
+            }
+            operations.append(ReplaceOne({"_id": doc["_id"]}, doc, upsert=True))
+        self.collection.bulk_write(operations, ordered=False)
+
+
+JOURNAL_RECORDS_FILE = "build_journal.jsonl"
+JOURNAL_VECTORS_FILE = "build_journal.f32"
+
+
+class LocalStoreSink:
+    """
+    Writes embedded chunks into a `LocalVectorStore`. The store reaches disk only
+    at `save`, so with a `journal_directory` every committed slice is also appended
+    to a build journal there (float32 rows plus one JSON line per row, flushed per
+    slice). A sink created with `resume` replays the journal of an interrupted
+    build into the store, so its chunks count as committed and are not embedded
+    again; otherwise the journal is discarded. Call `finish` once the store is
+    saved.
+    """
+
+    def __init__(
+        self,
+        vector_store,
+        journal_directory: Optional[str] = None,
+        resume: bool = True,
+    ):
+        self.vector_store = vector_store
+        self.journal_directory = journal_directory
+        self.replayed = 0
+        self._records = self._vectors = None
+        if journal_directory is None:
+            return
+        if resume:
+            self.replayed = self._replay()
+        else:
+            self.finish()
+
+    def _journal_path(self, filename: str) -> str:
+        return os.path.join(self.journal_directory, filename)
+
+    def _replay(self) -> int:
+        """Adds the complete rows of a previous build's journal to the store."""
+        records_path = self._journal_path(JOURNAL_RECORDS_FILE)
+        vectors_path = self._journal_path(JOURNAL_VECTORS_FILE)
+        if not (os.path.exists(records_path) and os.path.exists(vectors_path)):
+            return 0
+        records = []
+        with open(records_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    break  # a row cut off by the interruption
+        if not records:
+            return 0
+        dim = records[0]["dim"]
+        vectors = np.fromfile(vectors_path, dtype=np.float32)
+        rows = min(len(records), len(vectors) // dim)
+        if rows:
+            vectors = vectors[: rows * dim].reshape(rows, dim)
+            self.vector_store.add_embeddings(
+                [r["text"] for r in records[:rows]],
+                vectors,
+                [r["metadata"] for r in records[:rows]],
+                [r["id"] for r in records[:rows]],
+            )
+        # Drop any partial row, so this build's slices append after complete ones.
+        os.truncate(vectors_path, rows * dim * 4)
+        with open(records_path + ".tmp", "w", encoding="utf-8") as f:
+            for record in records[:rows]:
+                f.write(json.dumps(record, separators=(",", ":"), default=str) + "\n")
+        os.replace(records_path + ".tmp", records_path)
+        print(f"Replayed {rows} chunks from the journal of an interrupted build.")
+        return rows
+
+    def _append_journal(self, ids, texts, metadatas, vectors) -> None:
+        if self._records is None:
+            os.makedirs(self.journal_directory, exist_ok=True)
+            self._vectors = open(self._journal_path(JOURNAL_VECTORS_FILE), "ab")
+            self._records = open(
+                self._journal_path(JOURNAL_RECORDS_FILE), "a", encoding="utf-8"
+            )
+        vectors = np.asarray(vectors, dtype=np.float32)
+        # Vectors first: a record is only replayed once its row is complete.
+        vectors.tofile(self._vectors)
+        self._vectors.flush()
+        for _id, text, metadata in zip(ids, texts, metadatas):
+            record = {
+                "id": _id,
+                "text": text,
+                "metadata": metadata,
+                "dim": vectors.shape[1],
+            }
+            self._records.write(
+                json.dumps(record, separators=(",", ":"), default=str) + "\n"
+            )
+        self._records.flush()
+
+    def existing_ids(self, ids: Sequence[str]) -> Set[str]:
+        return {doc.id for doc in self.vector_store.get_by_ids(ids)}
+
+    def write(self, ids, texts, metadatas, vectors) -> None:
+        if self.journal_directory is not None:
+            self._append_journal(ids, texts, metadatas, vectors)
+        self.vector_store.add_embeddings(texts, vectors, metadatas, ids)
+
+    def finish(self) -> None:
+        """Closes and removes the journal (its rows are in the saved store)."""
+        for handle in (self._records, self._vectors):
+            if handle is not None:
+                handle.close()
+        self._records = self._vectors = None
+        if self.journal_directory is None:
+            return
+        for filename in (JOURNAL_RECORDS_FILE, JOURNAL_VECTORS_FILE):
+            if os.path.exists(self._journal_path(filename)):
+                os.remove(self._journal_path(filename))
+
+
+def _get_tokenizer(embeddings: Embeddings):
+    """Returns the HuggingFace tokenizer behind an embeddings object, if any."""
+    model = getattr(embeddings, "underlying", embeddings)
+    client = getattr(model, "_client", None)
+    return getattr(client, "tokenizer", None)
+
+
+class EmbeddingIngestStage:
+    """
+    Embeds chunks and commits them to a sink in small, independent bulk upserts.
+
+    Each incoming batch is sorted by text length and split into embedding batches of
+    `embed_batch_size`, so texts of similar length are padded together. Every
+    embedding batch is committed as soon as it is embedded; ids already present in
+    the sink are skipped, so re-running an interrupted build resumes where it stopped
+    instead of re-embedding committed chunks.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        sink,
+        embed_batch_size: Optional[int] = None,
+        resume: bool = True,
+    ):
+        self.embeddings = embeddings
+        self.sink = sink
+        self.embed_batch_size = embed_batch_size or Config.EMBEDDING_BATCH_SIZE
+        self.resume = resume
+        self.stats = IngestStats()
+        self._tokenizer = _get_tokenizer(embeddings)
+
+    def _count_tokens(self, texts: List[str]) -> int:
+        if self._tokenizer is None:
+            # Rough estimate for tokenizers we can't reach (~4 characters per token).
+            return sum(len(text) for text in texts) // 4
+        encoded = self._tokenizer(texts, add_special_tokens=True, truncation=True)
+        return sum(len(ids) for ids in encoded["input_ids"])
+
+    def process(self, docs: Sequence[Document], ids: Sequence[str]) -> List[BatchStats]:
+        """Embeds and commits one batch of chunks, returning per-commit throughput."""
+        if self.resume and ids:
+            existing = self.sink.existing_ids(ids)
+            if existing:
+                self.stats.resumed_chunks += len(existing)
+                kept = [(d, i) for d, i in zip(docs, ids) if i not in existing]
+                docs = [d for d, _ in kept]
+                ids = [i for _, i in kept]
+
+        order = sorted(range(len(docs)), key=lambda i: len(docs[i].page_content))
+        results = []
+        for start in range(0, len(order), self.embed_batch_size):
+            rows = order[start : start + self.embed_batch_size]
+            texts = [docs[i].page_content for i in rows]
+
+            tokens = self._count_tokens(texts)
+            embed_start = time.perf_counter()
+            with trace_stage("ingest.embed", chunks=len(rows), tokens=tokens):
+                vectors = self.embeddings.embed_documents(texts)
+            write_start = time.perf_counter()
+            with trace_stage("ingest.write", chunks=len(rows)):
+                self.sink.write(
+                    [ids[i] for i in rows],
+                    texts,
+                    [docs[i].metadata for i in rows],
+                    vectors,
+                )
+            write_end = time.perf_counter()
+
+            stats = BatchStats(
+                chunks=len(rows),
+                tokens=tokens,
+                embed_seconds=write_start - embed_start,
+                write_seconds=write_end - write_start,
+            )
+            self.stats.batches.append(stats)
+            results.append(stats)
+        return results
@@ -0,0 +1,579 @@
+import json
+import os
+import uuid
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+from src.config import Config
+from src.vector_store.ann import ANN_INDEX_MODES, IVF_FILE, IVFIndex
+from src.vector_store.quantization import (
+    CODES_FILES,
+    QUANTIZATION_MODES,
+    code_dtype,
+    code_width,
+    code_mode,
+    quantize,
+    rescore,
+    scorer,
+    shortlist_size,
+)
+
+EMBEDDINGS_FILE = "embeddings.f32"
+DOCUMENTS_FILE = "documents.jsonl"
+HEADER_FILE = "index.json"
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """L2-normalizes each row so that a dot product equals cosine similarity."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors[None, :]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def top_k_cosine(
+    queries: np.ndarray,
+    matrix: np.ndarray,
+    k: int,
+    block_rows: int,
+    score_block: Optional[Callable[[np.ndarray, np.ndarray], np.ndarray]] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Exact top-k cosine search for a batch of normalized queries against a normalized
+    matrix, scanning the matrix in row blocks so memory-mapped data is paged in once.
+    `score_block(queries, block)` replaces the dot product for quantized matrices
+    (see src/vector_store/quantization.py).
+
+    Returns (indices, scores), both of shape (num_queries, min(k, num_rows)), sorted
+    by descending score.
+    """
+    num_queries, num_rows = len(queries), len(matrix)
+    k = min(k, num_rows)
+    if k == 0 or num_queries == 0:
+        return (
+            np.empty((num_queries, 0), dtype=np.int64),
+            np.empty((num_queries, 0), dtype=np.float32),
+        )
+
+    best_idx = np.empty((num_queries, 0), dtype=np.int64)
+    best_scores = np.empty((num_queries, 0), dtype=np.float32)
+    for start in range(0, num_rows, block_rows):
+        block = np.asarray(matrix[start : start + block_rows])
+        scores = (
+            queries @ block.T if score_block is None else score_block(queries, block)
+        )
+        kb = min(k, scores.shape[1])
+        part = np.argpartition(-scores, kb - 1, axis=1)[:, :kb]
+        cand_scores = np.take_along_axis(scores, part, axis=1)
+        # Merge this block's candidates with the running best set.
+        best_idx = np.concatenate([best_idx, part + start], axis=1)
+        best_scores = np.concatenate([best_scores, cand_scores], axis=1)
+        if best_idx.shape[1] > k:
+            keep = np.argpartition(-best_scores, k - 1, axis=1)[:, :k]
+            best_idx = np.take_along_axis(best_idx, keep, axis=1)
+            best_scores = np.take_along_axis(best_scores, keep, axis=1)
+
+    order = np.argsort(-best_scores, axis=1, kind="stable")
+    return (
+        np.take_along_axis(best_idx, order, axis=1),
+        np.take_along_axis(best_scores, order, axis=1),
+    )
+
+
+class LocalVectorStore(VectorStore):
+    """
+    Vector store that keeps normalized float32 embeddings in a memory-mapped matrix
+    on local disk, with a JSON-lines sidecar holding each row's id, text and metadata.
+
+    Searches are exact (brute-force cosine) and run fully vectorized with NumPy, so
+    the store works offline and without any network round trip. With
+    `quantization` set to "int8" or "binary", `save` also writes quantized codes and
+    searches scan those first, then rescore a shortlist against the float32 rows.
+    With `ann_index="ivf"`, `save` also builds an IVF index, and searches score only
+    the rows of the lists closest to the query (ahead of any quantized codes).
+    """
+
+    def __init__(
+        self,
+        embedding: Embeddings,
+        path: Optional[str] = None,
+        vectors: Optional[np.ndarray] = None,
+        texts: Optional[List[str]] = None,
+        metadatas: Optional[List[Dict[str, Any]]] = None,
+        ids: Optional[List[str]] = None,
+        quantization: Optional[str] = None,
+        codes: Optional[np.ndarray] = None,
+        calibration: Optional[np.ndarray] = None,
+        ann_index: Optional[str] = None,
+        ivf: Optional[IVFIndex] = None,
+    ):
+        self._embedding = embedding
+        self.path = path or Config.LOCAL_INDEX_DIRECTORY
+        self._vectors = vectors
+        # Row blocks appended by `add_embeddings` since the matrix was last
+        # consolidated, concatenated once on first read of `vectors`.
+        self._pending: List[np.ndarray] = []
+        self._texts = texts or []
+        self._metadatas = metadatas or []
+        self._ids = ids or []
+        self._id_to_row = {_id: row for row, _id in enumerate(self._ids)}
+        # Mode `save` quantizes with; the codes in memory may come from an index
+        # saved with another mode (int8 codes are int8, binary codes uint8).
+        self.quantization = quantization or Config.LOCAL_QUANTIZATION
+        if self.quantization not in QUANTIZATION_MODES:
+            raise ValueError(f"Unknown quantization mode '{self.quantization}'.")
+        # Quantized copy of `_vectors`, written by `save`; None after edits.
+        self._codes = codes
+        self._calibration = calibration
+        self.ann_index_mode = ann_index or Config.LOCAL_ANN_INDEX
+        if self.ann_index_mode not in ANN_INDEX_MODES:
+            raise ValueError(f"Unknown ANN index '{self.ann_index_mode}'.")
+        # IVF index over the saved rows, None after edits. Its centroids are kept
+        # so the next `save` only re-assigns rows instead of re-training.
+        self._ivf = ivf
+        self._previous_ivf = ivf
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embedding
+
+    @property
+    def vectors(self) -> np.ndarray:
+        """The (num_rows, dim) normalized embedding matrix (possibly memory-mapped)."""
+        if self._pending:
+            blocks = ([] if self._vectors is None else [self._vectors]) + self._pending
+            self._vectors = np.concatenate(blocks)
+            self._pending = []
+        if self._vectors is None:
+            return np.empty((0, 0), dtype=np.float32)
+        return self._vectors
+
+    @property
+    def ann_index(self) -> Optional[IVFIndex]:
+        """The IVF index matching the current rows, if one was saved."""
+        return self._ivf
+
+    @property
+    def ids(self) -> List[str]:
+        return list(self._ids)
+
+    @property
+    def texts(self) -> List[str]:
+        return list(self._texts)
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def _select_relevance_score_fn(self):
+        # Scores are cosine similarities in [-1, 1]; map them to [0, 1].
+        return lambda score: (score + 1.0) / 2.0
+
+    # --- Persistence ---
+
+    @classmethod
+    def load(
+        cls, path: Optional[str] = None, embedding: Optional[Embeddings] = None
+    ) -> "LocalVectorStore":
+        """Opens an index directory, memory-mapping the embedding matrix read-only."""
+        path = path or Config.LOCAL_INDEX_DIRECTORY
+        with open(os.path.join(path, HEADER_FILE), "r") as f:
+            header = json.load(f)
+
+        num_rows, dim = header["num_rows"], header["dim"]
+        vectors = None
+        if num_rows:
+            vectors = np.memmap(
+                os.path.join(path, EMBEDDINGS_FILE),
+                dtype=np.float32,
+                mode="r",
+                shape=(num_rows, dim),
+            )
+
+        texts, metadatas, ids = [], [], []
+        with open(os.path.join(path, DOCUMENTS_FILE), "r", encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                ids.append(record["id"])
+                texts.append(record["text"])
+                metadatas.append(record["metadata"])
+
+        codes, calibration = None, None
+        mode = header.get("quantization", "none")
+        if num_rows and mode in CODES_FILES:
+            codes = np.memmap(
+                os.path.join(path, CODES_FILES[mode]),
+                dtype=code_dtype(mode),
+                mode="r",
+                shape=(num_rows, code_width(mode, dim)),
+            )
+            calibration = np.asarray(
+                header["quantization_calibration"], dtype=np.float32
+            )
+
+        ivf = IVFIndex.load(path) if header.get("ann_index") == "ivf" else None
+        if ivf is not None and ivf.num_rows != num_rows:
+            ivf = None
+
+        print(
+            f"Loaded local vector index from '{path}' ({num_rows} vectors, "
+            f"quantization: {mode}, ANN index: {'ivf' if ivf else 'none'})."
+        )
+        return cls(
+            embedding,
+            path,
+            vectors,
+            texts,
+            metadatas,
+            ids,
+            codes=codes,
+            calibration=calibration,
+            ivf=ivf,
+        )
+
+    def save(self, path: Optional[str] = None) -> None:
+        """
+        Writes the index to disk atomically (temporary files + rename) and re-opens
+        the embedding matrix (and its quantized codes) as read-only memory maps.
+        """
+        path = path or self.path
+        os.makedirs(path, exist_ok=True)
+        vectors = self.vectors
+        dim = vectors.shape[1] if len(vectors) else 0
+        mode = self.quantization if len(self._ids) else "none"
+
+        tmp_embeddings = os.path.join(path, EMBEDDINGS_FILE + ".tmp")
+        np.ascontiguousarray(vectors, dtype=np.float32).tofile(tmp_embeddings)
+
+        header = {
+            "num_rows": len(self._ids),
+            "dim": dim,
+            "dtype": "float32",
+            "embedding_model": Config.EMBEDDING_MODEL,
+            "quantization": mode,
+        }
+        calibration = None
+        if mode in CODES_FILES:
+            codes, calibration = quantize(mode, vectors)
+            codes.tofile(os.path.join(path, CODES_FILES[mode] + ".tmp"))
+            header["quantization_calibration"] = calibration.tolist()
+
+        ivf = None
+        if self.ann_index_mode == "ivf" and len(self._ids) >= Config.IVF_MIN_ROWS:
+            ivf = self._ivf
+            if ivf is None:
+                centroids = (
+                    self._previous_ivf
+                    and self._previous_ivf.reusable_centroids(len(self._ids), dim)
+                )
+                ivf = IVFIndex.build(vectors, centroids=centroids)
+        header["ann_index"] = "ivf" if ivf else "none"
+
+        tmp_documents = os.path.join(path, DOCUMENTS_FILE + ".tmp")
+        with open(tmp_documents, "w", encoding="utf-8") as f:
+            for _id, text, metadata in zip(self._ids, self._texts, self._metadatas):
+                record = {"id": _id, "text": text, "metadata": metadata}
+                f.write(json.dumps(record, separators=(",", ":"), default=str))
+                f.write("\n")
+
+        tmp_header = os.path.join(path, HEADER_FILE + ".tmp")
+        with open(tmp_header, "w") as f:
+            json.dump(header, f)
+
+        os.replace(tmp_embeddings, os.path.join(path, EMBEDDINGS_FILE))
+        if mode in CODES_FILES:
+            os.replace(
+                os.path.join(path, CODES_FILES[mode] + ".tmp"),
+                os.path.join(path, CODES_FILES[mode]),
+            )
+        if ivf is not None:
+            ivf.save(path)
+        elif os.path.exists(os.path.join(path, IVF_FILE)):
+            os.remove(os.path.join(path, IVF_FILE))
+        os.replace(tmp_documents, os.path.join(path, DOCUMENTS_FILE))
+        os.replace(tmp_header, os.path.join(path, HEADER_FILE))
+        for other, filename in CODES_FILES.items():
+            if other != mode and os.path.exists(os.path.join(path, filename)):
+                os.remove(os.path.join(path, filename))
+        self.path = path
+        self._ivf = self._previous_ivf = ivf
+
+        self._codes, self._calibration = None, calibration
+        if len(self._ids):
+            self._vectors = np.memmap(
+                os.path.join(path, EMBEDDINGS_FILE),
+                dtype=np.float32,
+                mode="r",
+                shape=(len(self._ids), dim),
+            )
+            if mode in CODES_FILES:
+                self._codes = np.memmap(
+                    os.path.join(path, CODES_FILES[mode]),
+                    dtype=code_dtype(mode),
+                    mode="r",
+                    shape=(len(self._ids), code_width(mode, dim)),
+                )
+        print(
+            f"Saved local vector index to '{path}' ({len(self._ids)} vectors, "
+            f"quantization: {mode}, ANN index: {header['ann_index']})."
+        )
+
+    # --- Mutation ---
+
+    def add_embeddings(
+        self,
+        texts: Sequence[str],
+        embeddings: Sequence[Sequence[float]],
+        metadatas: Optional[Sequence[Dict[str, Any]]] = None,
+        ids: Optional[Sequence[str]] = None,
+    ) -> List[str]:
+        """
+        Upserts rows whose embeddings were computed elsewhere. Existing ids are
+        replaced in place; new rows are buffered and joined to the matrix once, on
+        the next read of `vectors` (e.g. by `save` or a search), so adding many
+        small batches does not copy the matrix per batch. Call `save` to persist.
+        """
+        if not texts:
+            return []
+        new_vectors = normalize_rows(np.asarray(embeddings, dtype=np.float32))
+        metadatas = list(metadatas) if metadatas else [{} for _ in texts]
+        ids = list(ids) if ids else [str(uuid.uuid4()) for _ in texts]
+
+        append_rows, update_rows = [], []
+        for i, (_id, text, metadata) in enumerate(zip(ids, texts, metadatas)):
+            row = self._id_to_row.get(_id)
+            if row is None:
+                self._id_to_row[_id] = len(self._ids)
+                self._ids.append(_id)
+                self._texts.append(text)
+                self._metadatas.append(dict(metadata))
+                append_rows.append(i)
+            else:
+                self._texts[row] = text
+                self._metadatas[row] = dict(metadata)
+                update_rows.append((row, i))
+
+        if append_rows:
+            self._pending.append(new_vectors[append_rows])
+        if update_rows:
+            vectors = self.vectors
+            if not vectors.flags.writeable:
+                # Copy the memory map into RAM once before writing to it.
+                vectors = self._vectors = np.array(vectors)
+            for row, i in update_rows:
+                vectors[row] = new_vectors[i]
+        self._codes = self._ivf = None
+        return ids
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> List[str]:
+        texts = list(texts)
+        embeddings = self._embedding.embed_documents(texts)
+        return self.add_embeddings(texts, embeddings, metadatas, ids)
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        """Deletes the given ids (or every row if `ids` is None)."""
+        if ids is None:
+            self._vectors, self._texts, self._metadatas, self._ids = None, [], [], []
+            self._pending = []
+            self._id_to_row = {}
+            self._codes = self._ivf = None
+            return True
+
+        drop = {self._id_to_row[_id] for _id in ids if _id in self._id_to_row}
+        if not drop:
+            return True
+        keep = [row for row in range(len(self._ids)) if row not in drop]
+        self._vectors = np.array(self.vectors[keep]) if keep else None
+        self._codes = self._ivf = None
+        self._texts = [self._texts[row] for row in keep]
+        self._metadatas = [self._metadatas[row] for row in keep]
+        self._ids = [self._ids[row] for row in keep]
+        self._id_to_row = {_id: row for row, _id in enumerate(self._ids)}
+        return True
+
+    def update_metadata(self, updates: Dict[str, Dict[str, Any]]) -> int:
+        """
+        Merges metadata fields into stored chunks (chunk id -> fields); a field set
+        to None is removed. Unknown ids are ignored. Returns the number of chunks
+        changed. Call `save` to persist.
+        """
+        changed = 0
+        for _id, fields in updates.items():
+            row = self._id_to_row.get(_id)
+            if row is None:
+                continue
+            metadata = dict(self._metadatas[row])
+            for key, value in fields.items():
+                if value is None:
+                    metadata.pop(key, None)
+                else:
+                    metadata[key] = value
+            if metadata != self._metadatas[row]:
+                self._metadatas[row] = metadata
+                changed += 1
+        return changed
+
+    def metadata_values(self, key: str) -> Dict[str, Any]:
+        """The value of metadata field `key` of every chunk that has it, by chunk id."""
+        return {
+            _id: metadata[key]
+            for _id, metadata in zip(self._ids, self._metadatas)
+            if key in metadata
+        }
+
+    def get_by_ids(self, ids: Sequence[str], /) -> List[Document]:
+        return [
+            self._document(self._id_to_row[_id])
+            for _id in ids
+            if _id in self._id_to_row
+        ]
+
+    # --- Search ---
+
+    def _document(self, row: int) -> Document:
+        _id = self._ids[row]
+        metadata = dict(self._metadatas[row], _id=_id)
+        return Document(page_content=self._texts[row], metadata=metadata, id=_id)
+
+    def search_vectors(
+        self, query_vectors: np.ndarray, k: int, nprobe: Optional[int] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top-k row indices and cosine scores for a batch of query vectors. With a
+        saved IVF index, only the rows of the `nprobe` closest lists are scored.
+        Otherwise, with saved quantized codes, the codes are scanned for a shortlist
+        that is rescored exactly, so only the shortlisted float32 rows are read.
+        """
+        queries = normalize_rows(query_vectors)
+        if self._ivf is not None:
+            return self._ivf.search(queries, self.vectors, k, nprobe)
+        if self._codes is None:
+            return top_k_cosine(
+                queries, self.vectors, k, Config.LOCAL_SEARCH_BLOCK_ROWS
+            )
+
+        mode = code_mode(self._codes)
+        shortlist, _ = top_k_cosine(
+            queries,
+            self._codes,
+            shortlist_size(mode, k),
+            Config.LOCAL_SEARCH_BLOCK_ROWS,
+            scorer(mode, self._calibration),
+        )
+        return rescore(queries, self.vectors, shortlist, k)
+
+    def similarity_search_with_score_by_vector_batch(
+        self, query_vectors: Sequence[Sequence[float]], k: int = 4
+    ) -> List[List[Tuple[Document, float]]]:
+        """Runs several vector searches in one vectorized pass."""
+        indices, scores = self.search_vectors(np.asarray(query_vectors), k)
+        return [
+            [(self._document(int(i)), float(s)) for i, s in zip(row_idx, row_scores)]
+            for row_idx, row_scores in zip(indices, scores)
+        ]
+
+    def similarity_search_with_score_by_vector(
+        self, embedding: List[float], k: int = 4, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        return self.similarity_search_with_score_by_vector_batch([embedding], k)[0]
+
+    def similarity_search_by_vector(
+        self, embedding: List[float], k: int = 4, **kwargs: Any
+    ) -> List[Document]:
+        return [
+            doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k)
+        ]
+
+    def similarity_search_with_score(
+        self, query: str, k: int = 4, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        embedding = self._embedding.embed_query(query)
+        return self.similarity_search_with_score_by_vector(embedding, k)
+
+    def similarity_search(
+        self, query: str, k: int = 4, **kwargs: Any
+    ) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k)]
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        path: Optional[str] = None,
+        **kwargs: Any,
+    ) -> "LocalVectorStore":
+        store = cls(embedding, path)
+        store.add_texts(texts, metadatas, ids)
+        return store
+
+    # --- MongoDB interoperability ---
+
+    @classmethod
+    def from_mongo_collection(
+        cls,
+        collection,
+        embedding: Embeddings,
+        path: Optional[str] = None,
+        text_key: str = "text",
+        embedding_key: str = "embedding",
+        batch_size: int = 1000,
+    ) -> "LocalVectorStore":
+        """
+        Copies every document of a collection written by `MongoDBAtlasVectorSearch`
+        (text, embedding and flattened metadata fields) into a new local store.
+        """
+        store = cls(embedding, path)
+        texts, vectors, metadatas, ids = [], [], [], []
+        for record in collection.find({}, batch_size=batch_size):
+            ids.append(str(record.pop("_id")))
+            texts.append(record.pop(text_key))
+            vectors.append(record.pop(embedding_key))
+            metadatas.append(record)
+            if len(ids) >= batch_size:
+                store.add_embeddings(texts, vectors, metadatas, ids)
+                texts, vectors, metadatas, ids = [], [], [], []
+        store.add_embeddings(texts, vectors, metadatas, ids)
+        print(f"Exported {len(store)} documents from MongoDB.")
+        return store
+
+    def to_mongo_collection(
+        self,
+        collection,
+        text_key: str = "text",
+        embedding_key: str = "embedding",
+        batch_size: int = 1000,
+    ) -> int:
+        """Upserts every row into a collection in the `MongoDBAtlasVectorSearch` layout."""
+        from pymongo import ReplaceOne
+        from langchain_mongodb.utils import str_to_oid
+
+        written = 0
+        for start in range(0, len(self._ids), batch_size):
+            rows = range(start, min(start + batch_size, len(self._ids)))
+            operations = []
+            for row in rows:
+                doc = {
+                    **self._metadatas[row],
+                    "_id": str_to_oid(self._ids[row]),
+                    text_key: self._texts[row],
+                    embedding_key: self.vectors[row].tolist(),
+                }
+                operations.append(ReplaceOne({"_id": doc["_id"]}, doc, upsert=True))
+            collection.bulk_write(operations, ordered=False)
+            written += len(operations)
+        print(f"Imported {written} documents into MongoDB.")
+        return written
@@ -0,0 +1,190 @@
+import hashlib
+import json
+import os
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.config import Config
+
+BUILD_INFO_ID = "__build__"
+MANIFEST_FILE = "manifest.json"
+
+
+def hash_text(text: str) -> str:
+    """Content hash of a chunk's text."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def hash_file(path: str, block_size: int = 1 << 20) -> str:
+    """Content hash of a file, read in blocks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def source_location(source_id: str) -> str:
+    """The file path or keyword of a source id such as "pdf:<path>"."""
+    return source_id.split(":", 1)[-1]
+
+
+def make_chunk_id(source_id: str, chunk_hash: str, occurrence: int = 0) -> str:
+    """
+    Stable chunk id derived from the source and the chunk's content, so re-chunking an
+    unchanged source yields the same ids. `occurrence` disambiguates identical chunks
+    within one source. Ids are 32 hex characters, which MongoDB keeps as strings.
+    """
+    key = f"{source_id}\x00{chunk_hash}\x00{occurrence}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+
+
+@dataclass
+class SourceEntry:
+    """What the vector store currently holds for one source."""
+
+    content_hash: str
+    chunk_ids: List[str] = field(default_factory=list)
+    chunk_hashes: List[str] = field(default_factory=list)
+    # Source id of the identical file ingested instead (this source has no chunks)
+    duplicate_of: Optional[str] = None
+    # Chunks dropped as near-duplicates: chunk id -> {"kept": id of the chunk kept
+    # in the store instead, "page": page of the dropped chunk}
+    duplicates: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+
+
+@dataclass
+class BuildManifest:
+    """
+    Record of every source in the vector store, its content hash and the ids and
+    hashes of the chunks it produced. Incremental builds diff against it.
+    """
+
+    sources: Dict[str, SourceEntry] = field(default_factory=dict)
+    build_id: Optional[str] = None
+    built_at: Optional[float] = None
+
+    def mark_built(self) -> None:
+        self.build_id = uuid.uuid4().hex
+        self.built_at = time.time()
+
+    def duplicate_citations(self) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Every other place a stored chunk's text appears: kept chunk id -> the
+        sources (file path or keyword, and page) of the chunks dropped as its
+        duplicates. Identical files are listed under the chunks of their canonical
+        copy. Builds store this as each chunk's `also_in` metadata.
+        """
+        copies: Dict[str, List[str]] = {}
+        for source_id, entry in self.sources.items():
+            if entry.duplicate_of:
+                copies.setdefault(entry.duplicate_of, []).append(source_id)
+
+        citations: Dict[str, List[Dict[str, Any]]] = {}
+        for source_id, entry in self.sources.items():
+            for duplicate in entry.duplicates.values():
+                citations.setdefault(duplicate["kept"], []).append(
+                    {"source": source_location(source_id), "page": duplicate["page"]}
+                )
+            for copy in copies.get(source_id, []):
+                for chunk_id in entry.chunk_ids:
+                    citations.setdefault(chunk_id, []).append(
+                        {"source": source_location(copy)}
+                    )
+        return citations
+
+    # --- Local backend (JSON file next to the index) ---
+
+    @classmethod
+    def load_local(cls, directory: Optional[str] = None) -> "BuildManifest":
+        path = os.path.join(directory or Config.LOCAL_INDEX_DIRECTORY, MANIFEST_FILE)
+        if not os.path.exists(path):
+            return cls()
+        with open(path, "r") as f:
+            data = json.load(f)
+        return cls(
+            sources={k: SourceEntry(**v) for k, v in data["sources"].items()},
+            build_id=data.get("build_id"),
+            built_at=data.get("built_at"),
+        )
+
+    def save_local(self, directory: Optional[str] = None) -> None:
+        directory = directory or Config.LOCAL_INDEX_DIRECTORY
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, MANIFEST_FILE)
+        data = {
+            "build_id": self.build_id,
+            "built_at": self.built_at,
+            "sources": {k: vars(v) for k, v in self.sources.items()},
+        }
+        with open(path + ".tmp", "w") as f:
+            json.dump(data, f)
+        os.replace(path + ".tmp", path)
+
+    # --- MongoDB backend (one document per source in a side collection) ---
+
+    @classmethod
+    def load_mongo(cls, collection) -> "BuildManifest":
+        manifest = cls()
+        for record in collection.find({}):
+            _id = record.pop("_id")
+            if _id == BUILD_INFO_ID:
+                manifest.build_id = record.get("build_id")
+                manifest.built_at = record.get("built_at")
+            else:
+                manifest.sources[_id] = SourceEntry(**record)
+        return manifest
+
+    def save_mongo(self, collection) -> None:
+        from pymongo import DeleteMany, ReplaceOne
+
+        operations = [
+            ReplaceOne(
+                {"_id": source_id}, {"_id": source_id, **vars(entry)}, upsert=True
+            )
+            for source_id, entry in self.sources.items()
+        ]
+        operations.append(
+            ReplaceOne(
+                {"_id": BUILD_INFO_ID},
+                {
+                    "_id": BUILD_INFO_ID,
+                    "build_id": self.build_id,
+                    "built_at": self.built_at,
+                },
+                upsert=True,
+            )
+        )
+        keep = list(self.sources) + [BUILD_INFO_ID]
+        operations.append(DeleteMany({"_id": {"$nin": keep}}))
+        collection.bulk_write(operations)
+
+
+def read_build_id(collection=None) -> Optional[str]:
+    """
+    Reads only the current build id: from `collection` (the MongoDB manifest
+    collection) if given, otherwise from the local index directory.
+    """
+    if collection is not None:
+        record = collection.find_one({"_id": BUILD_INFO_ID}, {"build_id": 1})
+        return record.get("build_id") if record else None
+    path = os.path.join(Config.LOCAL_INDEX_DIRECTORY, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        return json.load(f).get("build_id")
+
+
+def assign_chunk_ids(source_id: str, chunks) -> Tuple[List[str], List[str]]:
+    """Returns stable ids and content hashes for the chunks of one source."""
+    seen: Dict[str, int] = {}
+    ids, hashes = [], []
+    for chunk in chunks:
+        chunk_hash = hash_text(chunk.page_content)
+        occurrence = seen.get(chunk_hash, 0)
+        seen[chunk_hash] = occurrence + 1
+        ids.append(make_chunk_id(source_id, chunk_hash, occurrence))
+        hashes.append(chunk_hash)
+    return ids, hashes
@@ -0,0 +1,240 @@
+import argparse
+import json
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.config import Config
+
+QUANTIZATION_MODES = ("none", "int8", "binary")
+CODES_FILES = {"int8": "embeddings.i8", "binary": "embeddings.b1"}
+
+# Number of set bits of every 16-bit value, for popcount on NumPy < 2.0.
+_POPCOUNT_TABLE = np.array([bin(i).count("1") for i in range(1 << 16)], dtype=np.uint8)
+
+
+def hamming_distances(codes: np.ndarray, bits: np.ndarray) -> np.ndarray:
+    """
+    Hamming distance between packed `bits` and every row of packed `codes`: XOR,
+    then popcount (`np.bitwise_count` on NumPy >= 2.0, else a 16-bit lookup table).
+    """
+    diff = np.bitwise_xor(codes, bits)
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(diff).sum(axis=1, dtype=np.int32)
+    if diff.shape[1] % 2:
+        diff = np.pad(diff, ((0, 0), (0, 1)))
+    return _POPCOUNT_TABLE[diff.view(np.uint16)].sum(axis=1, dtype=np.int32)
+
+
+def quantize_int8(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Symmetric per-dimension int8 quantization of normalized vectors. Returns the
+    codes and the per-dimension scale; `codes * scale` approximates the vectors.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    scale = np.abs(vectors).max(axis=0) / 127.0
+    scale[scale == 0] = 1.0
+    codes = np.clip(np.rint(vectors / scale), -127, 127).astype(np.int8)
+    return codes, scale.astype(np.float32)
+
+
+def quantize_binary(vectors: np.ndarray, center: np.ndarray) -> np.ndarray:
+    """
+    Sign-bit quantization around the per-dimension corpus mean `center`: one bit per
+    dimension, packed into uint8 bytes. Centering first keeps the bits informative
+    for embeddings whose dimensions are not zero-mean.
+    """
+    return np.packbits(np.asarray(vectors) > center, axis=1)
+
+
+def code_dtype(mode: str):
+    return np.int8 if mode == "int8" else np.uint8
+
+
+def code_width(mode: str, dim: int) -> int:
+    """Bytes per row of the codes matrix."""
+    return dim if mode == "int8" else (dim + 7) // 8
+
+
+def quantize(mode: str, vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns (codes, calibration) for `mode`: the per-dimension scale for int8 codes,
+    the per-dimension mean for binary codes.
+    """
+    if mode == "int8":
+        return quantize_int8(vectors)
+    if mode == "binary":
+        center = np.asarray(vectors, dtype=np.float32).mean(axis=0)
+        return quantize_binary(vectors, center), center
+    raise ValueError(f"Unknown quantization mode '{mode}'.")
+
+
+def code_mode(codes: np.ndarray) -> str:
+    """Quantization mode of a codes matrix (int8 codes are int8, binary uint8)."""
+    return "int8" if codes.dtype == np.int8 else "binary"
+
+
+def scorer(mode: str, calibration: np.ndarray):
+    """
+    Block scorer for `top_k_cosine` over codes of `mode`: approximate cosine for
+    int8 codes, negated Hamming distance (XOR + popcount) for binary codes.
+    """
+    if mode == "int8":
+
+        def score_int8(queries: np.ndarray, block: np.ndarray) -> np.ndarray:
+            return (queries * calibration) @ block.astype(np.float32).T
+
+        return score_int8
+
+    def score_binary(queries: np.ndarray, block: np.ndarray) -> np.ndarray:
+        query_bits = quantize_binary(queries, calibration)
+        scores = np.empty((len(queries), len(block)), dtype=np.float32)
+        for i, bits in enumerate(query_bits):
+            scores[i] = -hamming_distances(block, bits)
+        return scores
+
+    return score_binary
+
+
+def rescore(
+    queries: np.ndarray, vectors: np.ndarray, shortlist: np.ndarray, k: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Re-ranks each query's shortlisted rows by exact cosine against the
+    full-precision `vectors`, reading only the shortlisted rows from the memory map.
+    Returns the top `k` (indices, scores) per query, sorted by descending score.
+    """
+    k = min(k, shortlist.shape[1])
+    best_idx = np.empty((len(queries), k), dtype=np.int64)
+    best_scores = np.empty((len(queries), k), dtype=np.float32)
+    for i, (query, rows) in enumerate(zip(queries, shortlist)):
+        order = np.argsort(rows)
+        rows = rows[order]
+        scores = np.asarray(vectors[rows]) @ query
+        top = np.argsort(-scores, kind="stable")[:k]
+        best_idx[i], best_scores[i] = rows[top], scores[top]
+    return best_idx, best_scores
+
+
+def shortlist_size(mode: str, k: int) -> int:
+    if mode == "binary":
+        return k * Config.BINARY_RESCORE_MULTIPLIER
+    return k * Config.INT8_RESCORE_MULTIPLIER
+
+
+# --- Recall vs. memory report ---
+
+
+def recall_at_k(expected: np.ndarray, found: np.ndarray) -> float:
+    """Mean share of each query's exact top-k rows that the approximate search found."""
+    hits = [len(set(e) & set(f)) / len(e) for e, f in zip(expected, found) if len(e)]
+    return float(np.mean(hits)) if hits else 0.0
+
+
+def quantization_report(
+    vector_store, query_vectors: np.ndarray, k: Optional[int] = None
+) -> List[Dict[str, float]]:
+    """
+    Compares every quantization mode with the exact float32 search on
+    `query_vectors`: recall@k of the first pass alone and after rescoring, search
+    latency, and the memory the first pass scans (codes) per mode.
+    """
+    from src.vector_store.local_store import normalize_rows, top_k_cosine
+
+    k = k or Config.RETRIEVAL_K
+    vectors = np.asarray(vector_store.vectors)
+    queries = normalize_rows(query_vectors)
+    block_rows = Config.LOCAL_SEARCH_BLOCK_ROWS
+
+    start = time.perf_counter()
+    exact, _ = top_k_cosine(queries, vectors, k, block_rows)
+    rows = [
+        {
+            "mode": "none",
+            "bytes_per_vector": vectors.shape[1] * 4,
+            "scan_mb": vectors.nbytes / 2**20,
+            "first_pass_recall": 1.0,
+            "recall": 1.0,
+            "search_ms": (time.perf_counter() - start) * 1000 / max(len(queries), 1),
+        }
+    ]
+
+    for mode in ("int8", "binary"):
+        codes, calibration = quantize(mode, vectors)
+        start = time.perf_counter()
+        first_pass, _ = top_k_cosine(
+            queries,
+            codes,
+            shortlist_size(mode, k),
+            block_rows,
+            scorer(mode, calibration),
+        )
+        found, _ = rescore(queries, vectors, first_pass, k)
+        elapsed = time.perf_counter() - start
+        rows.append(
+            {
+                "mode": mode,
+                "bytes_per_vector": codes.shape[1],
+                "scan_mb": codes.nbytes / 2**20,
+                "first_pass_recall": recall_at_k(exact, first_pass[:, :k]),
+                "recall": recall_at_k(exact, found),
+                "search_ms": elapsed * 1000 / max(len(queries), 1),
+            }
+        )
+    return rows
+
+
+def print_report(rows: List[Dict[str, float]], k: int) -> None:
+    print(
+        f"{'mode':<8} {'bytes/vec':>10} {'scan MB':>9} "
+        f"{'recall@' + str(k) + ' 1st':>14} {'rescored':>9} {'ms/query':>9}"
+    )
+    for row in rows:
+        print(
+            f"{row['mode']:<8} {row['bytes_per_vector']:>10} {row['scan_mb']:>9.2f} "
+            f"{row['first_pass_recall']:>14.3f} {row['recall']:>9.3f} "
+            f"{row['search_ms']:>9.2f}"
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Recall vs. memory of int8/binary quantization on the eval questions."
+    )
+    parser.add_argument("--index", default=Config.LOCAL_INDEX_DIRECTORY)
+    parser.add_argument("--data", default=Config.EVAL_DATA_PATH)
+    parser.add_argument("--questions", type=int, default=None)
+    parser.add_argument("--k", type=int, default=Config.RETRIEVAL_K)
+    parser.add_argument(
+        "--stub-models",
+        action="store_true",
+        help="Embed with the benchmark's hashing embeddings (for a benchmark index).",
+    )
+    parser.add_argument("--json", action="store_true", help="Print JSON instead.")
+    args = parser.parse_args(argv)
+
+    from src.benchmark.suite import load_questions
+    from src.resources import registry
+    from src.vector_store.embedding_cache import embed_queries
+    from src.vector_store.local_store import LocalVectorStore
+
+    if args.stub_models:
+        from src.benchmark.stubs import HashingEmbeddings
+
+        registry.override("embeddings", HashingEmbeddings())
+    embeddings = registry.get("embeddings")
+    vector_store = LocalVectorStore.load(args.index, embeddings)
+    questions = load_questions(args.data, args.questions)
+    query_vectors = np.asarray(embed_queries(embeddings, questions), dtype=np.float32)
+
+    rows = quantization_report(vector_store, query_vectors, args.k)
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        print(f"{len(questions)} questions, {len(vector_store)} vectors")
+        print_report(rows, args.k)
+
+
+if __name__ == "__main__":
+    main()